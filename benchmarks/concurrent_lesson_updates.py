@@ -0,0 +1,116 @@
+"""
+Пропускная способность правок уроков одного курса несколькими редакторами.
+
+    python -m benchmarks.concurrent_lesson_updates --editors 16 --updates 25
+
+Каждый редактор в своём потоке (и своём соединении с БД) шлёт PATCH
+/api/lessons/{id}/ по своему уроку одного и того же курса. Сравниваются:
+
+- row-lock — прежняя схема: select_for_update строки курса на время
+  проверки окна и постановки задачи в очередь;
+- conditional-update — schedule_course_update_notification: один условный
+  UPDATE и постановка задачи через transaction.on_commit.
+
+Брокер не нужен: постановка задачи заменена задержкой --enqueue-ms.
+"""
+import argparse
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from benchmarks.utils import benchmark_database, report, setup_django, timer
+
+setup_django()
+
+from django.db import connections, transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from materials.models import Course, Lesson  # noqa: E402
+from materials.services import notifications  # noqa: E402
+from users.models import User  # noqa: E402
+
+
+def row_lock_schedule(course_id):
+    with transaction.atomic():
+        course = Course.objects.select_for_update().get(pk=course_id)
+        now = timezone.now()
+
+        last = course.last_notification_sent_at
+        if last is None or now - last >= timedelta(hours=4):
+            course.last_notification_sent_at = now
+            course.save(update_fields=["last_notification_sent_at"])
+            notifications.notify_course_updated.apply_async((course_id,))
+
+
+def run(schedule, owner, lessons, updates):
+    barrier = threading.Barrier(len(lessons))
+    errors = []
+
+    def editor(lesson):
+        client = APIClient()
+        client.force_authenticate(user=owner)
+        url = f"/api/lessons/{lesson.id}/"
+        try:
+            barrier.wait()
+            for i in range(updates):
+                resp = client.patch(url, {"title": f"{lesson.title} #{i}"}, format="json")
+                if resp.status_code != 200:
+                    errors.append(resp.status_code)
+        finally:
+            connections.close_all()
+
+    Course.objects.filter(pk=lessons[0].course_id).update(last_notification_sent_at=None)
+    threads = [threading.Thread(target=editor, args=(lesson,)) for lesson in lessons]
+    with mock.patch("materials.views.schedule_course_update_notification", schedule), timer() as t:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    total = len(lessons) * updates
+    return {
+        "requests": total,
+        "errors": len(errors),
+        "seconds": t["elapsed"],
+        "req/s": total / t["elapsed"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--editors", type=int, default=16)
+    parser.add_argument("--updates", type=int, default=25, help="PATCH-запросов на редактора")
+    parser.add_argument("--enqueue-ms", type=float, default=5.0, help="задержка постановки в брокер")
+    args = parser.parse_args()
+
+    def fake_enqueue(*a, **kw):
+        time.sleep(args.enqueue_ms / 1000)
+
+    with benchmark_database():
+        owner = User.objects.create_user(email="bench@example.com", password="bench")
+        course = Course.objects.create(title="Бенчмарк", owner=owner)
+        lessons = [
+            Lesson.objects.create(
+                course=course,
+                title=f"Урок {i}",
+                video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                owner=owner,
+            )
+            for i in range(args.editors)
+        ]
+
+        rows = []
+        with mock.patch.object(notifications.notify_course_updated, "apply_async", fake_enqueue):
+            for name, schedule in [
+                ("row-lock", row_lock_schedule),
+                ("conditional-update", notifications.schedule_course_update_notification),
+            ]:
+                rows.append({"scheme": name, **run(schedule, owner, lessons, args.updates)})
+
+        report(f"{args.editors} редакторов × {args.updates} правок одного курса", rows)
+
+
+if __name__ == "__main__":
+    main()
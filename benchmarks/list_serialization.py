@@ -0,0 +1,122 @@
+"""
+Сериализация списков курсов, уроков и платежей: обычный путь и быстрый.
+
+    python -m benchmarks.list_serialization --courses 2000 --lessons 10 --payments 50000
+
+Для каждого списка замеряется, сколько объектов в секунду проходит путь
+«запрос → представления → JSON»:
+
+- serializer + JSONRenderer — объекты модели и ModelSerializer (как было);
+- values + JSONRenderer — строки values() и ValuesSerializer;
+- values + ORJSONRenderer — то же с рендерером на orjson (как сейчас в API).
+
+Кеш представлений не участвует: замеряется именно построение промахов.
+"""
+import argparse
+from decimal import Decimal
+
+from benchmarks.utils import benchmark_database, report, setup_django, timer
+
+setup_django()
+
+from django.db.models import Count, Prefetch, Value  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from config.renderers import ORJSONRenderer  # noqa: E402
+from config.representations import ValuesSerializer  # noqa: E402
+from materials.models import Course, Lesson  # noqa: E402
+from materials.serializers import CourseSerializer, LessonSerializer  # noqa: E402
+from users.models import Payment, User  # noqa: E402
+from users.serializers import PaymentSerializer  # noqa: E402
+
+VIDEO = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+def fill(owner, courses, lessons, payments):
+    created = Course.objects.bulk_create(
+        Course(title=f"Курс {i}", description="Описание курса " * 10, owner=owner, preview=f"courses_previews/{i}.jpg")
+        for i in range(courses)
+    )
+    Lesson.objects.bulk_create(
+        (
+            Lesson(course=course, title=f"Урок {j}", description="Текст урока " * 20, video_url=VIDEO, owner=owner)
+            for course in created for j in range(lessons)
+        ),
+        batch_size=2000,
+    )
+    Payment.objects.bulk_create(
+        (
+            Payment(user=owner, paid_course=created[i % courses], amount=Decimal("990.00"), payment_method="transfer")
+            for i in range(payments)
+        ),
+        batch_size=2000,
+    )
+
+
+def courses():
+    return (
+        Course.objects.defer("search_vector")
+        .annotate(lessons_count=Count("lessons"), is_subscribed=Value(False))
+        .order_by("id")
+    )
+
+
+def slow(serializer, queryset, prefetch=()):
+    objects = list(queryset.prefetch_related(*prefetch))
+    return [serializer.to_representation(obj) for obj in objects]
+
+
+def fast(serializer, queryset):
+    values_serializer = ValuesSerializer.build(serializer, annotations=queryset.query.annotations)
+    return values_serializer.represent(queryset.values(*values_serializer.columns))
+
+
+def measure(name, mode, build, renderer):
+    with timer() as t:
+        data = build()
+        size = len(renderer.render(data))
+    return {
+        "list": name,
+        "mode": mode,
+        "items": len(data),
+        "KB": size / 1024,
+        "seconds": t["elapsed"],
+        "items/s": len(data) / t["elapsed"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--courses", type=int, default=2000)
+    parser.add_argument("--lessons", type=int, default=10, help="уроков на курс")
+    parser.add_argument("--payments", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        owner = User.objects.create_user(email="bench@example.com", password="bench")
+        with timer() as t:
+            fill(owner, args.courses, args.lessons, args.payments)
+        print(f"Данные созданы за {t['elapsed']:.1f} с")
+
+        context = {"request": Request(APIRequestFactory().get("/api/"))}
+        lessons_prefetch = Prefetch("lessons", queryset=Lesson.objects.defer("search_vector").order_by("id"))
+        lists = {
+            "courses": (CourseSerializer(context=context), courses, [lessons_prefetch]),
+            "lessons": (LessonSerializer(context=context), lambda: Lesson.objects.defer("search_vector").order_by("id"), []),
+            "payments": (PaymentSerializer(context=context), lambda: Payment.objects.order_by("-payment_date", "-id"), []),
+        }
+
+        rows = []
+        for name, (serializer, queryset, prefetch) in lists.items():
+            rows.append(measure(name, "serializer + JSONRenderer",
+                                lambda: slow(serializer, queryset(), prefetch), JSONRenderer()))
+            rows.append(measure(name, "values + JSONRenderer", lambda: fast(serializer, queryset()), JSONRenderer()))
+            rows.append(measure(name, "values + ORJSONRenderer", lambda: fast(serializer, queryset()), ORJSONRenderer()))
+
+        report(f"{args.courses} курсов × {args.lessons} уроков, {args.payments} платежей", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Выгрузка истории платежей потоком.
+
+    python -m benchmarks.payments_export --rows 10000000 --chunk-size 2000
+
+Таблица платежей заполняется одним INSERT ... SELECT generate_series, затем
+GET /api/payments/export/ читается до конца так же, как это делает клиент.
+Измеряются время, строки в секунду и прирост пикового RSS процесса: при
+потоковой выгрузке он не должен зависеть от --rows.
+
+С --baseline после потоковой выгрузки тот же CSV собирается целиком в
+памяти (как список без пагинации) — для сравнения пика памяти.
+"""
+import argparse
+import csv
+import io
+import resource
+
+from benchmarks.utils import benchmark_database, report, setup_django, timer
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from users.models import Payment, User  # noqa: E402
+from users.services.export import PAYMENT_EXPORT_COLUMNS  # noqa: E402
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux — килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def fill_payments(user, rows):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Payment._meta.db_table}
+                (user_id, payment_date, amount, payment_method, status)
+            SELECT %s,
+                   now() - g * interval '1 second',
+                   (g %% 1000) + 0.5,
+                   CASE WHEN g %% 2 = 0 THEN 'cash' ELSE 'transfer' END,
+                   'paid'
+            FROM generate_series(1, %s) AS g
+            """,
+            [user.pk, rows],
+        )
+        cursor.execute(f"ANALYZE {Payment._meta.db_table}")
+
+
+def stream(client, fmt):
+    rss = peak_rss_mb()
+    size = rows = 0
+    with timer() as t:
+        resp = client.get("/api/payments/export/", {"type": fmt})
+        for chunk in resp.streaming_content:
+            size += len(chunk)
+            rows += chunk.count(b"\n")
+    if fmt == "csv":
+        rows -= 1
+    return {
+        "mode": f"stream {fmt}",
+        "rows": rows,
+        "MB": size / 2**20,
+        "seconds": t["elapsed"],
+        "rows/s": rows / t["elapsed"],
+        "peak RSS +MB": peak_rss_mb() - rss,
+    }
+
+
+def in_memory():
+    rss = peak_rss_mb()
+    with timer() as t:
+        values = list(Payment.objects.values_list(*PAYMENT_EXPORT_COLUMNS.values()))
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(values)
+        size = len(buffer.getvalue().encode())
+    return {
+        "mode": "in-memory csv",
+        "rows": len(values),
+        "MB": size / 2**20,
+        "seconds": t["elapsed"],
+        "rows/s": len(values) / t["elapsed"],
+        "peak RSS +MB": peak_rss_mb() - rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--baseline", action="store_true", help="собрать CSV целиком в памяти для сравнения")
+    args = parser.parse_args()
+
+    with benchmark_database(), override_settings(PAYMENT_EXPORT_CHUNK_SIZE=args.chunk_size):
+        user = User.objects.create_user(email="bench@example.com", password="bench")
+        with timer() as t:
+            fill_payments(user, args.rows)
+        print(f"{args.rows} платежей созданы за {t['elapsed']:.1f} с")
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        rows = [stream(client, "csv"), stream(client, "jsonl")]
+        if args.baseline:
+            rows.append(in_memory())
+
+        report(f"{args.rows} платежей, chunk_size={args.chunk_size}", rows)
+
+
+if __name__ == "__main__":
+    main()
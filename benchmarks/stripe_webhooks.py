@@ -0,0 +1,135 @@
+"""
+Приём и обработка webhook Stripe под нагрузкой.
+
+    python -m benchmarks.stripe_webhooks --events 5000 --senders 8 --duplicates 0.1
+
+Несколько потоков шлют подписанные события Checkout Session на
+/api/payments/webhook/ (подпись — локальная, users.services.stripe_fake),
+часть событий повторяется, как при повторной доставке Stripe. Затем
+очередь разбирается process_stripe_events пачками. Измеряются:
+
+- ingest — приём webhook (проверка подписи + одна вставка);
+- consume — применение событий к платежам.
+
+Брокер не нужен: постановка задачи-обработчика заменена заглушкой.
+"""
+import argparse
+import random
+import threading
+from unittest import mock
+
+from benchmarks.utils import benchmark_database, report, setup_django, timer
+
+setup_django()
+
+from django.db import connections  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+
+from users.models import Payment, StripeEvent, User  # noqa: E402
+from users.services.stripe_fake import sign_webhook, webhook_event  # noqa: E402
+from users.services.webhooks import apply_stripe_events  # noqa: E402
+
+SECRET = "whsec_benchmark"
+EVENT_TYPES = [
+    "checkout.session.completed",
+    "checkout.session.expired",
+    "checkout.session.async_payment_succeeded",
+]
+
+
+def build_events(count, payments, duplicates):
+    events = []
+    for i in range(count):
+        if events and random.random() < duplicates:
+            events.append(random.choice(events))
+            continue
+        session_id = f"cs_bench_{random.randrange(payments)}"
+        events.append(webhook_event(f"evt_bench_{i}", random.choice(EVENT_TYPES), session_id))
+    return events
+
+
+def ingest(events, senders):
+    chunks = [events[i::senders] for i in range(senders)]
+    barrier = threading.Barrier(senders)
+    errors = []
+
+    def sender(chunk):
+        client = Client()
+        try:
+            barrier.wait()
+            for body in chunk:
+                resp = client.post(
+                    "/api/payments/webhook/",
+                    data=body,
+                    content_type="application/json",
+                    HTTP_STRIPE_SIGNATURE=sign_webhook(body, SECRET),
+                )
+                if resp.status_code != 200:
+                    errors.append(resp.status_code)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=sender, args=(chunk,)) for chunk in chunks]
+    with timer() as t:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return {
+        "stage": "ingest",
+        "events": len(events),
+        "errors": len(errors),
+        "seconds": t["elapsed"],
+        "events/s": len(events) / t["elapsed"],
+    }
+
+
+def consume(batch_size):
+    with timer() as t:
+        result = apply_stripe_events(batch_size=batch_size)
+    return {
+        "stage": f"consume (batch {batch_size})",
+        "events": result["processed"],
+        "errors": 0,
+        "seconds": t["elapsed"],
+        "events/s": result["processed"] / t["elapsed"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--payments", type=int, default=1000)
+    parser.add_argument("--senders", type=int, default=8)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="доля повторных доставок")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with benchmark_database(), override_settings(STRIPE_WEBHOOK_SECRET=SECRET):
+        user = User.objects.create_user(email="bench@example.com", password="bench")
+        Payment.objects.bulk_create([
+            Payment(
+                user=user,
+                amount="100.00",
+                payment_method=Payment.PaymentMethod.TRANSFER,
+                stripe_session_id=f"cs_bench_{i}",
+                status=Payment.Status.OPEN,
+            )
+            for i in range(args.payments)
+        ])
+        events = build_events(args.events, args.payments, args.duplicates)
+
+        with mock.patch("users.tasks.process_stripe_events.apply_async"):
+            rows = [ingest(events, args.senders)]
+        stored = StripeEvent.objects.count()
+        rows.append(consume(args.batch_size))
+
+        report(
+            f"{args.events} событий ({stored} уникальных), {args.senders} отправителей",
+            rows,
+        )
+
+
+if __name__ == "__main__":
+    main()
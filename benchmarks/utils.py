@@ -0,0 +1,65 @@
+"""
+Общие помощники для бенчмарков.
+
+Бенчмарки запускаются из корня проекта как модули, например:
+
+    python -m benchmarks.concurrent_lesson_updates
+
+Каждый поднимает отдельную тестовую БД (test_<DB_NAME>), как это делает
+`manage.py test`, и удаляет её после прогона — рабочие данные не трогаются.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+@contextmanager
+def timer():
+    result = {}
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["elapsed"] = time.perf_counter() - started
+
+
+def report(title, rows):
+    """
+    Печатает таблицу результатов: rows — список словарей с одинаковыми ключами.
+    """
+    print(f"\n{title}")
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(_fmt(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(_fmt(row[c]).ljust(widths[c]) for c in columns))
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
@@ -0,0 +1,133 @@
+"""
+Чтение с реплик PostgreSQL.
+
+ReplicaRouter отправляет на реплики (settings.DATABASE_REPLICAS) только
+чтения внутри HTTP-запросов с безопасным методом (GET, HEAD, OPTIONS).
+Всё остальное идёт в default:
+
+- запись и select_for_update (Django берёт для них db_for_write);
+- чтения внутри transaction.atomic() — транзакция должна видеть свои данные;
+- запросы POST/PUT/PATCH/DELETE целиком;
+- Celery-задачи и команды (вне HTTP-запроса) — они часто читают только
+  что записанное и ещё не дошедшее до реплик;
+- чтения пользователя, который недавно писал (read-your-writes): после
+  запроса с записью пользователь на DB_REPLICA_PIN_SECONDS секунд
+  закрепляется за default (отметка в кеше, общая для всех процессов).
+
+Состояние запроса хранит ReplicaRoutingMiddleware в contextvar.
+"""
+import logging
+import random
+from contextvars import ContextVar
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_CACHE_KEY = "db:pinned:{user_id}"
+
+_request_state = ContextVar("replica_routing_state", default=None)
+
+
+def _user_id(request):
+    """
+    id пользователя запроса, если он уже известен. Ленивый request.user
+    (сессия) не вычисляется: это запрос к БД изнутри роутера.
+    """
+    user = request.__dict__.get("user")
+    if isinstance(user, SimpleLazyObject):
+        user = None if user._wrapped is empty else user._wrapped
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def replica_reads_allowed() -> bool:
+    """Пойдут ли чтения, сделанные сейчас, на реплику (см. модуль)."""
+    state = _request_state.get()
+    if state is None or not settings.DATABASE_REPLICAS:
+        return False
+    return not (connections[DEFAULT_DB_ALIAS].in_atomic_block or state.is_pinned())
+
+
+def pin_to_primary(user_id) -> None:
+    """Следующие DB_REPLICA_PIN_SECONDS секунд пользователь читает из default."""
+    cache.set(PIN_CACHE_KEY.format(user_id=user_id), 1, timeout=settings.DB_REPLICA_PIN_SECONDS)
+
+
+class RequestState:
+    def __init__(self, request):
+        self.request = request
+        # None — ещё не выяснено (пользователь может быть пока неизвестен)
+        self.pinned = True if request.method not in SAFE_METHODS else None
+        self.wrote = False
+
+    def is_pinned(self) -> bool:
+        if self.pinned is None:
+            user_id = _user_id(self.request)
+            if user_id is None:
+                return False
+            try:
+                self.pinned = bool(cache.get(PIN_CACHE_KEY.format(user_id=user_id)))
+            except redis.RedisError:
+                logger.warning("Не удалось проверить закрепление за default", exc_info=True)
+                self.pinned = True
+        return self.pinned
+
+
+class ReplicaRouter:
+    """
+    Чтения — на случайную реплику, если это безопасно (см. модуль),
+    запись и миграции — только default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not replica_reads_allowed():
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии default: связи между объектами из любых из них допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Задаёт состояние маршрутизации на время запроса и после запроса
+    с записью закрепляет пользователя за default.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state.wrote and settings.DATABASE_REPLICAS:
+            user_id = _user_id(request)
+            if user_id is not None:
+                try:
+                    pin_to_primary(user_id)
+                except redis.RedisError:
+                    # запись уже прошла — ответ не должен из-за этого падать
+                    logger.warning("Не удалось закрепить пользователя %s за default", user_id, exc_info=True)
+        return response
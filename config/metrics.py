@@ -0,0 +1,143 @@
+import hmac
+import logging
+
+import redis
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.permissions import BasePermission
+from rest_framework.views import APIView
+
+from config.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = []
+
+
+def _labels_to_str(labels: dict) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in sorted(labels.items()))
+
+
+class Counter:
+    """
+    Счётчик в формате Prometheus, общий для всех процессов.
+
+    Значения лежат в Redis-хеше `metrics:<name>` (поле — набор меток),
+    поэтому /metrics/ любого воркера отдаёт суммарные значения.
+    Ошибки Redis не должны ронять запрос — они только логируются.
+    """
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.key = f"metrics:{name}"
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels) -> None:
+        try:
+            get_redis().hincrby(self.key, _labels_to_str(labels), amount)
+        except redis.RedisError:
+            logger.warning("Не удалось обновить метрику %s", self.name, exc_info=True)
+
+    def samples(self):
+        raw = get_redis().hgetall(self.key)
+        return [(self.name, field.decode(), int(value)) for field, value in sorted(raw.items())]
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus, общая для всех процессов.
+
+    Бакеты, сумма и количество наблюдений лежат в Redis-хеше
+    `metrics:<name>` и обновляются одним pipeline на наблюдение.
+    """
+    type = "histogram"
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.key = f"metrics:{name}"
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        base = _labels_to_str(labels)
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for bound in self.buckets:
+                if value <= bound:
+                    pipe.hincrby(self.key, f"bucket|{base}|{bound}", 1)
+            pipe.hincrby(self.key, f"bucket|{base}|+Inf", 1)
+            pipe.hincrbyfloat(self.key, f"sum|{base}", value)
+            pipe.hincrby(self.key, f"count|{base}", 1)
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning("Не удалось обновить метрику %s", self.name, exc_info=True)
+
+    def samples(self):
+        raw = {field.decode(): value for field, value in get_redis().hgetall(self.key).items()}
+        series = sorted({field.split("|")[1] for field in raw})
+        samples = []
+        for base in series:
+            for bound in [*self.buckets, "+Inf"]:
+                labels = ",".join(filter(None, [base, f'le="{bound}"']))
+                samples.append((f"{self.name}_bucket", labels, int(raw.get(f"bucket|{base}|{bound}", 0))))
+            samples.append((f"{self.name}_sum", base, float(raw.get(f"sum|{base}", 0))))
+            samples.append((f"{self.name}_count", base, int(raw.get(f"count|{base}", 0))))
+        return samples
+
+
+class Gauge:
+    """
+    Вычисляемая метрика: значение считается функцией в момент сбора.
+    `collect` возвращает список пар (метки, значение).
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, collect):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        REGISTRY.append(self)
+
+    def samples(self):
+        return [(self.name, _labels_to_str(labels), value) for labels, value in self.collect()]
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class HasMetricsToken(BasePermission):
+    """
+    Доступ к /metrics/: staff-пользователь или заголовок
+    `Authorization: Token <METRICS_TOKEN>` (для Prometheus).
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        header = request.headers.get("Authorization", "")
+        scheme, _, credentials = header.partition(" ")
+        return bool(token) and scheme == "Token" and hmac.compare_digest(credentials, token)
+
+
+class MetricsView(APIView):
+    """
+    GET /metrics/ — метрики в текстовом формате Prometheus.
+    """
+    permission_classes = [HasMetricsToken]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4")
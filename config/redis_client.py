@@ -0,0 +1,15 @@
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_redis() -> redis.Redis:
+    """
+    Общий клиент Redis процесса (пул соединений внутри redis-py).
+
+    Используется там, где не хватает API django cache: счётчики метрик,
+    атомарные операции. Кеш приложений — через django.core.cache.
+    """
+    return redis.Redis.from_url(settings.REDIS_URL)
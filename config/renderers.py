@@ -0,0 +1,27 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson: тот же вывод, что у JSONRenderer DRF
+    (компактный UTF-8), но в разы быстрее на больших списках.
+
+    Даты, Decimal и прочие типы, которые orjson кодирует по-своему,
+    передаются JSONEncoder DRF, чтобы формат не менялся. Нестроковые
+    ключи словарей (ошибки ListField/DictField — {0: [...]}) становятся
+    строками, как в json.dumps. С `indent` (?format=json; indent=4
+    в Accept) работает обычный JSONRenderer.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=self.options)
+        # как JSONRenderer: U+2028/U+2029 недопустимы в JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
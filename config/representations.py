@@ -0,0 +1,153 @@
+"""
+Быстрый путь сериализации списков только для чтения.
+
+ValuesSerializer строит представления прямо из строк values(), минуя
+get_attribute/to_representation полей DRF на каждом объекте. Набор полей,
+их порядок и преобразования берутся из экземпляра обычного сериализатора
+view (с учётом ?fields= и контекста запроса), поэтому вывод совпадает с
+его to_representation. Если какое-то поле так не построить, build()
+возвращает None и view сериализует объекты как обычно.
+"""
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import F
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+
+from config.thumbnails import ImageRenditionsField, rendition_urls
+
+# значение из БД уже совпадает с выводом to_representation поля
+AS_IS_FIELDS = (
+    drf_fields.IntegerField,
+    drf_fields.CharField,
+    drf_fields.ChoiceField,
+    drf_fields.BooleanField,
+    relations.PrimaryKeyRelatedField,
+)
+# значение приводится методом самого поля (часовой пояс, округление)
+CONVERTED_FIELDS = (
+    drf_fields.DateTimeField,
+    drf_fields.DateField,
+    drf_fields.DecimalField,
+    drf_fields.FloatField,
+)
+
+
+def _value(column, convert=None):
+    get = itemgetter(column)
+    if convert is None:
+        return get
+
+    def value(row):
+        # как Serializer.to_representation: None не передаётся полю
+        raw = get(row)
+        return None if raw is None else convert(raw)
+    return value
+
+
+def _file_url(storage, request):
+    def convert(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+def _renditions(field, storage, request):
+    image, renditions = (itemgetter(column) for column in field.columns)
+    return lambda row: rendition_urls(image(row), renditions(row), storage, request)
+
+
+class ValuesSerializer:
+    """
+    Представления строк values() в формате сериализатора.
+
+    `columns` — что выбрать в values(). Вложенные списки (`lessons` курса)
+    читаются одним запросом values() на все строки страницы.
+    """
+
+    def __init__(self, model, fields, columns, nested):
+        self.model = model
+        self.fields = fields
+        self.columns = columns
+        self.nested = nested
+
+    @classmethod
+    def build(cls, serializer, annotations=()):
+        """
+        ValuesSerializer для экземпляра `serializer` или None.
+        `annotations` — аннотации queryset: SerializerMethodField
+        поддерживается, только если его значение уже посчитано в SELECT.
+        """
+        model = serializer.Meta.model
+        request = serializer.context.get("request")
+        concrete = {field.name: field for field in model._meta.concrete_fields}
+        fields, columns, nested = [], [], {}
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                relation = model._meta.get_field(field.source)
+                child = cls.build(field.child)
+                if not relation.one_to_many or child is None:
+                    return None
+                nested[name] = (child, relation.field.name)
+                fields.append((name, None))
+            elif isinstance(field, ImageRenditionsField):
+                columns.extend(field.columns)
+                storage = concrete[field.image_field].storage
+                fields.append((name, _renditions(field, storage, request)))
+            elif isinstance(field, serializers.SerializerMethodField):
+                if name not in annotations:
+                    return None
+                columns.append(name)
+                fields.append((name, _value(name)))
+            elif field.source not in concrete:
+                return None
+            elif isinstance(field, drf_fields.FileField):
+                columns.append(field.source)
+                storage = concrete[field.source].storage
+                fields.append((name, _value(field.source, _file_url(storage, request))))
+            elif isinstance(field, AS_IS_FIELDS):
+                columns.append(field.source)
+                fields.append((name, _value(field.source)))
+            elif isinstance(field, CONVERTED_FIELDS):
+                columns.append(field.source)
+                fields.append((name, _value(field.source, field.to_representation)))
+            else:
+                return None
+
+        if "id" not in columns:
+            columns.append("id")
+        return cls(model, fields, columns, nested)
+
+    def _nested_representations(self, rows) -> dict:
+        """{поле: {id строки: [представления]}}"""
+        parent_ids = [row["id"] for row in rows]
+        result = {}
+        for name, (child, link) in self.nested.items():
+            child_rows = (
+                child.model.objects
+                .filter(**{f"{link}__in": parent_ids})
+                .order_by(link, "id")
+                .values(*child.columns, _parent_id=F(link))
+            )
+            result[name] = {
+                parent_id: child.represent(group)
+                for parent_id, group in groupby(child_rows, key=itemgetter("_parent_id"))
+            }
+        return result
+
+    def represent(self, rows) -> list[dict]:
+        rows = list(rows)
+        nested = self._nested_representations(rows) if self.nested and rows else {}
+        return [
+            {
+                name: value(row) if value is not None else nested[name].get(row["id"], [])
+                for name, value in self.fields
+            }
+            for row in rows
+        ]
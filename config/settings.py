@@ -1,6 +1,8 @@
 import os
 from datetime import timedelta
 from pathlib import Path
+
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,7 +34,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'config.renderers.ORJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 
@@ -42,7 +44,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ),
 
     'DEFAULT_PERMISSION_CLASSES': (
@@ -50,6 +52,11 @@ REST_FRAMEWORK = {
     ),
 
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+
+    # Число доверенных прокси перед приложением: адрес клиента для лимитов
+    # берётся из X-Forwarded-For с учётом только их. 0 — REMOTE_ADDR,
+    # заголовок, который присылает сам клиент, не учитывается
+    'NUM_PROXIES': int(os.getenv("NUM_PROXIES", "0")),
 }
 
 MIDDLEWARE = [
@@ -58,6 +65,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -92,6 +100,24 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: DB_REPLICAS=host[:port],host2[:port] (имя БД,
+# пользователь и пароль — как у default). В тестах реплики — зеркала default.
+# Маршрутизация — config/db_router.py
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['config.db_router.ReplicaRouter']
+# Сколько секунд после записи пользователь читает только из default
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', '10'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -120,11 +146,26 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Копии загруженных изображений (config.thumbnails): размеры по полям,
+# каждая — в WebP и JPEG рядом с оригиналом
+IMAGE_RENDITIONS = {
+    "preview": {"small": (320, 180), "medium": (640, 360), "large": (1280, 720)},
+    "avatar": {"small": (64, 64), "medium": (256, 256)},
+}
+IMAGE_RENDITION_QUALITY = {
+    "webp": int(os.getenv("IMAGE_RENDITION_WEBP_QUALITY", "80")),
+    "jpeg": int(os.getenv("IMAGE_RENDITION_JPEG_QUALITY", "85")),
+}
+
 AUTH_USER_MODEL = 'users.User'
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    # request.user — из claims токена, без запроса к БД (users/authentication.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'users.authentication.UserTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.authentication.UserTokenRefreshSerializer',
+    'TOKEN_USER_CLASS': 'users.authentication.ClaimsUser',
 }
 
 SPECTACULAR_SETTINGS = {
@@ -137,11 +178,104 @@ SPECTACULAR_SETTINGS = {
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLIC_KEY = os.getenv("STRIPE_PUBLIC_KEY")
 
+# Секрет подписи webhook (whsec_...; без него все webhook отклоняются)
+# и допустимый возраст подписи (сек.)
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+STRIPE_WEBHOOK_TOLERANCE = int(os.getenv("STRIPE_WEBHOOK_TOLERANCE", "300"))
+# События webhook применяются к платежам пачками: не чаще раза
+# в STRIPE_WEBHOOK_DELAY сек., не больше STRIPE_WEBHOOK_BATCH_SIZE за транзакцию
+STRIPE_WEBHOOK_DELAY = int(os.getenv("STRIPE_WEBHOOK_DELAY", "2"))
+STRIPE_WEBHOOK_BATCH_SIZE = int(os.getenv("STRIPE_WEBHOOK_BATCH_SIZE", "500"))
+
+# Ночная сверка открытых платежей с Checkout Session: размер страницы
+# списка Stripe (макс. 100) и пачки bulk_update
+STRIPE_RECONCILE_PAGE_SIZE = int(os.getenv("STRIPE_RECONCILE_PAGE_SIZE", "100"))
+STRIPE_RECONCILE_CHUNK_SIZE = int(os.getenv("STRIPE_RECONCILE_CHUNK_SIZE", "500"))
+
 STRIPE_SUCCESS_URL = os.getenv("STRIPE_SUCCESS_URL", "http://127.0.0.1:8000/api/payments/success/")
 STRIPE_CANCEL_URL = os.getenv("STRIPE_CANCEL_URL", "http://127.0.0.1:8000/api/payments/cancel/")
 
+# Клиент Stripe процесса; для локальной разработки и бенчмарков —
+# users.services.stripe_fake.FakeStripeClient
+STRIPE_CLIENT_CLASS = os.getenv("STRIPE_CLIENT_CLASS", "users.services.stripe.StripeClient")
+# Таймауты (сек.) по операциям: продукт, цена, Checkout Session
+STRIPE_TIMEOUTS = {
+    "product": float(os.getenv("STRIPE_TIMEOUT_PRODUCT", "10")),
+    "price": float(os.getenv("STRIPE_TIMEOUT_PRICE", "10")),
+    "session": float(os.getenv("STRIPE_TIMEOUT_SESSION", "15")),
+    "list": float(os.getenv("STRIPE_TIMEOUT_LIST", "30")),
+}
+# Повторы временных ошибок Stripe и базовая задержка между ними (сек.)
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+STRIPE_RETRY_BACKOFF = float(os.getenv("STRIPE_RETRY_BACKOFF", "0.5"))
+# Размер пула keep-alive соединений к api.stripe.com
+STRIPE_POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", "10"))
+
+# Circuit breaker вызовов Stripe (состояние общее через Redis): открывается,
+# когда за `window` сек. было не меньше `min_calls` вызовов и доля ошибок
+# (включая вызовы дольше `slow_call` сек.) достигла `failure_ratio`
+STRIPE_CIRCUIT_BREAKER = {
+    "failure_ratio": float(os.getenv("STRIPE_CB_FAILURE_RATIO", "0.5")),
+    "min_calls": int(os.getenv("STRIPE_CB_MIN_CALLS", "10")),
+    "window": int(os.getenv("STRIPE_CB_WINDOW", "60")),
+    "slow_call": float(os.getenv("STRIPE_CB_SLOW_CALL", "5")),
+    "reset_timeout": int(os.getenv("STRIPE_CB_RESET_TIMEOUT", "30")),
+}
+# Не больше `max_concurrent` одновременных вызовов Stripe на процесс;
+# ожидание свободного слота — не дольше `wait` сек.
+STRIPE_BULKHEAD = {
+    "max_concurrent": int(os.getenv("STRIPE_BULKHEAD_MAX_CONCURRENT", "4")),
+    "wait": float(os.getenv("STRIPE_BULKHEAD_WAIT", "0.5")),
+}
+
+# Создавать Checkout Session в Celery и сразу отвечать 202
+# (клиент может включить это и сам заголовком `Prefer: respond-async`)
+PAYMENTS_ASYNC_CHECKOUT = os.getenv("PAYMENTS_ASYNC_CHECKOUT", "False") == "True"
+# Через сколько секунд клиенту опросить статус платежа в pending (Retry-After)
+PAYMENT_STATUS_RETRY_AFTER = int(os.getenv("PAYMENT_STATUS_RETRY_AFTER", "1"))
+# Платёж, не получивший сессию Stripe за это время, переводится в failed
+PAYMENT_PENDING_TIMEOUT = timedelta(minutes=int(os.getenv("PAYMENT_PENDING_TIMEOUT_MINUTES", "30")))
+
+# Сколько хранить ответ на запрос с Idempotency-Key (сек.) и сколько
+# повтор ждёт ответа на ещё выполняющийся запрос с тем же ключом
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(60 * 60 * 24)))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "10"))
+
+# Дневные итоги платежей: как часто досчитывать и запас назад от отметки
+# (для платежей, закоммиченных позже своей payment_date)
+PAYMENT_ROLLUP_INTERVAL = timedelta(minutes=int(os.getenv("PAYMENT_ROLLUP_INTERVAL_MINUTES", "5")))
+PAYMENT_ROLLUP_LOOKBACK = timedelta(minutes=int(os.getenv("PAYMENT_ROLLUP_LOOKBACK_MINUTES", "15")))
+# Выгрузка платежей: строк на одну выборку серверного курсора
+PAYMENT_EXPORT_CHUNK_SIZE = int(os.getenv("PAYMENT_EXPORT_CHUNK_SIZE", "2000"))
+
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+# Лимиты запросов (скользящее окно в Redis, config/throttling.py):
+# throttle_scope view → {"ip" | "user": "число/период"}, период — s, min, hour, day.
+# Пустое значение отключает лимит
+RATE_LIMITS = {
+    "token": {"ip": os.getenv("RATE_LIMIT_TOKEN_IP", "10/min")},
+    "register": {"ip": os.getenv("RATE_LIMIT_REGISTER_IP", "5/hour")},
+    "payment_create": {
+        "user": os.getenv("RATE_LIMIT_PAYMENT_USER", "10/min"),
+        "ip": os.getenv("RATE_LIMIT_PAYMENT_IP", "30/min"),
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_URL", "redis://localhost:6379/1"),
+        "KEY_PREFIX": "lms",
+    }
+}
+
+# Сколько хранить сериализованные курсы/уроки (сек.); сброс — по версии объекта
+MATERIALS_CACHE_TIMEOUT = int(os.getenv("MATERIALS_CACHE_TIMEOUT", str(60 * 60 * 24)))
+
+# Токен для Prometheus: Authorization: Token <METRICS_TOKEN>
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ["json"]
@@ -149,12 +283,33 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 
+# Деактивация неактивных пользователей: размер диапазона id и пауза
+# между диапазонами (сек.), чтобы не держать блокировки в час пик
+DEACTIVATE_USERS_BATCH_SIZE = int(os.getenv("DEACTIVATE_USERS_BATCH_SIZE", "1000"))
+DEACTIVATE_USERS_BATCH_SLEEP = float(os.getenv("DEACTIVATE_USERS_BATCH_SLEEP", "0.1"))
+
 CELERY_BEAT_SCHEDULE = {
     "deactivate-inactive-users-every-day": {
         "task": "users.tasks.deactivate_inactive_users",
         "schedule": timedelta(days=1),
         "options": {"timezone": TIME_ZONE},
     },
+    "reconcile-checkout-sessions-every-night": {
+        "task": "users.tasks.reconcile_checkout_sessions",
+        "schedule": crontab(hour=4, minute=0),
+    },
+    "refresh-payment-rollups": {
+        "task": "users.tasks.refresh_payment_rollups",
+        "schedule": PAYMENT_ROLLUP_INTERVAL,
+    },
+    "process-stripe-events-every-minute": {
+        "task": "users.tasks.process_stripe_events",
+        "schedule": timedelta(minutes=1),
+    },
+    "fail-stale-pending-payments": {
+        "task": "users.tasks.fail_stale_pending_payments",
+        "schedule": timedelta(minutes=5),
+    },
 }
 
 EMAIL_BACKEND = os.getenv(
@@ -167,4 +322,19 @@ DEFAULT_FROM_EMAIL = os.getenv(
     "no-reply@example.com"
 )
 
+# Сколько подписчиков за раз читать и отправлять в notify_course_updated
+COURSE_NOTIFY_CHUNK_SIZE = int(os.getenv("COURSE_NOTIFY_CHUNK_SIZE", "500"))
+# Не чаще одного уведомления о курсе за это время
+COURSE_NOTIFY_THROTTLE = timedelta(hours=4)
+# Задержка отправки (сек.): серия правок подряд уходит одним письмом
+COURSE_NOTIFY_DELAY = int(os.getenv("COURSE_NOTIFY_DELAY", "60"))
+
+# Импорт уроков (POST /api/lessons/import/, manage.py import_lessons):
+# строк в одной пачке проверки и bulk_create
+LESSON_IMPORT_BATCH_SIZE = int(os.getenv("LESSON_IMPORT_BATCH_SIZE", "500"))
+# Сколько ошибок по строкам возвращать, прежде чем прекратить разбор
+LESSON_IMPORT_MAX_ERRORS = int(os.getenv("LESSON_IMPORT_MAX_ERRORS", "100"))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+TEST_RUNNER = 'config.test_runner.TestRunner'
@@ -0,0 +1,24 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Перед прогоном очищает кеш: в новой тестовой БД id объектов начинаются
+    заново, и записи прошлых прогонов (роли, сериализованные курсы)
+    относились бы к другим объектам.
+
+    Лимиты запросов отключены: тесты шлют много запросов с одного адреса.
+    Тесты лимитов включают их через override_settings(RATE_LIMITS=...).
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        cache.clear()
+        self.test_settings = override_settings(RATE_LIMITS={})
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,142 @@
+"""
+Лимиты запросов со скользящим окном в Redis.
+
+Для view с `throttle_scope` лимиты берутся из settings.RATE_LIMITS:
+{scope: {"ip": "10/min", "user": "100/hour"}}. Ключ "ip" считает запросы
+с адреса клиента, "user" — запросы пользователя (анонимных не касается).
+Все лимиты запроса проверяются одним Lua-скриптом — один обход Redis
+на запрос, атомарно для всех процессов. Окно — журнал отметок времени
+в sorted set: учитываются ровно запросы за последние N секунд, без
+всплеска на границе фиксированных интервалов.
+
+Ответы получают заголовки RateLimit-Limit/-Remaining/-Reset (по самому
+жёсткому из лимитов), отказ — 429 с Retry-After. Если Redis недоступен,
+запросы пропускаются без ограничения.
+"""
+import logging
+import math
+import uuid
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from config.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+# KEYS — окна, по одному на лимит; ARGV[1] — id запроса, затем пары
+# (лимит, окно в мс). Отметка ставится во все окна, только если запрос
+# укладывается во все лимиты. Возвращает {разрешён, сейчас (мс),
+# [число запросов в окне, время самой старой отметки] для каждого окна}.
+SLIDING_WINDOW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local allowed = 1
+local result = {0, now}
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2])
+    local window = tonumber(ARGV[i * 2 + 1])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    local count = redis.call('ZCARD', key)
+    local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')[2]
+    if count >= limit then
+        allowed = 0
+    end
+    result[#result + 1] = count
+    result[#result + 1] = tonumber(oldest or now)
+end
+if allowed == 1 then
+    for i, key in ipairs(KEYS) do
+        redis.call('ZADD', key, now, ARGV[1])
+        redis.call('PEXPIRE', key, ARGV[i * 2 + 1])
+    end
+end
+result[1] = allowed
+return result
+"""
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """'10/min' → (10, 60): число запросов и окно в секундах."""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period.strip()[0]]
+
+
+@lru_cache(maxsize=None)
+def _script():
+    return get_redis().register_script(SLIDING_WINDOW_SCRIPT)
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Лимиты RATE_LIMITS[view.throttle_scope]; состояние последней проверки
+    кладётся в request.rate_limit для заголовков (RateLimitMixin).
+    """
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_limits(self, request, view) -> list[tuple[str, int, int]]:
+        scope = getattr(view, "throttle_scope", None)
+        limits = []
+        for kind, rate in settings.RATE_LIMITS.get(scope, {}).items():
+            if not rate:
+                continue
+            if kind == "ip":
+                ident = self.get_ident(request)
+            elif kind == "user" and request.user and request.user.is_authenticated:
+                ident = request.user.pk
+            else:
+                continue
+            limits.append((f"throttle:{scope}:{kind}:{ident}", *parse_rate(rate)))
+        return limits
+
+    def allow_request(self, request, view):
+        limits = self.get_limits(request, view)
+        if not limits:
+            return True
+
+        args = [uuid.uuid4().hex]
+        for _, count, window in limits:
+            args += [count, window * 1000]
+        try:
+            allowed, now, *windows = _script()(keys=[key for key, _, _ in limits], args=args)
+        except redis.RedisError:
+            logger.warning("Лимиты запросов не проверены: Redis недоступен", exc_info=True)
+            return True
+
+        states = []
+        for (_, count, window), used, oldest in zip(limits, windows[::2], windows[1::2]):
+            reset = max(0, oldest + window * 1000 - now) / 1000
+            states.append((count, max(0, count - used - allowed), reset, used >= count))
+        # заголовки — по лимиту, который исчерпается первым
+        limit, remaining, reset, _ = min(states, key=lambda state: (state[1], -state[2]))
+        request.rate_limit = {"limit": limit, "remaining": remaining, "reset": math.ceil(reset)}
+        if not allowed:
+            self.retry_after = max(reset for _, _, reset, exceeded in states if exceeded)
+        return bool(allowed)
+
+    def wait(self):
+        return self.retry_after
+
+
+class RateLimitMixin:
+    """
+    SlidingWindowThrottle и заголовки RateLimit-* для view
+    (лимиты задаются `throttle_scope`).
+    """
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        state = getattr(request, "rate_limit", None)
+        if state is not None:
+            response["RateLimit-Limit"] = state["limit"]
+            response["RateLimit-Remaining"] = state["remaining"]
+            response["RateLimit-Reset"] = state["reset"]
+        return response
@@ -0,0 +1,209 @@
+"""
+Уменьшенные копии (renditions) загруженных изображений.
+
+После загрузки превью курса/урока или аватара Celery-задача
+generate_image_renditions строит копии фиксированных размеров из
+settings.IMAGE_RENDITIONS в форматах WebP и JPEG и кладёт их рядом с
+оригиналом. Пути хранятся в JSON-поле `<поле>_renditions` вместе с именем
+оригинала, из которого они сделаны: пока копии для текущего файла не
+готовы, сериализатор отдаёт пустой объект.
+"""
+import logging
+import os
+from io import BytesIO
+
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# формат → (расширение, параметры Image.save)
+FORMATS = {
+    "webp": ("webp", {"format": "WEBP", "method": 4}),
+    "jpeg": ("jpg", {"format": "JPEG", "optimize": True, "progressive": True}),
+}
+_UNKNOWN = object()
+
+
+def renditions_field(field_name: str) -> str:
+    return f"{field_name}_renditions"
+
+
+def _name(value) -> str:
+    return getattr(value, "name", value) or ""
+
+
+def _rgb(image: Image.Image) -> Image.Image:
+    # JPEG без альфа-канала: прозрачность — на белом фоне
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def render_renditions(image_file, sizes: dict) -> dict:
+    """
+    Сохраняет копии `image_file` во всех размерах `sizes` ({имя: (ш, в)})
+    и форматах FORMATS рядом с оригиналом. Возвращает
+    {имя: {формат: путь в storage}}.
+
+    Копии обрезаются по центру до точного размера. Для JPEG-оригиналов
+    декодер сразу уменьшает картинку (draft), не распаковывая её целиком.
+    """
+    storage = image_file.storage
+    base, _ = os.path.splitext(image_file.name)
+    largest = max(sizes.values())
+
+    with image_file.open("rb"), Image.open(image_file) as source:
+        source.draft("RGB", largest)
+        source = ImageOps.exif_transpose(source)
+        source.load()
+
+        files = {}
+        for label, size in sizes.items():
+            resized = ImageOps.fit(source, tuple(size), Image.Resampling.LANCZOS)
+            files[label] = {}
+            for fmt, (extension, options) in FORMATS.items():
+                image = _rgb(resized) if fmt == "jpeg" else resized
+                buffer = BytesIO()
+                image.save(buffer, quality=settings.IMAGE_RENDITION_QUALITY[fmt], **options)
+                name = f"{base}.{label}.{extension}"
+                files[label][fmt] = storage.save(name, ContentFile(buffer.getvalue()))
+    return files
+
+
+def _paths(renditions: dict) -> set:
+    return {path for formats in (renditions or {}).get("files", {}).values() for path in formats.values()}
+
+
+def _delete(storage, paths) -> None:
+    for path in paths:
+        try:
+            storage.delete(path)
+        except OSError:
+            logger.warning("Не удалось удалить копию изображения %s", path)
+
+
+@shared_task(bind=True, autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def generate_image_renditions(self, model_label: str, pk: int, field_name: str) -> dict:
+    """
+    Строит копии изображения `field_name` объекта и записывает их пути.
+
+    Если пока задача работала, изображение заменили, результат
+    выбрасывается — копии построит задача, поставленная новой загрузкой.
+    Старые копии удаляются.
+    """
+    model = apps.get_model(model_label)
+    target = renditions_field(field_name)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return {}
+
+    image = getattr(instance, field_name)
+    storage = image.storage
+    files = {}
+    if image:
+        try:
+            files = render_renditions(image, settings.IMAGE_RENDITIONS[field_name])
+        except (UnidentifiedImageError, Image.DecompressionBombError) as exc:
+            # повтор не поможет: копий не будет, отдаётся только оригинал
+            logger.warning("%s #%s: не удалось обработать %s: %s", model_label, pk, image.name, exc)
+
+    with transaction.atomic():
+        current = model.objects.select_for_update().filter(pk=pk).values_list(field_name, flat=True).first()
+        if _name(current) != _name(image):
+            _delete(storage, _paths({"files": files}))
+            return {}
+        previous = getattr(instance, target)
+        setattr(instance, target, {"source": image.name, "files": files} if image else {})
+        # обычный save: сигналы сбрасывают кеш представлений
+        instance.save(update_fields=[target])
+
+    _delete(storage, _paths(previous) - _paths({"files": files}))
+    return files
+
+
+def generate_renditions_on_upload(model, field_name: str) -> None:
+    """
+    Ставит generate_image_renditions после коммита, когда у объекта
+    `model` меняется (загружается, заменяется или очищается) изображение
+    `field_name`. Сам запрос загрузки обработки не ждёт.
+    """
+    loaded = f"_loaded_{field_name}"
+    uid = f"{model._meta.label}.{field_name}"
+
+    def remember(sender, instance, **kwargs):
+        # поле может быть отложено через only()/defer()
+        value = instance.__dict__.get(field_name, _UNKNOWN)
+        instance.__dict__[loaded] = _UNKNOWN if value is _UNKNOWN else _name(value)
+
+    def schedule(sender, instance, created, update_fields=None, **kwargs):
+        if field_name not in instance.__dict__:
+            return
+        if update_fields is not None and field_name not in update_fields:
+            return
+        current = _name(instance.__dict__[field_name])
+        previous = instance.__dict__.get(loaded, _UNKNOWN)
+        instance.__dict__[loaded] = current
+        if created and not current:
+            return
+        if not created and current == previous:
+            return
+        transaction.on_commit(
+            lambda: generate_image_renditions.delay(model._meta.label, instance.pk, field_name)
+        )
+
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=f"{uid}.remember")
+    post_save.connect(schedule, sender=model, weak=False, dispatch_uid=f"{uid}.renditions")
+
+
+def rendition_urls(image_name, renditions, storage, request=None) -> dict:
+    """
+    {размер: {формат: url}} для копий изображения `image_name`; пустой
+    объект, если копии сделаны не из него (или ещё не готовы).
+    """
+    renditions = renditions or {}
+    if not image_name or renditions.get("source") != image_name:
+        return {}
+
+    result = {}
+    for label, formats in renditions["files"].items():
+        result[label] = {}
+        for fmt, path in formats.items():
+            url = storage.url(path)
+            result[label][fmt] = request.build_absolute_uri(url) if request else url
+    return result
+
+
+@extend_schema_field(OpenApiTypes.OBJECT)
+class ImageRenditionsField(serializers.Field):
+    """
+    URL копий изображения: {размер: {"webp": url, "jpeg": url}}.
+    Пустой объект — копии ещё не готовы или изображения нет.
+    """
+
+    def __init__(self, image_field: str, **kwargs):
+        self.image_field = image_field
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    @property
+    def columns(self) -> tuple:
+        """Столбцы модели, нужные полю (для only())."""
+        return self.image_field, renditions_field(self.image_field)
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        renditions = getattr(instance, renditions_field(self.image_field))
+        return rendition_urls(image.name, renditions, image.storage, self.context.get("request"))
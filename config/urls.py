@@ -5,6 +5,8 @@ from django.conf.urls.static import static
 
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from config.metrics import MetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
@@ -12,6 +14,7 @@ urlpatterns = [
     path('api/', include('users.urls')),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,224 @@
+import hashlib
+import time
+from operator import attrgetter, itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from rest_framework.response import Response
+
+from config.db_router import replica_reads_allowed
+from config.metrics import Counter, Gauge
+from config.representations import ValuesSerializer
+from .models import Lesson
+
+cache_requests = Counter(
+    "materials_cache_requests_total",
+    "Обращения к кешу сериализованных курсов и уроков",
+    labelnames=("kind", "result"),
+)
+
+
+def _hit_ratio():
+    totals = {}
+    for _, labels, value in cache_requests.samples():
+        totals[labels] = value
+    for kind in ("course", "lesson"):
+        hits = totals.get(f'kind="{kind}",result="hit"', 0)
+        misses = totals.get(f'kind="{kind}",result="miss"', 0)
+        if hits + misses:
+            yield {"kind": kind}, round(hits / (hits + misses), 4)
+
+
+Gauge(
+    "materials_cache_hit_ratio",
+    "Доля попаданий в кеш сериализованных курсов и уроков",
+    collect=lambda: list(_hit_ratio()),
+)
+
+
+def _new_version() -> int:
+    # Версия — момент изменения в нс. Если ключ версии вытеснен из Redis,
+    # новая версия не совпадёт ни с одной из прежних, и старые записи
+    # не будут прочитаны
+    return time.time_ns()
+
+
+class RepresentationCache:
+    """
+    Кеш сериализованных объектов (общая для всех пользователей часть ответа).
+
+    Запись лежит под ключом `<kind>:<pk>:v<версия>:<хост>[:<набор полей>]`; версия объекта —
+    отдельный ключ, который меняют сигналы post_save/post_delete
+    (materials/signals.py). Поля из `private_fields` зависят от пользователя,
+    в кеш не попадают и накладываются на ответ после чтения.
+
+    Промах, прочитанный с реплики в первые DB_REPLICA_PIN_SECONDS после
+    смены версии, отдаётся, но не кешируется: реплика могла ещё не получить
+    изменение, и старые данные легли бы под новую версию на сутки.
+    """
+
+    def __init__(self, kind: str, prefetch=(), private_fields=()):
+        self.kind = kind
+        self.prefetch = tuple(prefetch)
+        self.private_fields = tuple(private_fields)
+
+    def _version_key(self, pk) -> str:
+        return f"materials:{self.kind}:{pk}:version"
+
+    def bump(self, *pks) -> None:
+        """
+        Инвалидирует записи объектов. Внутри транзакции версия меняется
+        ещё раз после коммита, чтобы параллельный читатель не закешировал
+        старые данные под новой версией.
+        """
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return
+        self._bump(pks)
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._bump(pks))
+
+    def _bump(self, pks) -> None:
+        version = _new_version()
+        cache.set_many({self._version_key(pk): version for pk in pks}, timeout=None)
+
+    def _versions(self, pks) -> dict:
+        keys = {pk: self._version_key(pk) for pk in pks}
+        stored = cache.get_many(keys.values())
+        versions = {}
+        for pk, key in keys.items():
+            if key not in stored:
+                cache.add(key, _new_version(), timeout=None)
+                stored[key] = cache.get(key)
+            versions[pk] = stored[key]
+        return versions
+
+    def represent(self, instances, serializer, variant: str = "", prefetch=None,
+                  values_serializer=None) -> list[dict]:
+        """
+        Возвращает представления объектов в порядке `instances`.
+
+        `serializer` — сериализатор view (с контекстом запроса); он нужен
+        для промахов и для пользовательских полей. `variant` — ключ набора
+        полей (?fields=/?expand=): у каждого набора свои записи, а версия
+        объекта сбрасывает их все. `prefetch` заменяет связи, подтягиваемые
+        для промахов.
+
+        С `values_serializer` (config/representations.py) `instances` —
+        строки values(), и промахи строит он.
+        """
+        if not instances:
+            return []
+
+        request = serializer.context.get("request")
+        base_url = request.build_absolute_uri("/") if request else ""
+        host = hashlib.md5(base_url.encode()).hexdigest()[:8]
+
+        pk = itemgetter("id") if values_serializer is not None else attrgetter("pk")
+        versions = self._versions([pk(obj) for obj in instances])
+        suffix = f"{host}:{variant}" if variant else host
+        keys = [f"materials:{self.kind}:{pk(obj)}:v{versions[pk(obj)]}:{suffix}" for obj in instances]
+        payloads = cache.get_many(keys)
+
+        misses = [(obj, key) for obj, key in zip(instances, keys) if key not in payloads]
+        if misses:
+            # изменения новее lagging_since реплика могла ещё не получить
+            lagging_since = None
+            if replica_reads_allowed():
+                lagging_since = time.time_ns() - settings.DB_REPLICA_PIN_SECONDS * 10**9
+            objects = [obj for obj, _ in misses]
+            if values_serializer is not None:
+                built = values_serializer.represent(objects)
+            else:
+                prefetch = self.prefetch if prefetch is None else prefetch
+                if prefetch:
+                    prefetch_related_objects(objects, *prefetch)
+                built = [serializer.to_representation(obj) for obj in objects]
+            fresh = {}
+            cacheable = {}
+            for (obj, key), data in zip(misses, built):
+                data = dict(data)
+                for name in self.private_fields:
+                    data.pop(name, None)
+                fresh[key] = data
+                if lagging_since is None or versions[pk(obj)] < lagging_since:
+                    cacheable[key] = data
+            cache.set_many(cacheable, timeout=settings.MATERIALS_CACHE_TIMEOUT)
+            payloads.update(fresh)
+
+        hits = len(instances) - len(misses)
+        if hits:
+            cache_requests.inc(hits, kind=self.kind, result="hit")
+        if misses:
+            cache_requests.inc(len(misses), kind=self.kind, result="miss")
+
+        return [self._with_private_fields(obj, payloads[key], serializer) for obj, key in zip(instances, keys)]
+
+    def _with_private_fields(self, obj, payload, serializer) -> dict:
+        data = dict(payload)
+        for name in self.private_fields:
+            if name not in serializer.fields:
+                continue
+            if isinstance(obj, dict):
+                # строка values(): поле — аннотация queryset
+                data[name] = obj[name]
+                continue
+            field = serializer.fields[name]
+            data[name] = field.to_representation(field.get_attribute(obj))
+        return data
+
+
+LESSON_CACHE = RepresentationCache("lesson")
+COURSE_CACHE = RepresentationCache(
+    "course",
+    prefetch=[Prefetch("lessons", queryset=Lesson.objects.defer("search_vector").order_by("id"))],
+    private_fields=("is_subscribed",),
+)
+
+
+class CachedRepresentationMixin:
+    """
+    list/retrieve для view, отдающие представления через RepresentationCache.
+
+    list читает строки values() и строит промахи через ValuesSerializer
+    (config/representations.py); если сериализатор так не построить —
+    обычные объекты модели. retrieve всегда работает с объектом.
+    """
+    representation_cache = None
+
+    def get_representation_variant(self) -> str:
+        return ""
+
+    def get_representation_prefetch(self):
+        return None
+
+    def get_values_serializer(self, queryset):
+        return ValuesSerializer.build(self.get_serializer(), annotations=queryset.query.annotations)
+
+    def get_cached_representations(self, instances, values_serializer=None):
+        return self.representation_cache.represent(
+            list(instances),
+            self.get_serializer(),
+            variant=self.get_representation_variant(),
+            prefetch=self.get_representation_prefetch(),
+            values_serializer=values_serializer,
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        values_serializer = self.get_values_serializer(queryset)
+        if values_serializer is not None:
+            # столбцы сортировки — для позиции keyset-курсора
+            queryset = queryset.values(*values_serializer.columns, *getattr(self, "ordering_fields", ()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_cached_representations(page, values_serializer))
+
+        return Response(self.get_cached_representations(queryset, values_serializer))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return Response(self.get_cached_representations([instance])[0])
@@ -0,0 +1,145 @@
+import hashlib
+from collections import namedtuple
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+# fields — поля верхнего уровня; nested — {связь: поля вложенного объекта или None (все)}
+Fieldset = namedtuple("Fieldset", ["fields", "nested"])
+
+
+def _split(value: str) -> list[str]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def fieldset_key(fieldset: Fieldset) -> str:
+    """Короткий стабильный ключ набора полей — часть ключа кеша представлений."""
+    parts = [",".join(sorted(fieldset.fields))]
+    for name in sorted(fieldset.nested):
+        parts.append(f"{name}:{','.join(sorted(fieldset.nested[name] or ['*']))}")
+    return hashlib.md5("|".join(parts).encode()).hexdigest()[:8]
+
+
+def _child(field):
+    return field.child if isinstance(field, ListSerializer) else field
+
+
+def serializer_columns(fields: dict, model) -> set[str]:
+    """
+    Столбцы модели, которые нужны полям сериализатора: обычные поля
+    модели и поля с атрибутом `columns` (например, ImageRenditionsField).
+    Аннотации и вложенные связи столбцов не требуют.
+    """
+    concrete = {field.name for field in model._meta.concrete_fields}
+    columns = set()
+    for field in fields.values():
+        if hasattr(field, "columns"):
+            columns.update(field.columns)
+        elif field.source in concrete and not hasattr(field, "child"):
+            columns.add(field.source)
+    return columns
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Сериализатор, который оставляет только поля из `fieldset`
+    (и поля вложенных сериализаторов из fieldset.nested).
+    """
+
+    def __init__(self, *args, fieldset: Fieldset | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fieldset is None:
+            return
+        for name in list(self.fields):
+            if name not in fieldset.fields:
+                self.fields.pop(name)
+        for name, child_fields in fieldset.nested.items():
+            if child_fields is None or name not in self.fields:
+                continue
+            child = _child(self.fields[name])
+            for child_name in list(child.fields):
+                if child_name not in child_fields:
+                    child.fields.pop(child_name)
+
+
+class SparseFieldsetMixin:
+    """
+    `?fields=` и `?expand=` для GET-запросов view.
+
+    - `?fields=id,title,lessons.title` — только перечисленные поля
+      (через точку — поля вложенных объектов);
+    - `?expand=lessons` — добавить связь из `expandable_fields`, которая
+      по умолчанию не отдаётся (кроме действий из `default_expand`).
+
+    Невыбранные столбцы отбрасываются через only(), а представления
+    кешируются отдельно для каждого набора полей.
+    """
+    expandable_fields = ()
+    # действие → связи, которые отдаются и без ?expand=
+    default_expand = {}
+    # столбцы, нужные view независимо от полей (права, сигналы)
+    required_columns = ("id",)
+
+    def get_fieldset(self) -> Fieldset | None:
+        if self.request is None or self.request.method != "GET":
+            return None
+        if not hasattr(self, "_fieldset"):
+            self._fieldset = self._parse_fieldset(self.request.query_params)
+        return self._fieldset
+
+    def _parse_fieldset(self, params) -> Fieldset:
+        available = self.get_serializer_class()().fields
+        expand = set(_split(params.get(EXPAND_PARAM, "")))
+        unknown = expand - set(self.expandable_fields)
+        if unknown:
+            raise ValidationError({EXPAND_PARAM: [f"Нельзя раскрыть: {', '.join(sorted(unknown))}."]})
+
+        requested = params.get(FIELDS_PARAM)
+        nested = {}
+        if requested is None:
+            # у generic-view нет action — только значения по умолчанию
+            expand |= set(self.default_expand.get(getattr(self, "action", None), ()))
+            fields = set(available) - (set(self.expandable_fields) - expand)
+        else:
+            fields = set(expand)
+            for name in _split(requested):
+                top, _, child = name.partition(".")
+                fields.add(top)
+                if child:
+                    nested.setdefault(top, set()).add(child)
+            unknown = fields - set(available)
+            for top, children in nested.items():
+                if top not in self.expandable_fields:
+                    unknown.add(top)
+                elif top in available:
+                    unknown.update(f"{top}.{child}" for child in children - set(_child(available[top]).fields))
+            if unknown:
+                raise ValidationError({FIELDS_PARAM: [f"Неизвестные поля: {', '.join(sorted(unknown))}."]})
+
+        for name in set(self.expandable_fields) & fields:
+            nested.setdefault(name, None)
+        return Fieldset(frozenset(fields), nested)
+
+    def get_fieldset_columns(self, fieldset: Fieldset) -> set[str]:
+        serializer = self.get_serializer_class()(fieldset=fieldset)
+        model = self.get_serializer_class().Meta.model
+        return serializer_columns(serializer.fields, model) | set(self.required_columns)
+
+    def apply_fieldset(self, queryset):
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return queryset
+        return queryset.only(*self.get_fieldset_columns(fieldset))
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            kwargs.setdefault("fieldset", fieldset)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_representation_variant(self) -> str:
+        fieldset = self.get_fieldset()
+        return fieldset_key(fieldset) if fieldset is not None else ""
@@ -0,0 +1,26 @@
+from rest_framework.filters import BaseFilterBackend
+
+from .services.search import search_query
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    `?search=` — полнотекстовый поиск по названию и описанию
+    (хранимый search_vector, GIN-индекс). Сортировку не меняет.
+    """
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, "").strip()
+        if not text:
+            return queryset
+        return queryset.filter(search_vector=search_query(text))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            "name": self.search_param,
+            "required": False,
+            "in": "query",
+            "description": "Полнотекстовый поиск по названию и описанию",
+            "schema": {"type": "string"},
+        }]
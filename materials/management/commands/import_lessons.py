@@ -0,0 +1,55 @@
+import csv
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from materials.services.lesson_import import CSV, FORMATS, JSONL, import_lessons
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Импортирует уроки из файла JSONL/CSV одной транзакцией"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="файл с уроками")
+        parser.add_argument("--format", choices=FORMATS, help="формат файла (по умолчанию — по расширению)")
+        parser.add_argument("--owner", help="email автора уроков (только его курсы); по умолчанию — владелец курса")
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.LESSON_IMPORT_BATCH_SIZE, help="строк в одной пачке"
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        fmt = options["format"] or (CSV if path.suffix.lower() == ".csv" else JSONL)
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше 0")
+
+        owner = None
+        if options["owner"]:
+            owner = User.objects.filter(email=options["owner"]).first()
+            if owner is None:
+                raise CommandError(f"Пользователь {options['owner']} не найден")
+
+        try:
+            with path.open("rb") as stream:
+                result = import_lessons(
+                    stream,
+                    fmt,
+                    owner=owner,
+                    batch_size=options["batch_size"],
+                    max_errors=settings.LESSON_IMPORT_MAX_ERRORS,
+                )
+        except OSError as exc:
+            raise CommandError(f"Не удалось открыть файл: {exc}")
+        except (ValueError, csv.Error) as exc:
+            raise CommandError(f"Не удалось прочитать файл: {exc}")
+
+        if result["errors"]:
+            for error in result["errors"]:
+                self.stderr.write(f"строка {error['line']}: {error['errors']}")
+            raise CommandError("Импорт отменён: в файле есть ошибки")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: {result['created']} уроков в {len(result['courses'])} курсах"
+        ))
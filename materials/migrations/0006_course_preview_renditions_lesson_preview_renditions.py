@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0005_course_title_id_idx_lesson_title_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='preview_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='копии превью'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='preview_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='копии превью'),
+        ),
+    ]
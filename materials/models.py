@@ -1,6 +1,27 @@
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 
+# Язык полнотекстового поиска по курсам и урокам
+SEARCH_CONFIG = 'russian'
+
+
+def search_vector_field():
+    """
+    Хранимый tsvector: название (вес A) важнее описания (вес B).
+    Столбец генерируется самой БД, поэтому актуален и после bulk_create/update().
+    """
+    return models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name='поисковый вектор',
+    )
+
 
 class Course(models.Model):
     title = models.CharField(max_length=255, verbose_name='название')
@@ -11,6 +32,12 @@ class Course(models.Model):
         null=True,
         verbose_name='превью'
     )
+    preview_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='копии превью',
+    )
 
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -26,6 +53,13 @@ class Course(models.Model):
         blank=True,
         verbose_name="последняя отправка уведомления",
     )
+    search_vector = search_vector_field()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['title', 'id'], name='course_title_id_idx'),
+            GinIndex(fields=['search_vector'], name='course_search_vector_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -46,6 +80,12 @@ class Lesson(models.Model):
         null=True,
         verbose_name='превью'
     )
+    preview_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='копии превью',
+    )
     video_url = models.URLField(verbose_name='ссылка на видео')
 
     owner = models.ForeignKey(
@@ -56,6 +96,13 @@ class Lesson(models.Model):
         related_name='lessons',
         verbose_name='владелец'
     )
+    search_vector = search_vector_field()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['title', 'id'], name='lesson_title_id_idx'),
+            GinIndex(fields=['search_vector'], name='lesson_search_vector_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title} ({self.course})'
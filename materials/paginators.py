@@ -1,7 +1,176 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
 
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class DefaultPagination(PageNumberPagination):
+KeysetCursor = namedtuple('KeysetCursor', ['position', 'reverse', 'inclusive'])
+
+
+def _reverse_ordering(ordering):
+    return tuple(o[1:] if o.startswith('-') else f'-{o}' for o in ordering)
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация по паре (поле сортировки, id) без COUNT(*) и OFFSET.
+
+    Следующая страница выбирается условием
+    `field <= v AND (field < v OR (field = v AND id < pk))`, которое
+    отрабатывает по индексу (field, id) одинаково быстро на любой глубине.
+    Курсор непрозрачный: base64 от JSON с позицией последнего объекта.
+
+    Сортировка берётся из OrderingFilter view (или атрибута `ordering`);
+    учитывается первое поле, вторым всегда добавляется id.
+    """
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 50
+    ordering = "id"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self._keyset_ordering(self.get_ordering(request, queryset, view))
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+
+        try:
+            if self.cursor is not None:
+                queryset = queryset.filter(
+                    self._position_filter(ordering, self.cursor.position, self.cursor.inclusive)
+                )
+            # Берём на один объект больше, чтобы узнать, есть ли следующая страница
+            results = list(queryset[:self.page_size + 1])
+        except (TypeError, ValueError, ValidationError):
+            # позиция в курсоре не приводится к типу поля сортировки
+            raise NotFound(self.invalid_cursor_message)
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            cursor = KeysetCursor(self._get_position(self.page[-1]), False, False)
+        elif self.cursor.reverse:
+            # перед позицией курсора ничего нет — это первая страница
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        else:
+            cursor = self.cursor
+        return self.encode_cursor(cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            cursor = KeysetCursor(self._get_position(self.page[0]), True, False)
+        else:
+            # страница пуста (записи удалены) — возвращаемся включительно
+            cursor = KeysetCursor(self.cursor.position, True, True)
+        return self.encode_cursor(cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            data = json.loads(urlsafe_b64decode((encoded + padding).encode('ascii')))
+            position = data['p']
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            return KeysetCursor(position, bool(data.get('r')), bool(data.get('i')))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        data = {'p': cursor.position}
+        if cursor.reverse:
+            data['r'] = 1
+        if cursor.inclusive:
+            data['i'] = 1
+        encoded = urlsafe_b64encode(
+            json.dumps(data, separators=(',', ':')).encode('utf-8')
+        ).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    @staticmethod
+    def _keyset_ordering(ordering):
+        field = ordering[0]
+        if field.lstrip('-') in ('id', 'pk'):
+            return (field,)
+        tiebreaker = '-pk' if field.startswith('-') else 'pk'
+        return (field, tiebreaker)
+
+    def _get_position(self, instance):
+        position = []
+        for order in self.ordering:
+            name = order.lstrip('-')
+            if isinstance(instance, dict):
+                # строка values()
+                value = instance['id' if name == 'pk' else name]
+            else:
+                value = getattr(instance, name)
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            position.append(value)
+        return position
+
+    @staticmethod
+    def _position_filter(ordering, position, inclusive):
+        """
+        Условие «строго после позиции» для текущего направления сортировки.
+        """
+        field = ordering[0]
+        name = field.lstrip('-')
+        op = 'lt' if field.startswith('-') else 'gt'
+
+        if len(ordering) == 1:
+            return Q(**{f'{name}__{op}{"e" if inclusive else ""}': position[0]})
+
+        value, pk = position
+        pk_op = f'{op}e' if inclusive else op
+        return Q(**{f'{name}__{op}e': value}) & (
+            Q(**{f'{name}__{op}': value}) | Q(**{name: value, f'pk__{pk_op}': pk})
+        )
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Страницы результатов поиска. Выдача упорядочена по релевантности,
+    которую не выразить keyset-курсором, а смотрят обычно первые страницы —
+    поэтому номера страниц и общее число найденного (`count`).
+    """
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 50
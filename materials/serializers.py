@@ -1,33 +1,73 @@
 from rest_framework import serializers
+
+from config.thumbnails import ImageRenditionsField
+from .fieldsets import SparseFieldsetSerializerMixin
 from .models import Course, Lesson, Subscription
+from .services.search import COURSE, LESSON
 from .validators import validate_youtube_url
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     video_url = serializers.URLField(validators=[validate_youtube_url])
+    preview_renditions = ImageRenditionsField('preview')
 
     class Meta:
         model = Lesson
-        fields = '__all__'
+        exclude = ['search_vector']
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     lessons_count = serializers.SerializerMethodField()
     lessons = LessonSerializer(many=True, read_only=True)
     is_subscribed = serializers.SerializerMethodField()
+    preview_renditions = ImageRenditionsField('preview')
 
     class Meta:
         model = Course
         fields = [
-            'id', 'title', 'description', 'preview',
+            'id', 'title', 'description', 'preview', 'preview_renditions',
             'lessons_count', 'lessons', 'is_subscribed',
         ]
 
     def get_lessons_count(self, obj):
+        # значение из аннотации CourseViewSet.get_queryset, если оно есть
+        if hasattr(obj, "lessons_count"):
+            return obj.lessons_count
         return obj.lessons.count()
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         request = self.context.get("request")
         if not request or request.user.is_anonymous:
             return False
-        return Subscription.objects.filter(user=request.user, course=obj).exists()
+        return Subscription.objects.filter(user_id=request.user.id, course=obj).exists()
+
+
+class SubscriptionBulkSerializer(serializers.Serializer):
+    """Массовая подписка/отписка: список id курсов и действие."""
+
+    SUBSCRIBE = "subscribe"
+    UNSUBSCRIBE = "unsubscribe"
+
+    course_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000,
+    )
+    action = serializers.ChoiceField(choices=[SUBSCRIBE, UNSUBSCRIBE])
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """Параметры /api/search/: текст запроса и тип результатов."""
+    search = serializers.CharField(max_length=200, trim_whitespace=True)
+    type = serializers.ChoiceField(choices=[COURSE, LESSON], required=False)
+
+
+class SearchResultSerializer(serializers.Serializer):
+    """Найденный курс или урок (для урока — id его курса)."""
+    type = serializers.CharField(source="kind")
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    course = serializers.IntegerField(source="course_ref", allow_null=True)
+    rank = serializers.FloatField()
@@ -0,0 +1,142 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from rest_framework import serializers
+
+from materials.cache import COURSE_CACHE
+from materials.models import Course, Lesson
+from materials.validators import validate_youtube_url
+from .notifications import schedule_course_update_notification
+
+JSONL, CSV = "jsonl", "csv"
+FORMATS = (JSONL, CSV)
+
+
+class LessonImportRowSerializer(serializers.Serializer):
+    """Строка импорта уроков (тот же набор проверок, что у LessonSerializer)."""
+    course = serializers.IntegerField(min_value=1)
+    title = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True, default="")
+    video_url = serializers.URLField(validators=[validate_youtube_url])
+
+
+def _lines(stream):
+    """
+    Строки текста из бинарного потока (загруженный файл, тело запроса,
+    открытый файл) без чтения его целиком.
+    """
+    first = True
+    for raw in iter(stream.readline, b""):
+        line = raw.decode("utf-8")
+        if first:
+            line = line.lstrip("\ufeff")
+            first = False
+        yield line
+
+
+def _rows(stream, fmt):
+    """
+    Пары (номер строки, dict | None); None — строку не удалось разобрать.
+    """
+    if fmt == CSV:
+        # недостающие в строке колонки — пустые строки, а не None
+        reader = csv.DictReader(_lines(stream), restval="")
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_lessons(stream, fmt: str, owner=None, batch_size: int = 500, max_errors: int = 100) -> dict:
+    """
+    Потоковый импорт уроков из JSONL/CSV (поля course, title, description,
+    video_url).
+
+    Строки читаются и проверяются пачками по `batch_size` (один запрос
+    курсов на пачку) и вставляются bulk_create. Импорт —
+    одна транзакция: если хоть одна строка с ошибкой, ничего не сохраняется,
+    а в ответе — ошибки по номерам строк (не больше `max_errors`).
+
+    `owner` — автор уроков; с ним уроки можно добавлять только в его курсы.
+    Без него (команда import_lessons) владельцем становится владелец курса.
+
+    Сигналы post_save при bulk_create не срабатывают, поэтому кеш курсов
+    сбрасывается здесь же, а подписчики каждого курса получают не больше
+    одного уведомления на весь импорт.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    errors = []
+    created = 0
+    course_ids = set()
+    courses = Course.objects.all() if owner is None else Course.objects.filter(owner_id=owner.pk)
+    # один экземпляр на весь импорт: поля и валидаторы строятся один раз
+    validator = LessonImportRowSerializer()
+
+    with transaction.atomic():
+        for batch in _batches(_rows(stream, fmt), batch_size):
+            parsed = [(number, row) for number, row in batch if row is not None]
+            errors.extend(
+                {"line": number, "errors": {"non_field_errors": ["Не удалось разобрать строку."]}}
+                for number, row in batch if row is None
+            )
+
+            valid = []
+            for number, row in parsed:
+                try:
+                    valid.append((number, validator.run_validation(row)))
+                except serializers.ValidationError as exc:
+                    errors.append({"line": number, "errors": exc.detail})
+
+            owners = dict(
+                courses.filter(pk__in={data["course"] for _, data in valid}).values_list("pk", "owner_id")
+            )
+            lessons = []
+            for number, data in valid:
+                if data["course"] not in owners:
+                    errors.append({"line": number, "errors": {"course": ["Курс не найден."]}})
+                    continue
+                lessons.append(Lesson(
+                    course_id=data["course"],
+                    title=data["title"],
+                    description=data["description"],
+                    video_url=data["video_url"],
+                    owner_id=owner.pk if owner is not None else owners[data["course"]],
+                ))
+
+            if errors:
+                # строки уже не сохранятся — дальше только собираем ошибки
+                if len(errors) >= max_errors:
+                    break
+                continue
+
+            Lesson.objects.bulk_create(lessons)
+            created += len(lessons)
+            course_ids.update(lesson.course_id for lesson in lessons)
+
+        if errors:
+            transaction.set_rollback(True)
+            return {"created": 0, "courses": [], "errors": errors[:max_errors]}
+
+        COURSE_CACHE.bump(*course_ids)
+        for course_id in sorted(course_ids):
+            schedule_course_update_notification(course_id)
+
+    return {"created": created, "courses": sorted(course_ids), "errors": []}
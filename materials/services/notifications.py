@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from materials.models import Course
+from materials.tasks import notify_course_updated
+
+
+def schedule_course_update_notification(course_id: int) -> bool:
+    """
+    Планирует уведомление подписчиков об обновлении курса.
+
+    Троттлинг без блокировки строки на время запроса: окно
+    COURSE_NOTIFY_THROTTLE «занимается» одним условным UPDATE, и только
+    первый из одновременных редакторов получает обновлённую строку.
+    Остальные правки из окна схлопываются в одну задачу, которая уходит
+    с задержкой COURSE_NOTIFY_DELAY и только после коммита транзакции.
+
+    Возвращает True, если задача поставлена в очередь.
+    """
+    now = timezone.now()
+    threshold = now - settings.COURSE_NOTIFY_THROTTLE
+
+    claimed = (
+        Course.objects
+        .filter(pk=course_id)
+        .filter(
+            Q(last_notification_sent_at__isnull=True)
+            | Q(last_notification_sent_at__lte=threshold)
+        )
+        .update(last_notification_sent_at=now)
+    )
+    if not claimed:
+        return False
+
+    transaction.on_commit(
+        lambda: notify_course_updated.apply_async(
+            (course_id,), countdown=settings.COURSE_NOTIFY_DELAY
+        )
+    )
+    return True
@@ -0,0 +1,57 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import BigIntegerField, F, Value
+
+from materials.models import SEARCH_CONFIG, Course, Lesson
+from users.permissions import is_moderator
+
+COURSE, LESSON = "course", "lesson"
+
+
+def search_query(text: str) -> SearchQuery:
+    """
+    Запрос в синтаксисе поисковиков: слова, "фраза", -исключение, or.
+    """
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+
+
+def visible_courses(user):
+    """Курсы, которые видит пользователь в списке (модератор — все)."""
+    if is_moderator(user):
+        return Course.objects.all()
+    return Course.objects.filter(owner_id=user.pk)
+
+
+def visible_lessons(user):
+    """Уроки, которые видит пользователь в списке (модератор — все)."""
+    if is_moderator(user):
+        return Lesson.objects.all()
+    return Lesson.objects.filter(owner_id=user.pk)
+
+
+def search_materials(user, text: str, kind: str | None = None):
+    """
+    Курсы и уроки, подходящие под `text`, по убыванию релевантности.
+
+    Обе выборки идут по GIN-индексам search_vector и объединяются одним
+    UNION ALL; строки — словари id, title, kind, course_ref (курс урока), rank.
+    """
+    query = search_query(text)
+    rank = SearchRank(F("search_vector"), query)
+    parts = []
+    if kind in (None, COURSE):
+        parts.append(
+            visible_courses(user)
+            .filter(search_vector=query)
+            .annotate(kind=Value(COURSE), course_ref=Value(None, output_field=BigIntegerField()), rank=rank)
+            .values("id", "title", "kind", "course_ref", "rank")
+        )
+    if kind in (None, LESSON):
+        parts.append(
+            visible_lessons(user)
+            .filter(search_vector=query)
+            .annotate(kind=Value(LESSON), course_ref=F("course_id"), rank=rank)
+            .values("id", "title", "kind", "course_ref", "rank")
+        )
+
+    results = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    return results.order_by("-rank", "kind", "id")
@@ -0,0 +1,66 @@
+from django.db import connection
+from django.utils import timezone
+
+from materials.models import Course, Subscription
+
+
+def toggle_subscription(user_id: int, course_id: int) -> bool | None:
+    """
+    Переключает подписку пользователя на курс за один-два запроса.
+
+    Сначала DELETE: если строка удалена — подписки больше нет. Иначе
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING, который вставляет строку,
+    только если курс существует, и не падает на unique_user_course_subscription
+    при двойном клике. Возвращает True/False — подписан ли пользователь после
+    операции, и None, если курса нет.
+    """
+    deleted, _ = Subscription.objects.filter(user_id=user_id, course_id=course_id).delete()
+    if deleted:
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Subscription._meta.db_table} (user_id, course_id, created_at)
+            SELECT %s, id, %s FROM {Course._meta.db_table} WHERE id = %s
+            ON CONFLICT DO NOTHING
+            """,
+            [user_id, timezone.now(), course_id],
+        )
+        inserted = cursor.rowcount
+
+    if inserted:
+        return True
+    # Ничего не вставлено: либо курса нет, либо параллельный запрос
+    # уже создал подписку — различаем только в этом редком случае.
+    if Course.objects.filter(pk=course_id).exists():
+        return True
+    return None
+
+
+def subscribe_many(user_id: int, course_ids) -> tuple[list[int], list[int]]:
+    """
+    Подписывает пользователя на несколько курсов одним bulk_create.
+
+    Возвращает (id курсов, на которые пользователь подписан; id не найденных курсов).
+    """
+    requested = set(course_ids)
+    existing = set(Course.objects.filter(pk__in=requested).values_list("pk", flat=True))
+
+    Subscription.objects.bulk_create(
+        [Subscription(user_id=user_id, course_id=course_id) for course_id in existing],
+        ignore_conflicts=True,
+    )
+    return sorted(existing), sorted(requested - existing)
+
+
+def unsubscribe_many(user_id: int, course_ids) -> int:
+    """
+    Удаляет подписки пользователя на указанные курсы одним DELETE.
+
+    Возвращает количество удалённых подписок.
+    """
+    deleted, _ = Subscription.objects.filter(
+        user_id=user_id, course_id__in=set(course_ids)
+    ).delete()
+    return deleted
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from config.thumbnails import generate_renditions_on_upload
+from .cache import COURSE_CACHE, LESSON_CACHE
+from .models import Course, Lesson
+
+User = get_user_model()
+
+generate_renditions_on_upload(Course, 'preview')
+generate_renditions_on_upload(Lesson, 'preview')
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def reset_course_cache(sender, instance, **kwargs):
+    COURSE_CACHE.bump(instance.pk)
+
+
+@receiver(post_init, sender=Lesson)
+def remember_lesson_course(sender, instance, **kwargs):
+    # курс, в котором урок был при загрузке: при переносе урока
+    # нужно сбросить и старый курс (course_id может быть отложен через only())
+    instance._loaded_course_id = instance.__dict__.get('course_id')
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def reset_lesson_cache(sender, instance, **kwargs):
+    LESSON_CACHE.bump(instance.pk)
+    COURSE_CACHE.bump(instance.course_id, getattr(instance, '_loaded_course_id', None))
+    instance._loaded_course_id = instance.course_id
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_materials(sender, instance, **kwargs):
+    # owner уроков обнуляется UPDATE-ом без сигналов — запоминаем,
+    # чьи представления сбросить после удаления пользователя
+    instance._owned_lessons = list(instance.lessons.values_list('pk', 'course_id'))
+
+
+@receiver(post_delete, sender=User)
+def reset_user_materials_cache(sender, instance, **kwargs):
+    lessons = getattr(instance, '_owned_lessons', [])
+    LESSON_CACHE.bump(*(pk for pk, _ in lessons))
+    COURSE_CACHE.bump(*(course_id for _, course_id in lessons))
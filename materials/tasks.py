@@ -1,31 +1,83 @@
+import logging
+from itertools import islice
+from smtplib import SMTPConnectError, SMTPRecipientsRefused, SMTPServerDisconnected
+
 from celery import shared_task
-from django.core.mail import send_mail
 from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
 
 from materials.models import Course, Subscription
 
+logger = logging.getLogger(__name__)
 
-@shared_task
-def notify_course_updated(course_id: int) -> dict:
-    course = Course.objects.get(pk=course_id)
+NOTIFY_PROGRESS_KEY = "materials:notify_course_updated:{task_id}"
+NOTIFY_PROGRESS_TIMEOUT = 60 * 60 * 24
+# ошибки соединения с SMTP-сервером: повтор задачи имеет смысл
+SMTP_CONNECTION_ERRORS = (SMTPConnectError, SMTPServerDisconnected, ConnectionError, TimeoutError)
 
-    emails = list(
-        Subscription.objects.filter(course=course)
-        .select_related("user")
-        .values_list("user__email", flat=True)
-    )
 
-    if not emails:
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=SMTP_CONNECTION_ERRORS,
+    retry_backoff=True,
+    max_retries=5,
+)
+def notify_course_updated(self, course_id: int) -> dict:
+    """
+    Рассылает подписчикам курса письмо об обновлении.
+
+    Подписчики читаются серверным курсором пачками по
+    COURSE_NOTIFY_CHUNK_SIZE, каждому уходит отдельное письмо через одно
+    SMTP-соединение. Адрес, который сервер отверг, пропускается с
+    предупреждением в логе — остальные подписчики письмо получают;
+    повтор задачи — только при ошибках соединения. После каждой пачки
+    в кеш записывается id последней обработанной подписки, поэтому
+    повтор задачи (retry с тем же task id) продолжает с места сбоя,
+    а не рассылает всё заново. Курс, удалённый до запуска, пропускается.
+    """
+    course = Course.objects.only("title").filter(pk=course_id).first()
+    if course is None:
+        logger.info("Курс %s удалён, рассылка об обновлении пропущена", course_id)
         return {"sent": 0}
 
+    progress_key = None
+    last_subscription_id = 0
+    if self.request.id:
+        progress_key = NOTIFY_PROGRESS_KEY.format(task_id=self.request.id)
+        last_subscription_id = cache.get(progress_key, 0)
+
     subject = f"Курс обновлён: {course.title}"
     message = f"В курсе «{course.title}» появились обновления. Загляни в LMS 🙂"
+    chunk_size = settings.COURSE_NOTIFY_CHUNK_SIZE
 
-    sent = send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=emails,
-        fail_silently=False,
+    subscribers = (
+        Subscription.objects
+        .filter(course_id=course_id, pk__gt=last_subscription_id)
+        .order_by("pk")
+        .values_list("pk", "user__email")
+        .iterator(chunk_size=chunk_size)
     )
+
+    sent = 0
+    with get_connection(fail_silently=False) as connection:
+        for chunk in _chunked(subscribers, chunk_size):
+            for _, email in chunk:
+                letter = EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [email], connection=connection)
+                try:
+                    sent += letter.send()
+                except SMTPRecipientsRefused:
+                    logger.warning("Письмо об обновлении курса %s не принято для %s", course_id, email, exc_info=True)
+
+            if progress_key:
+                cache.set(progress_key, chunk[-1][0], NOTIFY_PROGRESS_TIMEOUT)
+
+    if progress_key:
+        cache.delete(progress_key)
     return {"sent": sent}
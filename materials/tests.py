@@ -1,11 +1,48 @@
+import json
+import shutil
+import tempfile
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.db.models import Count, Prefetch, Value
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
 
+from config.db_router import PIN_CACHE_KEY, ReplicaRouter, ReplicaRoutingMiddleware
+from config.renderers import ORJSONRenderer
+from config.representations import ValuesSerializer
+from config.thumbnails import generate_image_renditions
+from materials.cache import cache_requests
+from materials.fieldsets import Fieldset
 from materials.models import Course, Lesson, Subscription
+from materials.serializers import CourseSerializer, LessonSerializer
+from materials.services.notifications import schedule_course_update_notification
+from materials.tasks import NOTIFY_PROGRESS_KEY, notify_course_updated
+from users.permissions import is_moderator
 
 User = get_user_model()
 
@@ -114,18 +151,18 @@ class LessonCRUDTests(APITestCase):
         self.client.force_authenticate(user=self.owner)
         resp_owner = self.client.get(self.lesson_list_url)
         self.assertEqual(resp_owner.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp_owner.data["count"], 1)
+        self.assertEqual(len(resp_owner.data["results"]), 1)
 
         self.client.force_authenticate(user=self.other)
         resp_other = self.client.get(self.lesson_list_url)
         self.assertEqual(resp_other.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp_other.data["count"], 0)
+        self.assertEqual(len(resp_other.data["results"]), 0)
 
     def test_lessons_list_for_moderator_shows_all(self):
         self.client.force_authenticate(user=self.moderator)
         resp = self.client.get(self.lesson_list_url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(resp.data["count"], 1)
+        self.assertGreaterEqual(len(resp.data["results"]), 1)
 
 
 class SubscriptionTests(APITestCase):
@@ -158,6 +195,87 @@ class SubscriptionTests(APITestCase):
         self.assertEqual(resp2.data["is_subscribed"], False)
         self.assertFalse(Subscription.objects.filter(user=self.user, course=self.course).exists())
 
+    def test_toggle_runs_at_most_two_statements(self):
+        self.client.force_authenticate(user=self.user)
+        is_moderator(self.user)
+
+        with self.assertNumQueries(2):
+            resp = self.client.post(self.subscription_url, data={"course_id": self.course.id}, format="json")
+        self.assertTrue(resp.data["is_subscribed"])
+
+        with self.assertNumQueries(1):
+            resp = self.client.post(self.subscription_url, data={"course_id": self.course.id}, format="json")
+        self.assertFalse(resp.data["is_subscribed"])
+
+    def test_toggle_unknown_course_returns_404(self):
+        self.client.force_authenticate(user=self.user)
+
+        for course_id in (self.course.id + 1000, None, "abc"):
+            resp = self.client.post(self.subscription_url, data={"course_id": course_id}, format="json")
+            self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Subscription.objects.filter(user=self.user).exists())
+
+    def test_double_submit_does_not_fail(self):
+        # подписка уже создана параллельным запросом между DELETE и INSERT
+        self.client.force_authenticate(user=self.user)
+        Subscription.objects.create(user=self.user, course=self.course)
+
+        with mock.patch(
+            "materials.services.subscriptions.Subscription.objects.filter"
+        ) as filter_:
+            filter_.return_value.delete.return_value = (0, {})
+            resp = self.client.post(self.subscription_url, data={"course_id": self.course.id}, format="json")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.data["is_subscribed"])
+        self.assertEqual(Subscription.objects.filter(user=self.user, course=self.course).count(), 1)
+
+    def test_bulk_subscribe_and_unsubscribe(self):
+        self.client.force_authenticate(user=self.user)
+        other = Course.objects.create(title="Второй курс", owner=self.user)
+        Subscription.objects.create(user=self.user, course=self.course)
+        bulk_url = reverse("course-subscription-bulk")
+        missing_id = other.id + 1000
+
+        resp = self.client.post(
+            bulk_url,
+            data={"action": "subscribe", "course_ids": [self.course.id, other.id, missing_id]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["course_ids"], sorted([self.course.id, other.id]))
+        self.assertEqual(resp.data["not_found"], [missing_id])
+        self.assertEqual(Subscription.objects.filter(user=self.user).count(), 2)
+
+        resp = self.client.post(
+            bulk_url,
+            data={"action": "unsubscribe", "course_ids": [self.course.id, other.id]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["removed"], 2)
+        self.assertFalse(Subscription.objects.filter(user=self.user).exists())
+
+    def test_bulk_validates_input(self):
+        self.client.force_authenticate(user=self.user)
+
+        resp = self.client.post(
+            reverse("course-subscription-bulk"),
+            data={"action": "toggle", "course_ids": []},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("action", resp.data)
+        self.assertIn("course_ids", resp.data)
+
+        resp = self.client.post(
+            reverse("course-subscription-bulk"),
+            data={"action": "subscribe", "course_ids": ["abc"]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("0", resp.json()["course_ids"])
+
     def test_is_subscribed_in_course_response(self):
         self.client.force_authenticate(user=self.user)
 
@@ -176,5 +294,1018 @@ class SubscriptionTests(APITestCase):
 
         resp = self.client.get(self.course_list_url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertIn("count", resp.data)
+        self.assertIn("next", resp.data)
+        self.assertIn("previous", resp.data)
         self.assertIn("results", resp.data)
+        self.assertNotIn("count", resp.data)
+
+
+class CourseQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="counter@test.com", password="12345")
+        self.course_list_url = reverse("course-list")
+        # роль резолвится один раз и кешируется — считаем запросы без неё
+        is_moderator(self.user)
+
+    def _create_courses(self, count, lessons_per_course):
+        for i in range(count):
+            course = Course.objects.create(title=f"Курс {i}", owner=self.user)
+            Lesson.objects.bulk_create([
+                Lesson(
+                    course=course,
+                    title=f"Урок {j}",
+                    video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                    owner=self.user,
+                )
+                for j in range(lessons_per_course)
+            ])
+            if i % 2 == 0:
+                Subscription.objects.create(user=self.user, course=course)
+
+    def _get_and_count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp, len(ctx.captured_queries)
+
+    def test_course_list_query_count_does_not_depend_on_page_size(self):
+        self.client.force_authenticate(user=self.user)
+        url = f"{self.course_list_url}?page_size=50&expand=lessons"
+
+        self._create_courses(1, lessons_per_course=1)
+        cache.clear()
+        _, small_page_queries = self._get_and_count_queries(url)
+
+        self._create_courses(49, lessons_per_course=5)
+        cache.clear()
+        resp, large_page_queries = self._get_and_count_queries(url)
+
+        self.assertEqual(len(resp.data["results"]), 50)
+        self.assertEqual(small_page_queries, large_page_queries)
+
+        # с тёплым кешем представлений уроки не запрашиваются вовсе
+        with self.assertNumQueries(large_page_queries - 1):
+            self.client.get(url)
+
+    def test_course_list_uses_annotated_values(self):
+        self.client.force_authenticate(user=self.user)
+        self._create_courses(3, lessons_per_course=4)
+
+        resp = self.client.get(self.course_list_url, {"expand": "lessons"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        for item in resp.data["results"]:
+            course = Course.objects.get(pk=item["id"])
+            self.assertEqual(item["lessons_count"], 4)
+            self.assertEqual(len(item["lessons"]), 4)
+            self.assertEqual(
+                item["is_subscribed"],
+                Subscription.objects.filter(user=self.user, course=course).exists(),
+            )
+
+    def test_course_detail_query_count_does_not_depend_on_lessons(self):
+        self.client.force_authenticate(user=self.user)
+        self._create_courses(2, lessons_per_course=1)
+        small, large = Course.objects.order_by("id")
+        Lesson.objects.bulk_create([
+            Lesson(
+                course=large,
+                title=f"Доп. урок {j}",
+                video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                owner=self.user,
+            )
+            for j in range(100)
+        ])
+
+        _, small_queries = self._get_and_count_queries(
+            reverse("course-detail", args=[small.id])
+        )
+        resp, large_queries = self._get_and_count_queries(
+            reverse("course-detail", args=[large.id])
+        )
+
+        self.assertEqual(resp.data["lessons_count"], 101)
+        self.assertEqual(small_queries, large_queries)
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="pager@test.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        self.course_list_url = reverse("course-list")
+
+    def _walk(self, url):
+        ids, pages = [], 0
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            ids.extend(item["id"] for item in resp.data["results"])
+            url = resp.data["next"]
+            pages += 1
+        return ids, pages
+
+    def test_walks_all_pages_forward_without_gaps(self):
+        courses = [Course(title=f"Курс {i:02d}", owner=self.user) for i in range(25)]
+        Course.objects.bulk_create(courses)
+        expected = list(Course.objects.order_by("id").values_list("id", flat=True))
+
+        ids, pages = self._walk(f"{self.course_list_url}?page_size=10")
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_ordering_filter_uses_field_and_id_as_keyset(self):
+        # одинаковые названия — порядок внутри группы задаёт id
+        Course.objects.bulk_create(
+            [Course(title=f"Курс {i % 3}", owner=self.user) for i in range(14)]
+        )
+        expected = list(
+            Course.objects.order_by("-title", "-id").values_list("id", flat=True)
+        )
+
+        ids, _ = self._walk(f"{self.course_list_url}?ordering=-title&page_size=4")
+
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        Course.objects.bulk_create(
+            [Course(title=f"Курс {i}", owner=self.user) for i in range(7)]
+        )
+        first = self.client.get(f"{self.course_list_url}?page_size=3")
+        second = self.client.get(first.data["next"])
+        self.assertIsNone(first.data["previous"])
+
+        back = self.client.get(second.data["previous"])
+
+        self.assertEqual(
+            [item["id"] for item in back.data["results"]],
+            [item["id"] for item in first.data["results"]],
+        )
+
+    def test_invalid_cursor_returns_404(self):
+        resp = self.client.get(f"{self.course_list_url}?cursor=not-a-cursor")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RefusingEmailBackend(LocmemEmailBackend):
+    """Как SMTP-сервер, отвергающий адреса refused@…"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            refused = [address for address in message.to if address.startswith("refused@")]
+            if refused:
+                raise SMTPRecipientsRefused({address: (550, b"No such user") for address in refused})
+        return super().send_messages(messages)
+
+
+@override_settings(COURSE_NOTIFY_CHUNK_SIZE=3)
+class NotifyCourseUpdatedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(title="Рассылка")
+        self.subscriptions = [
+            Subscription.objects.create(
+                user=User.objects.create_user(email=f"sub{i}@test.com", password="12345"),
+                course=self.course,
+            )
+            for i in range(7)
+        ]
+
+    def test_sends_individual_messages_over_one_connection(self):
+        with mock.patch("materials.tasks.get_connection", wraps=get_connection) as connect:
+            result = notify_course_updated.apply(args=(self.course.id,)).get()
+
+        connect.assert_called_once()
+
+        self.assertEqual(result, {"sent": 7})
+        self.assertEqual(len(mail.outbox), 7)
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            sorted(f"sub{i}@test.com" for i in range(7)),
+        )
+        self.assertTrue(all(len(m.to) == 1 for m in mail.outbox))
+
+    def test_retry_resumes_after_last_completed_chunk(self):
+        task_id = "notify-retry-test"
+        progress_key = NOTIFY_PROGRESS_KEY.format(task_id=task_id)
+        cache.set(progress_key, self.subscriptions[2].pk)
+
+        result = notify_course_updated.apply(args=(self.course.id,), task_id=task_id).get()
+
+        self.assertEqual(result, {"sent": 4})
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            [f"sub{i}@test.com" for i in range(3, 7)],
+        )
+        self.assertIsNone(cache.get(progress_key))
+
+    @override_settings(EMAIL_BACKEND="materials.tests.RefusingEmailBackend")
+    def test_refused_recipient_is_skipped(self):
+        Subscription.objects.create(
+            user=User.objects.create_user(email="refused@test.com", password="12345"),
+            course=self.course,
+        )
+        self.subscriptions[0].user.email = "refused@example.com"
+        self.subscriptions[0].user.save(update_fields=["email"])
+
+        with self.assertLogs("materials.tasks", "WARNING") as logs:
+            result = notify_course_updated.apply(args=(self.course.id,)).get()
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(result, {"sent": 6})
+        self.assertEqual(
+            sorted(m.to[0] for m in mail.outbox),
+            [f"sub{i}@test.com" for i in range(1, 7)],
+        )
+
+    def test_connection_error_is_retried(self):
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages",
+                        side_effect=SMTPServerDisconnected("Connection unexpectedly closed")), \
+                mock.patch.object(notify_course_updated, "retry", side_effect=RuntimeError("retry")) as retry:
+            with self.assertRaises(RuntimeError):
+                notify_course_updated.apply(args=(self.course.id,), throw=True).get()
+
+        retry.assert_called_once()
+
+    def test_deleted_course_is_skipped(self):
+        course_id = self.course.id
+        self.course.delete()
+
+        with self.assertLogs("materials.tasks", "INFO"):
+            result = notify_course_updated.apply(args=(course_id,)).get()
+
+        self.assertEqual(result, {"sent": 0})
+        self.assertEqual(mail.outbox, [])
+
+    def test_no_subscribers(self):
+        course = Course.objects.create(title="Пустой курс")
+
+        result = notify_course_updated.apply(args=(course.id,)).get()
+
+        self.assertEqual(result, {"sent": 0})
+        self.assertEqual(mail.outbox, [])
+
+
+class CourseUpdateNotificationSchedulerTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="editor@test.com", password="12345")
+        self.course = Course.objects.create(title="Курс", owner=self.owner)
+        self.lesson = Lesson.objects.create(
+            course=self.course,
+            title="Урок",
+            video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+            owner=self.owner,
+        )
+
+    @mock.patch("materials.services.notifications.notify_course_updated.apply_async")
+    def test_burst_of_edits_is_coalesced_into_one_task(self, apply_async):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(schedule_course_update_notification(self.course.id))
+            self.assertFalse(schedule_course_update_notification(self.course.id))
+            self.assertFalse(schedule_course_update_notification(self.course.id))
+
+        apply_async.assert_called_once_with((self.course.id,), countdown=60)
+        self.course.refresh_from_db()
+        self.assertIsNotNone(self.course.last_notification_sent_at)
+
+    @mock.patch("materials.services.notifications.notify_course_updated.apply_async")
+    def test_task_is_enqueued_only_after_commit(self, apply_async):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            schedule_course_update_notification(self.course.id)
+
+        apply_async.assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+
+    @mock.patch("materials.services.notifications.notify_course_updated.apply_async")
+    def test_new_notification_after_throttle_window(self, apply_async):
+        Course.objects.filter(pk=self.course.pk).update(
+            last_notification_sent_at=timezone.now() - timedelta(hours=5)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(schedule_course_update_notification(self.course.id))
+
+        apply_async.assert_called_once()
+
+    @mock.patch("materials.services.notifications.notify_course_updated.apply_async")
+    def test_course_and_lesson_updates_share_the_throttle(self, apply_async):
+        self.client.force_authenticate(user=self.owner)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.patch(
+                reverse("course-detail", args=[self.course.id]), {"title": "Новое"}, format="json"
+            )
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            resp = self.client.patch(
+                reverse("lesson-detail", args=[self.lesson.id]), {"title": "Новый"}, format="json"
+            )
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        apply_async.assert_called_once()
+
+
+class RepresentationCacheTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="cached@test.com", password="12345")
+        self.moderator = User.objects.create_user(email="cached-mod@test.com", password="12345")
+        moderators_group, _ = Group.objects.get_or_create(name="moderators")
+        self.moderator.groups.add(moderators_group)
+
+        self.course = Course.objects.create(title="Кешируемый курс", owner=self.owner)
+        self.lesson = Lesson.objects.create(
+            course=self.course,
+            title="Урок",
+            video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+            owner=self.owner,
+        )
+        self.course_url = reverse("course-detail", args=[self.course.id])
+        self.client.force_authenticate(user=self.owner)
+        is_moderator(self.owner)
+
+    def _hits(self, kind):
+        return dict(
+            (labels, value) for _, labels, value in cache_requests.samples()
+        ).get(f'kind="{kind}",result="hit"', 0)
+
+    def test_second_read_is_served_from_cache(self):
+        hits_before = self._hits("course")
+        with CaptureQueriesContext(connection) as cold:
+            first = self.client.get(self.course_url)
+        with CaptureQueriesContext(connection) as warm:
+            second = self.client.get(self.course_url)
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(self._hits("course"), hits_before + 1)
+        # без запроса уроков курса
+        self.assertEqual(len(warm.captured_queries), len(cold.captured_queries) - 1)
+
+    def test_lesson_update_invalidates_course_and_lesson(self):
+        self.client.get(self.course_url)
+        self.client.get(reverse("lesson-detail", args=[self.lesson.id]))
+
+        self.client.patch(
+            reverse("lesson-detail", args=[self.lesson.id]), {"title": "Переименован"}, format="json"
+        )
+
+        course = self.client.get(self.course_url)
+        lesson = self.client.get(reverse("lesson-detail", args=[self.lesson.id]))
+        self.assertEqual(course.data["lessons"][0]["title"], "Переименован")
+        self.assertEqual(lesson.data["title"], "Переименован")
+
+    def test_moving_lesson_invalidates_both_courses(self):
+        other = Course.objects.create(title="Другой курс", owner=self.owner)
+        other_url = reverse("course-detail", args=[other.id])
+        self.client.get(self.course_url)
+        self.client.get(other_url)
+
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        lesson.course = other
+        lesson.save()
+
+        self.assertEqual(self.client.get(self.course_url).data["lessons_count"], 0)
+        self.assertEqual(self.client.get(other_url).data["lessons_count"], 1)
+
+    def test_is_subscribed_is_overlaid_per_user(self):
+        Subscription.objects.create(user=self.owner, course=self.course)
+
+        owner_resp = self.client.get(self.course_url)
+        self.client.force_authenticate(user=self.moderator)
+        moderator_resp = self.client.get(self.course_url)
+
+        self.assertTrue(owner_resp.data["is_subscribed"])
+        self.assertFalse(moderator_resp.data["is_subscribed"])
+        self.assertEqual(owner_resp.data["title"], moderator_resp.data["title"])
+
+    def test_course_delete_and_user_delete_invalidate(self):
+        self.client.get(reverse("lesson-detail", args=[self.lesson.id]))
+
+        self.owner.delete()
+
+        self.client.force_authenticate(user=self.moderator)
+        lesson = self.client.get(reverse("lesson-detail", args=[self.lesson.id]))
+        self.assertIsNone(lesson.data["owner"])
+
+    def test_fresh_change_read_from_replica_is_not_cached(self):
+        self.client.patch(self.course_url, {"title": "Новое"}, format="json")
+        self.client.force_authenticate(user=self.moderator)
+        hits_before = self._hits("course")
+
+        with mock.patch("materials.cache.replica_reads_allowed", return_value=True):
+            self.client.get(self.course_url)
+            self.client.get(self.course_url)
+            self.assertEqual(self._hits("course"), hits_before)
+
+            with override_settings(DB_REPLICA_PIN_SECONDS=0):
+                self.client.get(self.course_url)
+            self.client.get(self.course_url)
+            self.assertEqual(self._hits("course"), hits_before + 1)
+
+    @override_settings(METRICS_TOKEN="scrape-me")
+    def test_hit_rate_is_exposed_as_metrics(self):
+        self.client.get(self.course_url)
+        self.client.get(self.course_url)
+        self.client.force_authenticate(user=None)
+
+        denied = self.client.get(reverse("metrics"))
+        allowed = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Token scrape-me")
+
+        self.assertEqual(denied.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(allowed.status_code, status.HTTP_200_OK)
+        body = allowed.content.decode()
+        self.assertIn('materials_cache_requests_total{kind="course",result="hit"}', body)
+        self.assertIn('materials_cache_hit_ratio{kind="course"}', body)
+
+
+@mock.patch("materials.services.notifications.notify_course_updated.apply_async")
+class LessonImportTests(APITestCase):
+    VIDEO = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="import@test.com", password="12345")
+        self.other = User.objects.create_user(email="import-other@test.com", password="12345")
+        self.course = Course.objects.create(title="Курс", owner=self.owner)
+        self.second = Course.objects.create(title="Второй курс", owner=self.owner)
+        self.foreign = Course.objects.create(title="Чужой курс", owner=self.other)
+        self.url = reverse("lesson-import")
+        self.client.force_authenticate(user=self.owner)
+
+    def jsonl(self, rows):
+        return "\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n"
+
+    def post(self, body, content_type="application/x-ndjson"):
+        return self.client.generic("POST", self.url, body.encode(), content_type=content_type)
+
+    def test_jsonl_import_creates_lessons_in_batches(self, apply_async):
+        rows = [
+            {"course": course.id, "title": f"Урок {i}", "video_url": self.VIDEO}
+            for i, course in enumerate([self.course] * 3 + [self.second] * 2)
+        ]
+
+        with override_settings(LESSON_IMPORT_BATCH_SIZE=2), \
+                self.captureOnCommitCallbacks(execute=True), \
+                CaptureQueriesContext(connection) as ctx:
+            resp = self.post(self.jsonl(rows))
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data["created"], 5)
+        self.assertEqual(resp.data["courses"], [self.course.id, self.second.id])
+        self.assertEqual(Lesson.objects.filter(owner=self.owner).count(), 5)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "materials_lesson"')]
+        self.assertEqual(len(inserts), 3)
+        # одно уведомление на курс за весь импорт
+        self.assertEqual(apply_async.call_count, 2)
+
+    def test_csv_import(self, apply_async):
+        body = (
+            "\ufeffcourse,title,description,video_url\n"
+            f"{self.course.id},Первый,,{self.VIDEO}\n"
+            f'{self.course.id},"Второй, с запятой",текст,{self.VIDEO}\n'
+        )
+
+        resp = self.post(body, content_type="text/csv")
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            set(Lesson.objects.filter(course=self.course).values_list("title", flat=True)),
+            {"Первый", "Второй, с запятой"},
+        )
+
+    def test_multipart_upload(self, apply_async):
+        upload = SimpleUploadedFile(
+            "lessons.jsonl",
+            self.jsonl([{"course": self.course.id, "title": "Из файла", "video_url": self.VIDEO}]).encode(),
+        )
+
+        resp = self.client.post(self.url, {"file": upload}, format="multipart")
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Lesson.objects.filter(title="Из файла").exists())
+
+    def test_row_errors_roll_back_whole_import(self, apply_async):
+        body = self.jsonl([
+            {"course": self.course.id, "title": "Хороший", "video_url": self.VIDEO},
+            {"course": self.course.id, "title": "Не YouTube", "video_url": "https://stepik.org/course/1"},
+            {"course": self.foreign.id, "title": "Чужой курс", "video_url": self.VIDEO},
+        ]) + "{не json\n"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.post(body)
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data["created"], 0)
+        errors = {error["line"]: error["errors"] for error in resp.data["errors"]}
+        self.assertEqual(set(errors), {2, 3, 4})
+        self.assertIn("video_url", errors[2])
+        self.assertIn("course", errors[3])
+        self.assertFalse(Lesson.objects.exists())
+        apply_async.assert_not_called()
+
+    def test_import_invalidates_course_cache(self, apply_async):
+        detail = reverse("course-detail", args=[self.course.id])
+        self.assertEqual(self.client.get(detail).data["lessons_count"], 0)
+
+        self.post(self.jsonl([{"course": self.course.id, "title": "Новый", "video_url": self.VIDEO}]))
+
+        self.assertEqual(self.client.get(detail).data["lessons_count"], 1)
+
+    def test_invalid_encoding_is_rejected(self, apply_async):
+        resp = self.client.generic("POST", self.url, b"\xff\xfe\x00", content_type="text/csv")
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_moderator_cannot_import(self, apply_async):
+        moderator = User.objects.create_user(email="import-mod@test.com", password="12345")
+        moderator.groups.add(Group.objects.get_or_create(name="moderators")[0])
+        self.client.force_authenticate(user=moderator)
+
+        resp = self.post(self.jsonl([{"course": self.course.id, "title": "Урок", "video_url": self.VIDEO}]))
+
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_management_command(self, apply_async):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8") as file:
+            file.write(f"course,title,video_url\n{self.foreign.id},Из консоли,{self.VIDEO}\n")
+            file.flush()
+            out = StringIO()
+            call_command("import_lessons", file.name, stdout=out)
+
+            with self.assertRaises(CommandError):
+                call_command("import_lessons", file.name, owner=self.owner.email, stderr=StringIO())
+
+        self.assertIn("Готово: 1", out.getvalue())
+        lesson = Lesson.objects.get(title="Из консоли")
+        self.assertEqual(lesson.owner, self.other)
+
+    def test_csv_row_without_trailing_optional_column(self, apply_async):
+        body = f"course,title,video_url,description\n{self.course.id},Без описания,{self.VIDEO}\n"
+
+        resp = self.post(body, content_type="text/csv")
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Lesson.objects.get(title="Без описания").description, "")
+
+    def test_management_command_rejects_malformed_csv(self, apply_async):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8") as file:
+            file.write(f'course,title,video_url\n{self.course.id},"{"x" * 200_000}",{self.VIDEO}\n')
+            file.flush()
+
+            with self.assertRaisesMessage(CommandError, "Не удалось прочитать файл"):
+                call_command("import_lessons", file.name, stderr=StringIO())
+
+        self.assertFalse(Lesson.objects.exists())
+
+
+def image_upload(name="preview.jpg", size=(1600, 900), fmt="JPEG"):
+    buffer = BytesIO()
+    Image.new("RGB", size, "teal").save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f"image/{fmt.lower()}")
+
+
+@mock.patch("config.thumbnails.generate_image_renditions.delay")
+class ImageRenditionTests(APITestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.owner = User.objects.create_user(email="images@test.com", password="12345")
+        self.course = Course.objects.create(title="Курс", owner=self.owner)
+        self.url = reverse("course-detail", args=[self.course.id])
+        self.client.force_authenticate(user=self.owner)
+
+    def upload(self, delay, name="preview.jpg"):
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.patch(self.url, {"preview": image_upload(name)}, format="multipart")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp
+
+    def test_upload_schedules_renditions_after_commit(self, delay):
+        resp = self.upload(delay)
+
+        delay.assert_called_once_with("materials.Course", self.course.id, "preview")
+        self.assertEqual(resp.data["preview_renditions"], {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, {"title": "Без новой картинки"}, format="json")
+        delay.assert_called_once()
+
+    def test_renditions_are_generated_next_to_original(self, delay):
+        self.upload(delay)
+
+        files = generate_image_renditions("materials.Course", self.course.id, "preview")
+
+        self.course.refresh_from_db()
+        self.assertEqual(set(files), {"small", "medium", "large"})
+        for label, size in {"small": (320, 180), "large": (1280, 720)}.items():
+            for fmt, pil_format in {"webp": "WEBP", "jpeg": "JPEG"}.items():
+                path = files[label][fmt]
+                self.assertTrue(path.startswith("courses_previews/preview"))
+                with self.course.preview.storage.open(path) as file, Image.open(file) as image:
+                    self.assertEqual((image.format, image.size), (pil_format, size))
+
+        # сохранение копий сбрасывает закешированное представление курса
+        resp = self.client.get(self.url)
+        self.assertEqual(set(resp.data["preview_renditions"]), {"small", "medium", "large"})
+        self.assertTrue(resp.data["preview_renditions"]["small"]["webp"].startswith("http://testserver/media/"))
+
+    def test_replaced_image_drops_old_renditions(self, delay):
+        self.upload(delay)
+        old = generate_image_renditions("materials.Course", self.course.id, "preview")
+        storage = Course.preview.field.storage
+
+        self.upload(delay, name="second.png")
+        self.assertEqual(self.client.get(self.url).data["preview_renditions"], {})
+        new = generate_image_renditions("materials.Course", self.course.id, "preview")
+
+        self.assertFalse(storage.exists(old["small"]["webp"]))
+        self.assertTrue(storage.exists(new["small"]["webp"]))
+        self.assertTrue(new["small"]["webp"].startswith("courses_previews/second"))
+
+    def test_result_for_stale_upload_is_discarded(self, delay):
+        self.upload(delay)
+
+        def replace_preview(*args, **kwargs):
+            Course.objects.filter(pk=self.course.pk).update(preview="courses_previews/newer.jpg")
+            return {"small": {"webp": Course.preview.field.storage.save("stale.webp", ContentFile(b"x"))}}
+
+        with mock.patch("config.thumbnails.render_renditions", side_effect=replace_preview):
+            self.assertEqual(generate_image_renditions("materials.Course", self.course.id, "preview"), {})
+
+        self.assertEqual(Course.objects.get(pk=self.course.pk).preview_renditions, {})
+        self.assertFalse(Course.preview.field.storage.exists("stale.webp"))
+
+    def test_lesson_preview_renditions(self, delay):
+        lesson = Lesson.objects.create(
+            course=self.course, title="Урок", owner=self.owner,
+            video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.preview = image_upload("lesson.webp", size=(800, 800), fmt="WEBP")
+            lesson.save()
+        delay.assert_called_once_with("materials.Lesson", lesson.id, "preview")
+
+        generate_image_renditions("materials.Lesson", lesson.id, "preview")
+
+        resp = self.client.get(reverse("lesson-detail", args=[lesson.id]))
+        self.assertEqual(set(resp.data["preview_renditions"]["medium"]), {"webp", "jpeg"})
+
+
+class FullTextSearchTests(APITestCase):
+    VIDEO = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="search@test.com", password="12345")
+        self.other = User.objects.create_user(email="search-other@test.com", password="12345")
+        self.moderator = User.objects.create_user(email="search-mod@test.com", password="12345")
+        self.moderator.groups.add(Group.objects.get_or_create(name="moderators")[0])
+
+        self.in_title = Course.objects.create(title="Программирование для начинающих", owner=self.owner)
+        self.in_description = Course.objects.create(
+            title="Кулинария", description="Немного программирования кухонного робота", owner=self.owner,
+        )
+        self.unrelated = Course.objects.create(title="Рисование", owner=self.owner)
+        self.foreign = Course.objects.create(title="Программирование игр", owner=self.other)
+        self.lesson = Lesson.objects.create(
+            course=self.unrelated, title="Переменные в программировании", video_url=self.VIDEO, owner=self.owner,
+        )
+        Lesson.objects.create(course=self.unrelated, title="Акварель", video_url=self.VIDEO, owner=self.owner)
+        self.client.force_authenticate(user=self.owner)
+
+    def ids(self, resp):
+        return [item["id"] for item in resp.data["results"]]
+
+    def test_course_list_search_uses_stemming_and_visibility(self):
+        resp = self.client.get(reverse("course-list"), {"search": "программированию"})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ids(resp), [self.in_title.id, self.in_description.id])
+
+    def test_lesson_list_search(self):
+        resp = self.client.get(reverse("lesson-list-create"), {"search": "переменная"})
+
+        self.assertEqual(self.ids(resp), [self.lesson.id])
+
+    def test_search_endpoint_ranks_title_above_description(self):
+        resp = self.client.get(reverse("search"), {"search": "программирование"})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["count"], 3)
+        results = resp.data["results"]
+        self.assertEqual(
+            [(item["type"], item["id"]) for item in results],
+            [("course", self.in_title.id), ("lesson", self.lesson.id), ("course", self.in_description.id)],
+        )
+        self.assertEqual(results[1]["course"], self.unrelated.id)
+        self.assertIsNone(results[0]["course"])
+        self.assertGreater(results[0]["rank"], results[2]["rank"])
+
+    def test_search_endpoint_type_filter_and_moderator_visibility(self):
+        self.client.force_authenticate(user=self.moderator)
+
+        resp = self.client.get(reverse("search"), {"search": "программирование", "type": "course"})
+
+        self.assertEqual(
+            {item["id"] for item in resp.data["results"]},
+            {self.in_title.id, self.in_description.id, self.foreign.id},
+        )
+
+    def test_search_endpoint_paginates(self):
+        resp = self.client.get(reverse("search"), {"search": "программирование", "page_size": 2})
+        second = self.client.get(resp.data["next"])
+
+        self.assertEqual(len(resp.data["results"]), 2)
+        self.assertEqual(len(second.data["results"]), 1)
+        self.assertIsNone(second.data["next"])
+
+    def test_search_endpoint_requires_query(self):
+        resp = self.client.get(reverse("search"))
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_vector_follows_updates_without_save(self):
+        Course.objects.filter(pk=self.unrelated.pk).update(title="Программирование графики")
+
+        resp = self.client.get(reverse("course-list"), {"search": "графика"})
+
+        self.assertEqual(self.ids(resp), [self.unrelated.id])
+
+
+class SparseFieldsetTests(APITestCase):
+    VIDEO = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="fields@test.com", password="12345")
+        self.course = Course.objects.create(title="Курс", description="Длинное описание", owner=self.owner)
+        self.lessons = [
+            Lesson.objects.create(
+                course=self.course, title=f"Урок {i}", description="x" * 500, video_url=self.VIDEO, owner=self.owner,
+            )
+            for i in range(3)
+        ]
+        self.list_url = reverse("course-list")
+        self.client.force_authenticate(user=self.owner)
+        is_moderator(self.owner)
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url, params or {})
+        return resp, " ".join(query["sql"] for query in ctx.captured_queries)
+
+    def test_default_course_list_is_lean(self):
+        resp, sql = self.get(self.list_url)
+
+        item = resp.data["results"][0]
+        self.assertNotIn("lessons", item)
+        self.assertEqual(item["lessons_count"], 3)
+        self.assertNotIn('FROM "materials_lesson"', sql)
+
+    def test_course_detail_still_embeds_lessons(self):
+        resp = self.client.get(reverse("course-detail", args=[self.course.id]))
+
+        self.assertEqual(len(resp.data["lessons"]), 3)
+
+    def test_fields_limit_columns_and_annotations(self):
+        resp, sql = self.get(self.list_url, {"fields": "id,title"})
+
+        self.assertEqual(set(resp.data["results"][0]), {"id", "title"})
+        self.assertNotIn('"materials_course"."description"', sql)
+        self.assertNotIn("materials_subscription", sql)
+        self.assertNotIn("COUNT(", sql)
+
+    def test_expand_with_nested_fields(self):
+        resp, sql = self.get(self.list_url, {"expand": "lessons", "fields": "id,lessons.id,lessons.title"})
+
+        item = resp.data["results"][0]
+        self.assertEqual(set(item), {"id", "lessons"})
+        self.assertEqual(item["lessons"], [{"id": lesson.id, "title": lesson.title} for lesson in self.lessons])
+        self.assertIn('FROM "materials_lesson"', sql)
+        self.assertNotIn('"materials_lesson"."description"', sql)
+
+    def test_unknown_fields_are_rejected(self):
+        for params in ({"fields": "id,secret"}, {"expand": "owner"}, {"fields": "title.id"}, {"fields": "lessons.nope"}):
+            resp = self.client.get(self.list_url, params)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_each_fieldset_is_cached_and_invalidated_separately(self):
+        lean = self.client.get(self.list_url).data["results"][0]
+        full = self.client.get(self.list_url, {"expand": "lessons"}).data["results"][0]
+        self.assertNotIn("lessons", lean)
+        self.assertEqual(len(full["lessons"]), 3)
+
+        self.client.patch(reverse("lesson-detail", args=[self.lessons[0].id]), {"title": "Новое"}, format="json")
+        self.client.patch(reverse("course-detail", args=[self.course.id]), {"title": "Курс 2"}, format="json")
+
+        self.assertEqual(self.client.get(self.list_url).data["results"][0]["title"], "Курс 2")
+        full = self.client.get(self.list_url, {"expand": "lessons"}).data["results"][0]
+        self.assertEqual(full["lessons"][0]["title"], "Новое")
+
+    def test_lesson_endpoints_accept_fields(self):
+        resp, sql = self.get(reverse("lesson-list-create"), {"fields": "id,title"})
+        detail = self.client.get(reverse("lesson-detail", args=[self.lessons[0].id]), {"fields": "video_url"})
+
+        self.assertEqual(set(resp.data["results"][0]), {"id", "title"})
+        self.assertNotIn('"materials_lesson"."description"', sql)
+        self.assertEqual(detail.data, {"video_url": self.VIDEO})
+
+
+class ValuesSerializerTests(APITestCase):
+    VIDEO = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="values@test.com", password="12345")
+        self.course = Course.objects.create(title="Курс", description="Описание", owner=self.owner)
+        Course.objects.create(title="Пустой курс", owner=self.owner)
+        for i in range(2):
+            Lesson.objects.create(
+                course=self.course, title=f"Урок {i}", video_url=self.VIDEO, owner=self.owner,
+            )
+        Course.objects.filter(pk=self.course.pk).update(
+            preview="courses_previews/p.jpg",
+            preview_renditions={
+                "source": "courses_previews/p.jpg",
+                "files": {"small": {"webp": "courses_previews/p.small.webp", "jpeg": "courses_previews/p.small.jpg"}},
+            },
+        )
+        Lesson.objects.filter(title="Урок 0").update(preview="lessons_previews/l.png")
+        self.request = Request(APIRequestFactory().get("/api/courses/"))
+
+    def assert_same_output(self, serializer, queryset):
+        values_serializer = ValuesSerializer.build(serializer, annotations=queryset.query.annotations)
+        self.assertIsNotNone(values_serializer)
+
+        fast = values_serializer.represent(queryset.values(*values_serializer.columns))
+        expected = [serializer.to_representation(obj) for obj in queryset]
+        self.assertEqual(fast, expected)
+        self.assertEqual([list(item) for item in fast], [list(item) for item in expected])
+
+    def courses(self):
+        return (
+            Course.objects
+            .annotate(lessons_count=Count("lessons"), is_subscribed=Value(False))
+            .prefetch_related(Prefetch("lessons", queryset=Lesson.objects.order_by("id")))
+            .order_by("id")
+        )
+
+    def test_course_matches_serializer(self):
+        self.assert_same_output(CourseSerializer(context={"request": self.request}), self.courses())
+
+    def test_course_fieldset_matches_serializer(self):
+        fieldset = Fieldset(frozenset({"id", "preview", "lessons"}), {"lessons": {"title", "preview"}})
+        self.assert_same_output(
+            CourseSerializer(context={"request": self.request}, fieldset=fieldset), self.courses(),
+        )
+
+    def test_lesson_matches_serializer(self):
+        self.assert_same_output(LessonSerializer(context={"request": self.request}), Lesson.objects.order_by("id"))
+
+    def test_method_field_without_annotation_is_not_supported(self):
+        serializer = CourseSerializer(context={"request": self.request})
+
+        self.assertIsNone(ValuesSerializer.build(serializer, annotations={}))
+
+    def test_list_matches_detail(self):
+        self.client.force_authenticate(user=self.owner)
+        with mock.patch.object(ValuesSerializer, "represent", autospec=True,
+                               side_effect=ValuesSerializer.represent) as represent:
+            listed = self.client.get(reverse("course-list"), {"expand": "lessons"}).json()["results"][0]
+        cache.clear()
+        detail = self.client.get(reverse("course-detail", args=[self.course.id])).json()
+
+        represent.assert_called()
+        self.assertEqual(listed, detail)
+
+
+class ORJSONRendererTests(TestCase):
+    def test_output_matches_json_renderer(self):
+        data = {
+            "when": timezone.now(),
+            "day": timezone.localdate(),
+            "amount": Decimal("10.50"),
+            "text": "Курс строка",
+            "items": [1, None, True, {"nested": 1.5}],
+        }
+
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_non_string_keys(self):
+        # так выглядят ошибки ListField/DictField: ключ — индекс элемента
+        data = {"course_ids": {0: ["Требуется целочисленное значение."], 2: {1: ["Ошибка."]}}}
+
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.user = SimpleNamespace(pk=424242, is_authenticated=True)
+        cache.delete(PIN_CACHE_KEY.format(user_id=self.user.pk))
+
+    def route(self, request, action):
+        def view(request):
+            return action()
+        ReplicaRoutingMiddleware(view)(request)
+
+    def read_in(self, request):
+        result = []
+        self.route(request, lambda: result.append(self.router.db_for_read(Course)))
+        return result[0]
+
+    def test_reads_outside_requests_use_default(self):
+        self.assertEqual(self.router.db_for_read(Course), "default")
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertIn(self.read_in(self.factory.get("/api/courses/")), ("replica1", "replica2"))
+
+    def test_unsafe_requests_use_default(self):
+        self.assertEqual(self.read_in(self.factory.post("/api/courses/")), "default")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_default(self):
+        self.assertEqual(self.read_in(self.factory.get("/api/courses/")), "default")
+
+    def test_transactions_read_from_default(self):
+        atomic = {"default": SimpleNamespace(in_atomic_block=True)}
+        with mock.patch("config.db_router.connections", atomic):
+            self.assertEqual(self.read_in(self.factory.get("/api/courses/")), "default")
+
+    def test_user_is_pinned_to_default_after_write(self):
+        write = self.factory.post("/api/lessons/")
+        write.user = self.user
+        self.route(write, lambda: self.router.db_for_write(Lesson))
+
+        read = self.factory.get("/api/lessons/")
+        read.user = self.user
+        other = self.factory.get("/api/lessons/")
+        other.user = SimpleNamespace(pk=self.user.pk + 1, is_authenticated=True)
+
+        self.assertEqual(self.read_in(read), "default")
+        self.assertNotEqual(self.read_in(other), "default")
+
+    def test_migrations_only_on_default(self):
+        self.assertTrue(self.router.allow_migrate("default", "materials"))
+        self.assertFalse(self.router.allow_migrate("replica1", "materials"))
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "реплики не настроены (DB_REPLICAS)")
+class ReplicaRoutingIntegrationTests(TransactionTestCase):
+    """
+    С DB_REPLICAS реплики в тестах — зеркала default (TEST MIRROR), поэтому
+    проверяется, через какое подключение прошёл запрос.
+    """
+    databases = "__all__"
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email="replica@test.com", password="12345")
+        self.course = Course.objects.create(title="Курс", owner=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner)
+        cache.delete(PIN_CACHE_KEY.format(user_id=self.owner.pk))
+
+    def course_queries(self, method, url, data=None):
+        replicas = [CaptureQueriesContext(connections[alias]) for alias in settings.DATABASE_REPLICAS]
+        with CaptureQueriesContext(connections["default"]) as primary, ExitStack() as stack:
+            for context in replicas:
+                stack.enter_context(context)
+            getattr(self.client, method)(url, data, format="json")
+
+        def count(queries):
+            return sum('FROM "materials_course"' in query["sql"] for query in queries)
+        return count(primary.captured_queries), sum(count(context.captured_queries) for context in replicas)
+
+    def test_list_reads_from_replica_until_user_writes(self):
+        primary, replica = self.course_queries("get", reverse("course-list"))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        self.course_queries("patch", reverse("course-detail", args=[self.course.id]), {"title": "Новое"})
+
+        primary, replica = self.course_queries("get", reverse("course-list"))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_other_users_do_not_cache_replica_reads_right_after_write(self):
+        reader = User.objects.create_user(email="replica-reader@test.com", password="12345")
+        reader.groups.add(Group.objects.get_or_create(name="moderators")[0])
+        self.course_queries("patch", reverse("course-detail", args=[self.course.id]), {"title": "Новое"})
+        self.client.force_authenticate(user=reader)
+        url = reverse("course-detail", args=[self.course.id])
+
+        def hits():
+            samples = {labels: value for _, labels, value in cache_requests.samples()}
+            return samples.get('kind="course",result="hit"', 0)
+
+        # реплика могла отстать: промах отдаётся, но не кешируется
+        hits_before = hits()
+        self.assertEqual(self.client.get(url).data["title"], "Новое")
+        self.assertGreater(self.course_queries("get", url)[1], 0)
+        self.assertEqual(hits(), hits_before)
+
+        with override_settings(DB_REPLICA_PIN_SECONDS=0):
+            self.course_queries("get", url)
+            self.course_queries("get", url)
+        self.assertEqual(hits(), hits_before + 1)
@@ -6,7 +6,9 @@ from .views import (
     LessonListCreateAPIView,
     LessonRetrieveUpdateDestroyAPIView,
 )
-from .views_subscriptions import CourseSubscriptionAPIView
+from .views_import import LessonImportAPIView
+from .views_search import SearchAPIView
+from .views_subscriptions import CourseSubscriptionAPIView, CourseSubscriptionBulkAPIView
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet, basename='course')
@@ -15,7 +17,10 @@ urlpatterns = [
     path('', include(router.urls)),
 
     path('lessons/', LessonListCreateAPIView.as_view(), name='lesson-list-create'),
+    path('lessons/import/', LessonImportAPIView.as_view(), name='lesson-import'),
     path('lessons/<int:pk>/', LessonRetrieveUpdateDestroyAPIView.as_view(), name='lesson-detail'),
     path('course-subscriptions/', CourseSubscriptionAPIView.as_view(), name='course-subscription'),
+    path('course-subscriptions/bulk/', CourseSubscriptionBulkAPIView.as_view(), name='course-subscription-bulk'),
+    path('search/', SearchAPIView.as_view(), name='search'),
 
 ]
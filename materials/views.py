@@ -1,18 +1,21 @@
-from datetime import timedelta
-from django.db import transaction
-from django.utils import timezone
+from django.db.models import Count, Exists, OuterRef, Prefetch, Value
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.viewsets import ModelViewSet
 from rest_framework import generics
-from materials.tasks import notify_course_updated
-
-from users.permissions import IsModerator, IsOwner
-from .models import Course, Lesson
-from .paginators import DefaultPagination
+from materials.services.notifications import schedule_course_update_notification
+
+from users.permissions import IsModerator, IsOwner, is_moderator
+from .cache import COURSE_CACHE, LESSON_CACHE, CachedRepresentationMixin
+from .fieldsets import SparseFieldsetMixin, serializer_columns
+from .filters import FullTextSearchFilter
+from .models import Course, Lesson, Subscription
+from .paginators import KeysetCursorPagination
 from .serializers import CourseSerializer, LessonSerializer
 
 
-class CourseViewSet(ModelViewSet):
+class CourseViewSet(SparseFieldsetMixin, CachedRepresentationMixin, ModelViewSet):
     """
     Полный CRUD для Course через ViewSet:
     - list (GET /courses/)
@@ -20,25 +23,70 @@ class CourseViewSet(ModelViewSet):
     - create (POST /courses/)
     - update/partial_update (PUT/PATCH /courses/{id}/)
     - destroy (DELETE /courses/{id}/)
+
+    list/retrieve отдают представления из кеша (materials/cache.py),
+    is_subscribed накладывается поверх для текущего пользователя.
+    `?search=` — полнотекстовый поиск по названию и описанию.
+
+    Список по умолчанию — краткие карточки без уроков; уроки добавляет
+    `?expand=lessons`, `?fields=` оставляет только нужные поля
+    (`?fields=id,title,lessons.title`). Карточка курса уроки включает.
     """
-    queryset = Course.objects.all().order_by("id")
+    queryset = Course.objects.defer("search_vector").order_by("id")
     serializer_class = CourseSerializer
-    pagination_class = DefaultPagination
+    representation_cache = COURSE_CACHE
+    pagination_class = KeysetCursorPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter, FullTextSearchFilter]
+    ordering_fields = ["id", "title"]
+    ordering = ["id"]
+    expandable_fields = ("lessons",)
+    default_expand = {"retrieve": ("lessons",)}
+    # владелец — для прав, title — позиция keyset-курсора
+    required_columns = ("id", "owner", "title")
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.id)
 
     def perform_update(self, serializer):
         course = serializer.save()
-        notify_course_updated.delay(course.id)
+        schedule_course_update_notification(course.id)
 
     def get_queryset(self):
         qs = super().get_queryset()
         user = self.request.user
 
-        if user.is_authenticated and user.groups.filter(name="moderators").exists():
+        # lessons_count и is_subscribed считаются в том же SELECT (если
+        # выбраны); уроки подтягиваются одним запросом только для курсов,
+        # которых нет в кеше
+        fieldset = self.get_fieldset()
+        fields = fieldset.fields if fieldset is not None else {"lessons_count", "is_subscribed"}
+        if "lessons_count" in fields:
+            qs = qs.annotate(lessons_count=Count("lessons"))
+        if "is_subscribed" in fields:
+            qs = qs.annotate(is_subscribed=self._is_subscribed_expression(user))
+        qs = self.apply_fieldset(qs)
+
+        if is_moderator(user):
             return qs
-        return qs.filter(owner=user)
+        return qs.filter(owner_id=user.id)
+
+    def get_representation_prefetch(self):
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return None
+        if "lessons" not in fieldset.fields:
+            return []
+        lesson_fields = self.get_serializer(fieldset=fieldset).fields["lessons"].child.fields
+        columns = serializer_columns(lesson_fields, Lesson) | {"id", "course"}
+        return [Prefetch("lessons", queryset=Lesson.objects.only(*columns).order_by("id"))]
+
+    @staticmethod
+    def _is_subscribed_expression(user):
+        if not user.is_authenticated:
+            return Value(False)
+        return Exists(
+            Subscription.objects.filter(course=OuterRef("pk"), user_id=user.id)
+        )
 
     def get_permissions(self):
         if self.action == "create":
@@ -52,25 +100,32 @@ class CourseViewSet(ModelViewSet):
         return [p() for p in permission_classes]
 
 
-class LessonListCreateAPIView(generics.ListCreateAPIView):
+class LessonListCreateAPIView(SparseFieldsetMixin, CachedRepresentationMixin, generics.ListCreateAPIView):
     """
-    GET /lessons/  — список уроков
+    GET /lessons/  — список уроков (`?search=` — полнотекстовый поиск,
+                     `?fields=` — только нужные поля)
     POST /lessons/ — создание урока
     """
-    queryset = Lesson.objects.all().order_by("id")
+    queryset = Lesson.objects.defer("search_vector").order_by("id")
     serializer_class = LessonSerializer
-    pagination_class = DefaultPagination
+    representation_cache = LESSON_CACHE
+    pagination_class = KeysetCursorPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter, FullTextSearchFilter]
+    ordering_fields = ["id", "title"]
+    ordering = ["id"]
+    # курс — для сигналов кеша, title — позиция keyset-курсора
+    required_columns = ("id", "owner", "course", "title")
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.id)
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        qs = self.apply_fieldset(super().get_queryset())
         user = self.request.user
 
-        if user.is_authenticated and user.groups.filter(name="moderators").exists():
+        if is_moderator(user):
             return qs
-        return qs.filter(owner=user)
+        return qs.filter(owner_id=user.id)
 
     def get_permissions(self):
         if self.request.method == "POST":
@@ -80,29 +135,25 @@ class LessonListCreateAPIView(generics.ListCreateAPIView):
         return [p() for p in permission_classes]
 
 
-class LessonRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class LessonRetrieveUpdateDestroyAPIView(SparseFieldsetMixin, CachedRepresentationMixin,
+                                         generics.RetrieveUpdateDestroyAPIView):
     """
     GET    /lessons/{id}/ — получить урок
     PUT    /lessons/{id}/ — полное обновление
     PATCH  /lessons/{id}/ — частичное обновление
     DELETE /lessons/{id}/ — удалить
     """
-    queryset = Lesson.objects.all()
+    queryset = Lesson.objects.defer("search_vector")
     serializer_class = LessonSerializer
+    representation_cache = LESSON_CACHE
+    required_columns = ("id", "owner", "course")
+
+    def get_queryset(self):
+        return self.apply_fieldset(super().get_queryset())
 
     def perform_update(self, serializer):
         lesson = serializer.save()
-        course_id = lesson.course_id  # быстрее чем lesson.course.id
-
-        with transaction.atomic():
-            course = Course.objects.select_for_update().get(pk=course_id)
-            now = timezone.now()
-
-            last = course.last_notification_sent_at
-            if last is None or now - last >= timedelta(hours=4):
-                course.last_notification_sent_at = now
-                course.save(update_fields=["last_notification_sent_at"])
-                notify_course_updated.delay(course.id)
+        schedule_course_update_notification(lesson.course_id)
 
     def get_permissions(self):
         if self.request.method == "DELETE":
@@ -0,0 +1,91 @@
+import csv
+
+from django.conf import settings
+from drf_spectacular.utils import OpenApiResponse, extend_schema
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import BaseParser, MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from users.permissions import IsModerator
+from .services.lesson_import import CSV, JSONL, import_lessons
+
+
+class StreamParser(BaseParser):
+    """
+    Отдаёт тело запроса как поток, не читая его в память.
+    """
+    fmt = None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return {"stream": stream, "format": self.fmt}
+
+
+class CSVStreamParser(StreamParser):
+    media_type = "text/csv"
+    fmt = CSV
+
+
+class JSONLinesStreamParser(StreamParser):
+    media_type = "application/x-ndjson"
+    fmt = JSONL
+
+
+class LessonImportAPIView(APIView):
+    """
+    POST /lessons/import/ — массовый импорт уроков в свои курсы.
+
+    Тело — JSONL (`application/x-ndjson`) или CSV (`text/csv`), либо файл
+    `file` в multipart/form-data (формат по расширению .csv / .jsonl).
+    """
+    permission_classes = [IsAuthenticated, ~IsModerator]
+    parser_classes = [JSONLinesStreamParser, CSVStreamParser, MultiPartParser]
+
+    @extend_schema(
+        summary="Массовый импорт уроков (JSONL/CSV)",
+        description=(
+            "Строка — урок с полями course, title, description, video_url.\n"
+            "Импорт атомарный: при ошибке в любой строке ничего не сохраняется, "
+            "а в ответе — ошибки по номерам строк."
+        ),
+        request={
+            "application/x-ndjson": {"type": "string"},
+            "text/csv": {"type": "string"},
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+            },
+        },
+        responses={
+            201: OpenApiResponse(description="Уроки созданы"),
+            400: OpenApiResponse(description="Ошибки в строках файла"),
+        },
+        tags=["Lessons"],
+    )
+    def post(self, request, *args, **kwargs):
+        stream, fmt = self._source(request)
+        try:
+            result = import_lessons(
+                stream,
+                fmt,
+                owner=request.user,
+                batch_size=settings.LESSON_IMPORT_BATCH_SIZE,
+                max_errors=settings.LESSON_IMPORT_MAX_ERRORS,
+            )
+        except (ValueError, csv.Error) as exc:
+            raise ValidationError({"file": [f"Не удалось прочитать файл: {exc}"]})
+
+        code = status.HTTP_400_BAD_REQUEST if result["errors"] else status.HTTP_201_CREATED
+        return Response(result, status=code)
+
+    @staticmethod
+    def _source(request):
+        upload = request.FILES.get("file")
+        if upload is not None:
+            fmt = CSV if upload.name.lower().endswith(".csv") else JSONL
+            return upload, fmt
+        if isinstance(request.data, dict) and "stream" in request.data:
+            return request.data["stream"], request.data["format"]
+        raise ValidationError({"file": ["Передайте файл JSONL или CSV."]})
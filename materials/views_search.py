@@ -0,0 +1,41 @@
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import generics
+from rest_framework.permissions import IsAuthenticated
+
+from .paginators import SearchPagination
+from .serializers import SearchQuerySerializer, SearchResultSerializer
+from .services.search import search_materials
+
+
+class SearchAPIView(generics.ListAPIView):
+    """
+    GET /search/?search=<запрос>[&type=course|lesson] — курсы и уроки по
+    убыванию релевантности (название важнее описания).
+
+    Видимость как у списков: модератор ищет по всем материалам,
+    остальные — только по своим.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = SearchResultSerializer
+    pagination_class = SearchPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        query = SearchQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        return search_materials(
+            self.request.user,
+            query.validated_data["search"],
+            kind=query.validated_data.get("type"),
+        )
+
+    @extend_schema(
+        summary="Полнотекстовый поиск по курсам и урокам",
+        parameters=[
+            OpenApiParameter("search", str, required=True, description="Текст запроса"),
+            OpenApiParameter("type", str, enum=["course", "lesson"], description="Только курсы или только уроки"),
+        ],
+        tags=["Search"],
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
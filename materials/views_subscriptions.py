@@ -1,11 +1,12 @@
-from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
-from .models import Course, Subscription
+from .serializers import SubscriptionBulkSerializer
+from .services.subscriptions import subscribe_many, toggle_subscription, unsubscribe_many
 
 
 class CourseSubscriptionAPIView(APIView):
@@ -42,19 +43,66 @@ class CourseSubscriptionAPIView(APIView):
         tags=["Subscriptions"],
     )
     def post(self, request, *args, **kwargs):
-        user = request.user
-        course_id = request.data.get("course_id")
-        course_item = get_object_or_404(Course, pk=course_id)
+        try:
+            course_id = int(request.data.get("course_id"))
+        except (TypeError, ValueError):
+            raise NotFound("Курс не найден.")
 
-        subs_qs = Subscription.objects.filter(user=user, course=course_item)
-
-        if subs_qs.exists():
-            subs_qs.delete()
-            message = "подписка удалена"
-            is_subscribed = False
-        else:
-            Subscription.objects.create(user=user, course=course_item)
-            message = "подписка добавлена"
-            is_subscribed = True
+        is_subscribed = toggle_subscription(request.user.id, course_id)
+        if is_subscribed is None:
+            raise NotFound("Курс не найден.")
 
+        message = "подписка добавлена" if is_subscribed else "подписка удалена"
         return Response({"message": message, "is_subscribed": is_subscribed})
+
+
+class CourseSubscriptionBulkAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Массовая подписка / отписка",
+        description=(
+                "action=subscribe — подписывает на все существующие курсы из списка,\n"
+                "уже оформленные подписки не дублируются.\n"
+                "action=unsubscribe — удаляет подписки на курсы из списка."
+        ),
+        request=SubscriptionBulkSerializer,
+        responses={
+            200: OpenApiResponse(
+                response={
+                    "type": "object",
+                    "properties": {
+                        "message": {"type": "string", "example": "подписки добавлены"},
+                        "is_subscribed": {"type": "boolean", "example": True},
+                        "course_ids": {"type": "array", "items": {"type": "integer"}},
+                        "not_found": {"type": "array", "items": {"type": "integer"}},
+                        "removed": {"type": "integer", "example": 2},
+                    },
+                },
+                description="Результат массовой операции",
+            ),
+            400: OpenApiResponse(description="Некорректный список курсов или действие"),
+        },
+        tags=["Subscriptions"],
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = SubscriptionBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        course_ids = serializer.validated_data["course_ids"]
+
+        if serializer.validated_data["action"] == SubscriptionBulkSerializer.SUBSCRIBE:
+            subscribed, not_found = subscribe_many(request.user.id, course_ids)
+            return Response({
+                "message": "подписки добавлены",
+                "is_subscribed": True,
+                "course_ids": subscribed,
+                "not_found": not_found,
+            })
+
+        removed = unsubscribe_many(request.user.id, course_ids)
+        return Response({
+            "message": "подписки удалены",
+            "is_subscribed": False,
+            "course_ids": sorted(set(course_ids)),
+            "removed": removed,
+        })
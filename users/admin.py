@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Payment
+from .models import User, Payment, PaymentDailyRollup, StripeEvent, StripePrice
 
 
 @admin.register(User)
@@ -18,6 +18,40 @@ class PaymentAdmin(admin.ModelAdmin):
         'paid_lesson',  # ← и не lesson
         'amount',
         'payment_method',
+        'status',
     )
-    list_filter = ('payment_method', 'payment_date')
+    list_filter = ('payment_method', 'status', 'payment_date')
     search_fields = ('user__email',)
+
+    def get_changeform_initial_data(self, request):
+        # Вручную вносят наличные и переводы — они уже оплачены, pending остаётся за Stripe.
+        initial = super().get_changeform_initial_data(request)
+        initial.setdefault('status', Payment.Status.PAID)
+        return initial
+
+
+@admin.register(StripePrice)
+class StripePriceAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'paid_course',
+        'paid_lesson',
+        'amount',
+        'currency',
+        'stripe_product_id',
+        'stripe_price_id',
+    )
+    search_fields = ('stripe_product_id', 'stripe_price_id')
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_id', 'type', 'received_at', 'processed_at')
+    list_filter = ('type',)
+    search_fields = ('event_id',)
+
+
+@admin.register(PaymentDailyRollup)
+class PaymentDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'paid_course', 'paid_lesson', 'payment_method', 'count', 'amount')
+    list_filter = ('payment_method', 'day')
@@ -0,0 +1,131 @@
+"""
+JWT-аутентификация без запросов к БД.
+
+В токен при входе кладутся id, email, is_staff и роль модератора, и
+request.user строится из подписанных claims (ClaimsUser) — без SELECT
+пользователя и его групп на каждом запросе. Полная запись users.User
+читается, только если view обращается к ClaimsUser.instance.
+
+Так как токен живёт дольше, чем его claims остаются верными, отзыв —
+через Redis: для пользователя хранится момент отзыва, и токены сессий,
+начатых раньше, отклоняются (один GET на запрос). Отзывают
+деактивация и смена роли, email или is_staff (users/signals.py).
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from config.redis_client import get_redis
+from .permissions import is_moderator
+
+REVOKED_KEY = "users:tokens_revoked_at:{user_id}"
+# момент входа: копируется из refresh-токена во все выпущенные по нему access
+AUTH_TIME_CLAIM = "auth_time"
+MODERATOR_CLAIM = "is_moderator"
+
+
+def _revoked_key(user_id) -> str:
+    return REVOKED_KEY.format(user_id=user_id)
+
+
+def revoke_user_tokens(user_ids) -> None:
+    """
+    Отзывает все выданные пользователям токены. Запись живёт столько же,
+    сколько refresh-токен: более старые токены к тому времени истекут.
+
+    Внутри транзакции отзыв повторяется после коммита: токен, выданный
+    до коммита по старым данным, тоже будет отклонён.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    _revoke(user_ids)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _revoke(user_ids))
+
+
+def _revoke(user_ids) -> None:
+    now = time.time()
+    ttl = int(settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"].total_seconds())
+    pipe = get_redis().pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.set(_revoked_key(user_id), now, ex=ttl)
+    pipe.execute()
+
+
+def is_token_revoked(token) -> bool:
+    revoked_at = get_redis().get(_revoked_key(token[api_settings.USER_ID_CLAIM]))
+    if revoked_at is None:
+        return False
+    return token.get(AUTH_TIME_CLAIM, 0) <= float(revoked_at)
+
+
+class ClaimsUser(TokenUser):
+    """
+    request.user из claims токена: id, email, is_staff, роль модератора.
+    Для записи в БД используйте id (`owner_id=user.id`), полная модель —
+    `instance` (один запрос при первом обращении).
+    """
+
+    def __init__(self, token):
+        super().__init__(token)
+        # is_moderator() берёт роль отсюда, не обращаясь к БД и кешу
+        self._is_moderator = bool(token.get(MODERATOR_CLAIM, False))
+
+    @cached_property
+    def id(self) -> int:
+        # simplejwt кладёт user_id в токен строкой, а owner_id в моделях — int
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self) -> int:
+        return self.id
+
+    @cached_property
+    def email(self) -> str:
+        return self.token.get("email", "")
+
+    @cached_property
+    def instance(self):
+        return get_user_model().objects.get(pk=self.id)
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Bearer-токен → ClaimsUser; отозванные токены отклоняются.
+    """
+
+    def get_user(self, validated_token):
+        if is_token_revoked(validated_token):
+            raise AuthenticationFailed("Токен отозван, войдите заново.", code="token_revoked")
+        return super().get_user(validated_token)
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Вход: в токены добавляются claims для ClaimsUser."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["email"] = user.email
+        token["is_staff"] = user.is_staff
+        token[MODERATOR_CLAIM] = is_moderator(user)
+        token[AUTH_TIME_CLAIM] = round(time.time(), 3)
+        return token
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """Обновление access-токена: отозванный refresh-токен не принимается."""
+
+    def validate(self, attrs):
+        if is_token_revoked(self.token_class(attrs["refresh"])):
+            raise InvalidToken("Токен отозван, войдите заново.")
+        return super().validate(attrs)
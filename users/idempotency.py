@@ -0,0 +1,131 @@
+import hashlib
+import json
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+IDEMPOTENCY_CACHE_KEY = "users:idempotency:{view}:{user_id}:{key}"
+# Сколько держать отметку «запрос выполняется», если процесс упал, не сняв её
+# (по умолчанию; view с долгими внешними вызовами задают свою)
+IN_FLIGHT_TIMEOUT = 60
+POLL_INTERVAL = 0.1
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Запрос с этим Idempotency-Key ещё выполняется, повторите его позже."
+    default_code = "idempotency_conflict"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Idempotency-Key уже использован для запроса с другими данными."
+    default_code = "idempotency_key_reused"
+
+
+class IdempotentRequest:
+    """
+    Запись в кеше для пары (пользователь, Idempotency-Key).
+
+    Первый запрос ставит отметку «выполняется» (cache.add) и после успеха
+    заменяет её сохранённым ответом. Повтор получает этот ответ; повтор,
+    пришедший во время выполнения, ждёт его до `wait` секунд, затем 409.
+    Ключ привязан к телу запроса: другое тело с тем же ключом — 422.
+    """
+
+    def __init__(self, view: str, user_id: int, key: str, payload):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        self.cache_key = IDEMPOTENCY_CACHE_KEY.format(view=view, user_id=user_id, key=digest)
+        self.fingerprint = hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def begin(self, wait: float, in_flight_timeout: float = IN_FLIGHT_TIMEOUT):
+        """
+        Возвращает сохранённый ответ или None, если запрос нужно выполнить.
+
+        `in_flight_timeout` должен быть не меньше худшего времени запроса:
+        иначе отметка истечёт раньше, и повтор выполнит запрос второй раз.
+        """
+        deadline = time.monotonic() + wait
+        marker = {"state": "in_flight", "fingerprint": self.fingerprint}
+        while True:
+            if cache.add(self.cache_key, marker, timeout=math.ceil(in_flight_timeout)):
+                return None
+            entry = cache.get(self.cache_key)
+            if entry is None:
+                # отметка истекла между add и get — пробуем занять снова
+                continue
+            if entry["fingerprint"] != self.fingerprint:
+                raise IdempotencyKeyReused()
+            if entry["state"] == "done":
+                return entry
+            if time.monotonic() >= deadline:
+                raise IdempotencyConflict()
+            time.sleep(POLL_INTERVAL)
+
+    def complete(self, response: Response) -> None:
+        headers = {name: value for name, value in response.items() if name == "Location"}
+        cache.set(
+            self.cache_key,
+            {
+                "state": "done",
+                "fingerprint": self.fingerprint,
+                "status": response.status_code,
+                "data": response.data,
+                "headers": headers,
+            },
+            timeout=settings.IDEMPOTENCY_KEY_TTL,
+        )
+
+    def release(self) -> None:
+        cache.delete(self.cache_key)
+
+
+class IdempotentPostMixin:
+    """
+    Поддержка заголовка `Idempotency-Key` для POST-view.
+
+    Успешный ответ сохраняется на IDEMPOTENCY_KEY_TTL секунд и отдаётся
+    на повторы без обращения к БД и внешним сервисам (с заголовком
+    `Idempotent-Replayed: true`). Ошибочные ответы не сохраняются —
+    запрос с тем же ключом можно повторить.
+    """
+    idempotency_header = "Idempotency-Key"
+
+    def get_in_flight_timeout(self) -> float:
+        return IN_FLIGHT_TIMEOUT
+
+    def post(self, request, *args, **kwargs):
+        key = request.headers.get(self.idempotency_header)
+        if key is None:
+            return super().post(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({self.idempotency_header: "Некорректный ключ идемпотентности."})
+
+        idempotent = IdempotentRequest(type(self).__name__, request.user.pk, key, request.data)
+        saved = idempotent.begin(wait=settings.IDEMPOTENCY_WAIT, in_flight_timeout=self.get_in_flight_timeout())
+        if saved is not None:
+            return Response(
+                saved["data"],
+                status=saved["status"],
+                headers={**saved["headers"], "Idempotent-Replayed": "true"},
+            )
+
+        try:
+            response = super().post(request, *args, **kwargs)
+        except BaseException:
+            idempotent.release()
+            raise
+
+        if status.is_success(response.status_code):
+            idempotent.complete(response)
+        else:
+            idempotent.release()
+        return response
@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.services.rollups import backfill_payment_rollups
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает дневные итоги платежей за всю историю кусками по N дней"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="начальная дата YYYY-MM-DD (по умолчанию — первый платёж)")
+        parser.add_argument("--chunk-days", type=int, default=31, help="дней в одной транзакции")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError("--since: ожидается дата в формате YYYY-MM-DD")
+        if options["chunk_days"] < 1:
+            raise CommandError("--chunk-days должен быть больше 0")
+
+        def progress(first_day, last_day, rows):
+            self.stdout.write(f"{first_day} — {last_day}: всего строк итогов {rows}")
+
+        rows = backfill_payment_rollups(since=since, chunk_days=options["chunk_days"], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Готово: {rows} строк итогов"))
@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0005_course_title_id_idx_lesson_title_id_idx'),
+        ('users', '0009_payment_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='сумма')),
+                ('currency', models.CharField(max_length=3, verbose_name='валюта')),
+                ('product_name', models.CharField(max_length=255, verbose_name='название продукта')),
+                ('product_description', models.TextField(blank=True, verbose_name='описание продукта')),
+                ('stripe_product_id', models.CharField(max_length=255, verbose_name='Stripe product id')),
+                ('stripe_price_id', models.CharField(max_length=255, verbose_name='Stripe price id')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создано')),
+                ('paid_course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stripe_prices', to='materials.course', verbose_name='курс')),
+                ('paid_lesson', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stripe_prices', to='materials.lesson', verbose_name='урок')),
+            ],
+            options={
+                'verbose_name': 'цена Stripe',
+                'verbose_name_plural': 'цены Stripe',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('paid_course__isnull', False)), fields=('paid_course', 'amount', 'currency'), name='unique_stripe_price_course_amount'), models.UniqueConstraint(condition=models.Q(('paid_lesson__isnull', False)), fields=('paid_lesson', 'amount', 'currency'), name='unique_stripe_price_lesson_amount')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+def mark_existing_payments(apps, schema_editor):
+    Payment = apps.get_model('users', 'Payment')
+    Payment.objects.filter(stripe_session_id__isnull=False).update(status='open')
+    # Платежи без Stripe (наличные, перевод) уже оплачены — не оставляем их в pending.
+    Payment.objects.filter(stripe_session_id__isnull=True).update(status='paid')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_stripeprice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(
+                choices=[
+                    ('pending', 'создаётся ссылка на оплату'),
+                    ('open', 'ожидает оплаты'),
+                    ('failed', 'ошибка создания оплаты'),
+                ],
+                default='pending',
+                max_length=20,
+                verbose_name='статус',
+            ),
+        ),
+        migrations.RunPython(mark_existing_payments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_payment_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True, verbose_name='Stripe event id')),
+                ('type', models.CharField(max_length=100, verbose_name='тип события')),
+                ('payload', models.JSONField(verbose_name='событие')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='получено')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='обработано')),
+            ],
+            options={
+                'verbose_name': 'событие Stripe',
+                'verbose_name_plural': 'события Stripe',
+                'indexes': [
+                    models.Index(
+                        condition=models.Q(('processed_at__isnull', True)),
+                        fields=['id'],
+                        name='stripe_event_unprocessed_idx',
+                    ),
+                ],
+            },
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(
+                choices=[
+                    ('pending', 'создаётся ссылка на оплату'),
+                    ('open', 'ожидает оплаты'),
+                    ('paid', 'оплачен'),
+                    ('expired', 'ссылка на оплату истекла'),
+                    ('failed', 'ошибка оплаты'),
+                ],
+                default='pending',
+                max_length=20,
+                verbose_name='статус',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['stripe_session_id'], name='payment_stripe_session_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0005_course_title_id_idx_lesson_title_id_idx'),
+        ('users', '0012_stripe_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='название')),
+                ('high_water_mark', models.DateTimeField(verbose_name='посчитано до')),
+            ],
+            options={
+                'verbose_name': 'состояние пересчёта итогов',
+                'verbose_name_plural': 'состояния пересчёта итогов',
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='день')),
+                ('payment_method', models.CharField(
+                    choices=[('cash', 'наличные'), ('transfer', 'перевод')],
+                    max_length=20,
+                    verbose_name='способ оплаты',
+                )),
+                ('count', models.PositiveIntegerField(verbose_name='количество платежей')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='сумма')),
+                ('paid_course', models.ForeignKey(
+                    blank=True,
+                    null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='payment_rollups',
+                    to='materials.course',
+                    verbose_name='курс',
+                )),
+                ('paid_lesson', models.ForeignKey(
+                    blank=True,
+                    null=True,
+                    on_delete=django.db.models.deletion.SET_NULL,
+                    related_name='payment_rollups',
+                    to='materials.lesson',
+                    verbose_name='урок',
+                )),
+            ],
+            options={
+                'verbose_name': 'итоги платежей за день',
+                'verbose_name_plural': 'итоги платежей по дням',
+                'indexes': [
+                    models.Index(fields=['day'], name='payment_rollup_day_idx'),
+                    models.Index(fields=['paid_course', 'day'], name='payment_rollup_course_day_idx'),
+                ],
+            },
+        ),
+    ]
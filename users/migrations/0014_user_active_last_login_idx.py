@@ -0,0 +1,22 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('users', '0013_payment_rollups'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(
+                condition=models.Q(('is_active', True), ('is_staff', False), ('is_superuser', False)),
+                fields=['last_login'],
+                name='user_active_last_login_idx',
+            ),
+        ),
+    ]
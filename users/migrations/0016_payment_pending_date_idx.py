@@ -0,0 +1,22 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не работает внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('users', '0015_user_avatar_renditions'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='payment',
+            index=models.Index(
+                condition=models.Q(('status', 'pending')),
+                fields=['payment_date'],
+                name='payment_pending_date_idx',
+            ),
+        ),
+    ]
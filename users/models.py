@@ -47,12 +47,28 @@ class User(AbstractUser):
         null=True,
         verbose_name='аватар',
     )
+    avatar_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='копии аватара',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # кандидаты на деактивацию (users.tasks.deactivate_inactive_users)
+            models.Index(
+                fields=['last_login'],
+                condition=models.Q(is_active=True, is_staff=False, is_superuser=False),
+                name='user_active_last_login_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -62,6 +78,13 @@ class Payment(models.Model):
         CASH = 'cash', 'наличные'
         TRANSFER = 'transfer', 'перевод'
 
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'создаётся ссылка на оплату'
+        OPEN = 'open', 'ожидает оплаты'
+        PAID = 'paid', 'оплачен'
+        EXPIRED = 'expired', 'ссылка на оплату истекла'
+        FAILED = 'failed', 'ошибка оплаты'
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -122,12 +145,171 @@ class Payment(models.Model):
         null=True,
         verbose_name='Stripe session id',
     )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name='статус',
+    )
 
     class Meta:
         verbose_name = 'платеж'
         verbose_name_plural = 'платежи'
         ordering = ['-payment_date']
+        indexes = [
+            models.Index(fields=['payment_date', 'id'], name='payment_date_id_idx'),
+            models.Index(fields=['stripe_session_id'], name='payment_stripe_session_idx'),
+            # зависшие pending (users.tasks.fail_stale_pending_payments)
+            models.Index(
+                fields=['payment_date'],
+                condition=models.Q(status='pending'),
+                name='payment_pending_date_idx',
+            ),
+        ]
 
     def __str__(self):
         target = self.paid_course or self.paid_lesson
         return f'Платеж #{self.pk} от {self.user} за {target} на сумму {self.amount}'
+
+
+class StripePrice(models.Model):
+    """
+    Продукт и цена Stripe для оплаты курса или урока на определённую сумму.
+
+    Позволяет не создавать Product и Price при каждой оплате. Название и
+    описание, с которыми создан продукт, сохраняются: если у курса/урока
+    они изменились, запись считается устаревшей и продукт создаётся заново.
+    """
+    paid_course = models.ForeignKey(
+        'materials.Course',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='stripe_prices',
+        verbose_name='курс',
+    )
+    paid_lesson = models.ForeignKey(
+        'materials.Lesson',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='stripe_prices',
+        verbose_name='урок',
+    )
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='сумма',
+    )
+    currency = models.CharField(max_length=3, verbose_name='валюта')
+    product_name = models.CharField(max_length=255, verbose_name='название продукта')
+    product_description = models.TextField(blank=True, verbose_name='описание продукта')
+    stripe_product_id = models.CharField(max_length=255, verbose_name='Stripe product id')
+    stripe_price_id = models.CharField(max_length=255, verbose_name='Stripe price id')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='создано')
+
+    class Meta:
+        verbose_name = 'цена Stripe'
+        verbose_name_plural = 'цены Stripe'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['paid_course', 'amount', 'currency'],
+                condition=models.Q(paid_course__isnull=False),
+                name='unique_stripe_price_course_amount',
+            ),
+            models.UniqueConstraint(
+                fields=['paid_lesson', 'amount', 'currency'],
+                condition=models.Q(paid_lesson__isnull=False),
+                name='unique_stripe_price_lesson_amount',
+            ),
+        ]
+
+    def __str__(self):
+        target = self.paid_course or self.paid_lesson
+        return f'{target}: {self.amount} {self.currency} ({self.stripe_price_id})'
+
+
+class StripeEvent(models.Model):
+    """
+    Событие webhook Stripe в исходном виде.
+
+    Таблица только пополняется: повтор события с тем же event_id
+    отбрасывается при вставке. Обработанные события помечаются
+    processed_at (users.services.webhooks.apply_stripe_events).
+    """
+    event_id = models.CharField(max_length=255, unique=True, verbose_name='Stripe event id')
+    type = models.CharField(max_length=100, verbose_name='тип события')
+    payload = models.JSONField(verbose_name='событие')
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name='получено')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='обработано')
+
+    class Meta:
+        verbose_name = 'событие Stripe'
+        verbose_name_plural = 'события Stripe'
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='stripe_event_unprocessed_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.type} {self.event_id}'
+
+
+class PaymentDailyRollup(models.Model):
+    """
+    Предрасчитанные итоги оплаченных платежей за день в разрезе курса,
+    урока и способа оплаты. Пересчитывается users.services.rollups.
+    """
+    day = models.DateField(verbose_name='день')
+    paid_course = models.ForeignKey(
+        'materials.Course',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payment_rollups',
+        verbose_name='курс',
+    )
+    paid_lesson = models.ForeignKey(
+        'materials.Lesson',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payment_rollups',
+        verbose_name='урок',
+    )
+    payment_method = models.CharField(
+        max_length=20,
+        choices=Payment.PaymentMethod.choices,
+        verbose_name='способ оплаты',
+    )
+    count = models.PositiveIntegerField(verbose_name='количество платежей')
+    amount = models.DecimalField(max_digits=14, decimal_places=2, verbose_name='сумма')
+
+    class Meta:
+        verbose_name = 'итоги платежей за день'
+        verbose_name_plural = 'итоги платежей по дням'
+        indexes = [
+            models.Index(fields=['day'], name='payment_rollup_day_idx'),
+            models.Index(fields=['paid_course', 'day'], name='payment_rollup_course_day_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.day}: {self.count} платежей на {self.amount}'
+
+
+class PaymentRollupState(models.Model):
+    """
+    Отметка, до которой (по payment_date) итоги платежей уже посчитаны.
+    """
+    name = models.CharField(max_length=50, unique=True, verbose_name='название')
+    high_water_mark = models.DateTimeField(verbose_name='посчитано до')
+
+    class Meta:
+        verbose_name = 'состояние пересчёта итогов'
+        verbose_name_plural = 'состояния пересчёта итогов'
+
+    def __str__(self):
+        return f'{self.name}: {self.high_water_mark}'
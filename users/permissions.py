@@ -1,7 +1,49 @@
+from django.core.cache import cache
 from rest_framework.permissions import BasePermission
 
 MODERATOR_GROUP_NAME = 'moderators'
 
+MODERATOR_CACHE_KEY = 'users:is_moderator:{user_id}'
+MODERATOR_CACHE_TIMEOUT = 60 * 60
+
+
+def _moderator_cache_key(user_id) -> str:
+    return MODERATOR_CACHE_KEY.format(user_id=user_id)
+
+
+def is_moderator(user) -> bool:
+    """
+    True, если пользователь состоит в группе модераторов.
+
+    Ответ вычисляется один раз за запрос (запоминается на объекте
+    request.user) и хранится в общем кеше между запросами.
+    Кеш сбрасывается сигналом m2m_changed по User.groups (см. users/signals.py).
+    """
+    if not user or not user.is_authenticated:
+        return False
+
+    cached = getattr(user, '_is_moderator', None)
+    if cached is not None:
+        return cached
+
+    key = _moderator_cache_key(user.pk)
+    value = cache.get(key)
+    if value is None:
+        value = user.groups.filter(name=MODERATOR_GROUP_NAME).exists()
+        cache.set(key, value, MODERATOR_CACHE_TIMEOUT)
+
+    user._is_moderator = value
+    return value
+
+
+def invalidate_moderator_cache(user_ids) -> None:
+    """
+    Сбрасывает закешированную роль модератора для указанных пользователей.
+    """
+    keys = [_moderator_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        cache.delete_many(keys)
+
 
 class IsModerator(BasePermission):
     """
@@ -9,11 +51,7 @@ class IsModerator(BasePermission):
     """
 
     def has_permission(self, request, view):
-        return (
-                request.user
-                and request.user.is_authenticated
-                and request.user.groups.filter(name=MODERATOR_GROUP_NAME).exists()
-        )
+        return is_moderator(request.user)
 
     def has_object_permission(self, request, view, obj):
         return self.has_permission(request, view)
@@ -41,8 +79,6 @@ class IsNotModeratorForCreateDelete(BasePermission):
         if not user or not user.is_authenticated:
             return False
 
-        is_moderator = user.groups.filter(name=MODERATOR_GROUP_NAME).exists()
-
         if request.method in ('POST', 'DELETE'):
-            return not is_moderator
+            return not is_moderator(user)
         return True
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
+from config.thumbnails import ImageRenditionsField
 from .models import Payment
 
 User = get_user_model()
@@ -53,10 +54,11 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
 
 class UserSerializer(serializers.ModelSerializer):
     """Для просмотра и редактирования пользователя (без пароля)."""
+    avatar_renditions = ImageRenditionsField('avatar')
 
     class Meta:
         model = User
-        fields = ['id', 'email', 'first_name', 'last_name', 'phone', 'city', 'avatar']
+        fields = ['id', 'email', 'first_name', 'last_name', 'phone', 'city', 'avatar', 'avatar_renditions']
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -74,3 +76,15 @@ class UserCreateSerializer(serializers.ModelSerializer):
         user.set_password(password)
         user.save()
         return user
+
+
+class PaymentStatsQuerySerializer(serializers.Serializer):
+    """Параметры периода для /api/payments/stats/."""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        date_from, date_to = attrs.get("date_from"), attrs.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError("date_from не может быть позже date_to.")
+        return attrs
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from users.models import Payment, StripePrice
+from .stripe import create_stripe_checkout_session, create_stripe_price, create_stripe_product
+
+STRIPE_CURRENCY = "rub"
+
+STRIPE_PRICE_CACHE_KEY = "users:stripe_price:{kind}:{pk}:{amount}:{currency}"
+STRIPE_PRICE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _price_cache_key(target, amount: Decimal, currency: str) -> str:
+    return STRIPE_PRICE_CACHE_KEY.format(
+        kind=target._meta.model_name,
+        pk=target.pk,
+        amount=Decimal(amount).quantize(Decimal("0.01")),
+        currency=currency,
+    )
+
+
+def _target_filter(target) -> dict:
+    field = "paid_course" if target._meta.model_name == "course" else "paid_lesson"
+    return {field: target}
+
+
+def get_or_create_stripe_price(target, amount: Decimal, currency: str = STRIPE_CURRENCY) -> dict:
+    """
+    Возвращает {"product_id", "price_id"} Stripe для оплаты курса/урока.
+
+    Сначала смотрит в кеш, затем в StripePrice; запись подходит, только если
+    название и описание курса/урока не менялись с момента создания продукта.
+    Если подходящей цены нет, продукт переиспользуется (когда он актуален),
+    а недостающие объекты создаются в Stripe и запоминаются.
+    """
+    name = getattr(target, "title", "Оплата")
+    description = getattr(target, "description", "")
+    key = _price_cache_key(target, amount, currency)
+
+    cached = cache.get(key)
+    if cached and (cached["name"], cached["description"]) == (name, description):
+        return cached
+
+    entries = StripePrice.objects.filter(
+        **_target_filter(target),
+        product_name=name,
+        product_description=description,
+    )
+    entry = entries.filter(amount=amount, currency=currency).first()
+
+    if entry is None:
+        same_product = entries.first()
+        if same_product is not None:
+            product_id = same_product.stripe_product_id
+        else:
+            product_id = create_stripe_product(name=name, description=description).id
+        price = create_stripe_price(product_id=product_id, amount=amount, currency=currency)
+
+        entry, _ = StripePrice.objects.update_or_create(
+            **_target_filter(target),
+            amount=amount,
+            currency=currency,
+            defaults={
+                "product_name": name,
+                "product_description": description,
+                "stripe_product_id": product_id,
+                "stripe_price_id": price.id,
+            },
+        )
+
+    value = {
+        "product_id": entry.stripe_product_id,
+        "price_id": entry.stripe_price_id,
+        "name": name,
+        "description": description,
+    }
+    cache.set(key, value, STRIPE_PRICE_CACHE_TIMEOUT)
+    return value
+
+
+def start_checkout(payment: Payment) -> Payment:
+    """
+    Создаёт Stripe Checkout Session для платежа и сохраняет её в Payment.
+
+    При повторной оплате того же курса/урока на ту же сумму в Stripe
+    уходит один запрос — создание сессии.
+    """
+    target = payment.paid_course or payment.paid_lesson
+    price = get_or_create_stripe_price(target, payment.amount)
+    session = create_stripe_checkout_session(price_id=price["price_id"])
+
+    payment.stripe_product_id = price["product_id"]
+    payment.stripe_price_id = price["price_id"]
+    payment.stripe_session_id = session.id
+    payment.payment_url = session.url
+    payment.status = Payment.Status.OPEN
+    payment.save(update_fields=[
+        "stripe_product_id",
+        "stripe_price_id",
+        "stripe_session_id",
+        "payment_url",
+        "status",
+    ])
+    return payment
+
+
+def fail_stale_pending_payments(older_than: timedelta) -> int:
+    """
+    Переводит в failed платежи, которые дольше `older_than` ждут сессию
+    Stripe: задача create_checkout_session для них потеряна (брокер был
+    недоступен, воркер упал), и иначе клиент опрашивал бы статус вечно.
+    Возвращает число таких платежей.
+    """
+    return (
+        Payment.objects
+        .filter(status=Payment.Status.PENDING, payment_date__lt=timezone.now() - older_than)
+        .update(status=Payment.Status.FAILED)
+    )
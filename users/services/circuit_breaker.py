@@ -0,0 +1,224 @@
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from config.metrics import Counter, Gauge
+from config.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKERS = []
+
+circuit_rejections = Counter(
+    "circuit_breaker_rejections_total",
+    "Вызовы внешних сервисов, отклонённые без выполнения",
+    labelnames=("name", "reason"),
+)
+circuit_transitions = Counter(
+    "circuit_breaker_transitions_total",
+    "Переходы circuit breaker между состояниями",
+    labelnames=("name", "state"),
+)
+
+
+def _collect_states():
+    for breaker in BREAKERS:
+        try:
+            yield {"name": breaker.name}, STATE_VALUES[breaker.state()]
+        except redis.RedisError:
+            logger.warning("Не удалось прочитать состояние %s", breaker.name, exc_info=True)
+
+
+Gauge(
+    "circuit_breaker_state",
+    "Состояние circuit breaker: 0 — closed, 1 — half-open, 2 — open",
+    collect=lambda: list(_collect_states()),
+)
+
+
+class ServiceUnavailable(APIException):
+    """
+    Внешний сервис недоступен; `wait` попадает в заголовок Retry-After.
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Платёжный сервис временно недоступен, повторите попытку позже."
+    default_code = "service_unavailable"
+
+    def __init__(self, wait: float, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = max(1, math.ceil(wait))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker с состоянием в Redis, общим для всех процессов.
+
+    - closed: вызовы проходят, в окне `window` секунд считаются вызовы и
+      ошибки (медленнее `slow_call` секунд — тоже ошибка). Когда вызовов
+      не меньше `min_calls`, а доля ошибок достигла `failure_ratio`,
+      breaker открывается;
+    - open: вызовы сразу отклоняются с ServiceUnavailable на
+      `reset_timeout` секунд;
+    - half-open: проходит один пробный вызов; успех закрывает breaker,
+      ошибка снова открывает.
+
+    Параметры читаются из словаря настроек `config` при каждом вызове.
+    Если Redis недоступен, вызовы пропускаются без защиты.
+    """
+
+    def __init__(self, name: str, config: str, is_failure=lambda exc: True):
+        self.name = name
+        self.config = config
+        self.is_failure = is_failure
+        self.prefix = f"circuit:{name}"
+        BREAKERS.append(self)
+
+    @property
+    def options(self) -> dict:
+        return getattr(settings, self.config)
+
+    def _key(self, suffix: str) -> str:
+        return f"{self.prefix}:{suffix}"
+
+    def _stats_key(self) -> str:
+        return self._key(f"stats:{int(time.time() // self.options['window'])}")
+
+    def state(self) -> str:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.exists(self._key("open"))
+        pipe.exists(self._key("tripped"))
+        is_open, tripped = pipe.execute()
+        if is_open:
+            return OPEN
+        return HALF_OPEN if tripped else CLOSED
+
+    def _before_call(self) -> bool:
+        """
+        Пропускает вызов или бросает ServiceUnavailable.
+        Возвращает True, если вызов пробный (half-open).
+        """
+        r = get_redis()
+        pipe = r.pipeline(transaction=False)
+        pipe.pttl(self._key("open"))
+        pipe.exists(self._key("tripped"))
+        open_ttl, tripped = pipe.execute()
+
+        if open_ttl > 0:
+            circuit_rejections.inc(name=self.name, reason="open")
+            raise ServiceUnavailable(wait=open_ttl / 1000)
+        if not tripped:
+            return False
+        # half-open: пробный вызов достаётся одному процессу
+        probe_timeout = math.ceil(self.options["slow_call"]) + 1
+        if r.set(self._key("probe"), 1, nx=True, ex=probe_timeout):
+            return True
+        circuit_rejections.inc(name=self.name, reason="half_open")
+        raise ServiceUnavailable(wait=1)
+
+    def _after_call(self, failed: bool, probe: bool) -> None:
+        r = get_redis()
+        if probe:
+            if failed:
+                self.trip()
+            else:
+                r.delete(self._key("tripped"), self._key("probe"), self._stats_key())
+                circuit_transitions.inc(name=self.name, state=CLOSED)
+            return
+
+        window = self.options["window"]
+        stats_key = self._stats_key()
+        pipe = r.pipeline(transaction=False)
+        pipe.hincrby(stats_key, "calls", 1)
+        pipe.hincrby(stats_key, "failures", int(failed))
+        pipe.expire(stats_key, window * 2)
+        calls, failures, _ = pipe.execute()
+
+        if failed and calls >= self.options["min_calls"] and failures / calls >= self.options["failure_ratio"]:
+            self.trip()
+
+    def trip(self) -> None:
+        """
+        Открывает breaker на `reset_timeout` секунд.
+        """
+        reset_timeout = self.options["reset_timeout"]
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.set(self._key("open"), 1, ex=reset_timeout)
+        pipe.set(self._key("tripped"), 1, ex=reset_timeout * 10)
+        pipe.delete(self._key("probe"))
+        pipe.execute()
+        circuit_transitions.inc(name=self.name, state=OPEN)
+        logger.warning("Circuit breaker %s открыт на %s с", self.name, reset_timeout)
+
+    def reset(self) -> None:
+        r = get_redis()
+        keys = list(r.scan_iter(f"{self.prefix}:*"))
+        if keys:
+            r.delete(*keys)
+
+    @contextmanager
+    def guard(self):
+        try:
+            probe = self._before_call()
+        except redis.RedisError:
+            logger.warning("Circuit breaker %s: Redis недоступен", self.name, exc_info=True)
+            yield
+            return
+
+        started = time.monotonic()
+        failed = True
+        try:
+            yield
+            failed = False
+        except Exception as exc:
+            failed = self.is_failure(exc)
+            raise
+        finally:
+            failed = failed or time.monotonic() - started > self.options["slow_call"]
+            try:
+                self._after_call(failed, probe)
+            except redis.RedisError:
+                logger.warning("Circuit breaker %s: Redis недоступен", self.name, exc_info=True)
+
+
+class Bulkhead:
+    """
+    Ограничение одновременных вызовов внешнего сервиса в процессе.
+
+    Если за `wait` секунд слот не освободился, вызов отклоняется
+    с ServiceUnavailable — запросы к остальному API не ждут медленный сервис.
+    """
+
+    def __init__(self, name: str, config: str):
+        self.name = name
+        self.config = config
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    @property
+    def semaphore(self) -> threading.BoundedSemaphore:
+        if self._semaphore is None:
+            with self._lock:
+                if self._semaphore is None:
+                    limit = getattr(settings, self.config)["max_concurrent"]
+                    self._semaphore = threading.BoundedSemaphore(limit)
+        return self._semaphore
+
+    @contextmanager
+    def guard(self):
+        if not self.semaphore.acquire(timeout=getattr(settings, self.config)["wait"]):
+            circuit_rejections.inc(name=self.name, reason="bulkhead")
+            raise ServiceUnavailable(wait=1)
+        try:
+            yield
+        finally:
+            self.semaphore.release()
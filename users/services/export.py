@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+from itertools import islice
+
+CSV, JSONL = "csv", "jsonl"
+CONTENT_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    JSONL: "application/x-ndjson; charset=utf-8",
+}
+
+# Колонки выгрузки: имя в файле → поле для values_list
+PAYMENT_EXPORT_COLUMNS = {
+    "id": "id",
+    "user": "user_id",
+    "payment_date": "payment_date",
+    "paid_course": "paid_course_id",
+    "paid_lesson": "paid_lesson_id",
+    "amount": "amount",
+    "payment_method": "payment_method",
+    "status": "status",
+    "stripe_session_id": "stripe_session_id",
+}
+
+
+def _plain(value):
+    """Значение ячейки: даты — ISO 8601, суммы — строкой без потери точности."""
+    if value is None or isinstance(value, (int, str)):
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_chunks(rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PAYMENT_EXPORT_COLUMNS)
+    while chunk := list(islice(rows, chunk_size)):
+        writer.writerows([_plain(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _jsonl_chunks(rows, chunk_size):
+    names = list(PAYMENT_EXPORT_COLUMNS)
+    while chunk := list(islice(rows, chunk_size)):
+        yield "".join(
+            json.dumps(dict(zip(names, map(_plain, row))), ensure_ascii=False) + "\n"
+            for row in chunk
+        )
+
+
+def export_payments(queryset, fmt: str, chunk_size: int = 2000):
+    """
+    Генератор кусков выгрузки платежей `queryset` в CSV или JSONL.
+
+    Строки читаются через iterator(chunk_size) — на PostgreSQL это
+    серверный курсор, — и только нужными колонками (values_list), без
+    создания моделей. В памяти одновременно держится не больше
+    `chunk_size` строк; каждый кусок — одна пачка строк файла.
+    """
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    rows = queryset.values_list(*PAYMENT_EXPORT_COLUMNS.values()).iterator(chunk_size=chunk_size)
+    chunks = _csv_chunks if fmt == CSV else _jsonl_chunks
+    return chunks(rows, chunk_size)
@@ -0,0 +1,135 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+
+from users.models import Payment
+from .rollups import mark_rollup_days_stale
+from .stripe import list_stripe_checkout_sessions
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_CHECKPOINT_KEY = "users:reconcile_checkout_sessions:checkpoint"
+RECONCILE_CHECKPOINT_TIMEOUT = 60 * 60 * 24
+# Сессия создаётся после платежа; запас на расхождение часов
+CREATED_SLACK = timedelta(hours=1)
+
+
+def _final_status(session):
+    if session["status"] == "complete" and session["payment_status"] in ("paid", "no_payment_required"):
+        return Payment.Status.PAID
+    if session["status"] == "expired":
+        return Payment.Status.EXPIRED
+    return None
+
+
+def _apply(updates: dict, chunk_size: int) -> int:
+    """
+    Записывает новые статусы {payment_id: status} пачками bulk_update.
+
+    Строки блокируются и перепроверяются: платёж, который за это время
+    перевёл webhook, не перезаписывается.
+    """
+    with transaction.atomic():
+        payments = list(
+            Payment.objects
+            .filter(pk__in=updates, status=Payment.Status.OPEN)
+            .order_by("pk")
+            .select_for_update()
+            .only("id", "status", "payment_date")
+        )
+        for payment in payments:
+            payment.status = updates[payment.pk]
+        Payment.objects.bulk_update(payments, ["status"], batch_size=chunk_size)
+        mark_rollup_days_stale(
+            payment.payment_date for payment in payments if payment.status == Payment.Status.PAID
+        )
+    return len(payments)
+
+
+def reconcile_checkout_sessions(page_size: int, chunk_size: int) -> dict:
+    """
+    Сверяет открытые платежи с их Checkout Session в Stripe.
+
+    Сессии читаются страницами списка (`page_size` сессий за вызов API),
+    начиная с даты самого старого открытого платежа; платежи страницы
+    находятся одним запросом по stripe_session_id. Изменения копятся и
+    пишутся пачками по `chunk_size`; после каждой пачки курсор списка
+    сохраняется в кеш, и прерванная сверка продолжается с него.
+    """
+    checkpoint = cache.get(RECONCILE_CHECKPOINT_KEY)
+    if checkpoint is None:
+        oldest = (
+            Payment.objects
+            .filter(status=Payment.Status.OPEN, stripe_session_id__isnull=False)
+            .order_by("payment_date")
+            .values_list("payment_date", flat=True)
+            .first()
+        )
+        if oldest is None:
+            return {"sessions": 0, "updated": 0, "seconds": 0.0, "sessions_per_second": 0.0}
+        checkpoint = {
+            "created_gte": int((oldest - CREATED_SLACK).timestamp()),
+            "starting_after": None,
+            "sessions": 0,
+            "updated": 0,
+        }
+
+    started = time.monotonic()
+    scanned = total_scanned = 0
+    starting_after = checkpoint["starting_after"]
+    updates = {}
+
+    def flush():
+        checkpoint["updated"] += _apply(updates, chunk_size) if updates else 0
+        checkpoint["starting_after"] = starting_after
+        checkpoint["sessions"] += scanned
+        cache.set(RECONCILE_CHECKPOINT_KEY, checkpoint, timeout=RECONCILE_CHECKPOINT_TIMEOUT)
+        updates.clear()
+
+    while True:
+        page = list_stripe_checkout_sessions(
+            created_gte=checkpoint["created_gte"],
+            starting_after=starting_after,
+            limit=page_size,
+        )
+        sessions = {session["id"]: session for session in page["data"]}
+        open_payments = (
+            Payment.objects
+            .filter(stripe_session_id__in=sessions, status=Payment.Status.OPEN)
+            .order_by()
+            .values_list("id", "stripe_session_id")
+        )
+        for payment_id, session_id in open_payments:
+            status = _final_status(sessions[session_id])
+            if status is not None:
+                updates[payment_id] = status
+
+        scanned += len(sessions)
+        total_scanned += len(sessions)
+        if sessions:
+            starting_after = page["data"][-1]["id"]
+        if len(updates) >= chunk_size:
+            flush()
+            scanned = 0
+        if not page["has_more"]:
+            break
+
+    flush()
+    cache.delete(RECONCILE_CHECKPOINT_KEY)
+
+    seconds = time.monotonic() - started
+    result = {
+        "sessions": checkpoint["sessions"],
+        "updated": checkpoint["updated"],
+        "seconds": round(seconds, 3),
+        "sessions_per_second": round(total_scanned / seconds, 1) if seconds else 0.0,
+    }
+    logger.info(
+        "Сверка Checkout Session: %(sessions)s сессий, обновлено %(updated)s платежей "
+        "за %(seconds)s с (%(sessions_per_second)s сессий/с)",
+        result,
+    )
+    return result
@@ -0,0 +1,210 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import redis
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from config.redis_client import get_redis
+from users.models import Payment, PaymentDailyRollup, PaymentRollupState
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_STATE_NAME = "payment_daily"
+# дни, итоги которых устарели: платёж этого дня оплачен уже после подсчёта
+STALE_DAYS_KEY = "users:payment_rollups:stale_days"
+
+
+def _day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def recompute_days(first_day: date, last_day: date) -> int:
+    """
+    Пересчитывает итоги за дни [first_day, last_day] (по часовому поясу
+    проекта): строки этих дней удаляются и вставляются заново. Считаются
+    только оплаченные платежи (status=paid).
+    Возвращает число строк итогов.
+    """
+    rows = (
+        Payment.objects
+        .filter(
+            status=Payment.Status.PAID,
+            payment_date__gte=_day_start(first_day),
+            payment_date__lt=_day_start(last_day + timedelta(days=1)),
+        )
+        .annotate(day=TruncDate("payment_date"))
+        .order_by()
+        .values("day", "paid_course_id", "paid_lesson_id", "payment_method")
+        .annotate(payments=Count("id"), total=Sum("amount"))
+    )
+    rollups = [
+        PaymentDailyRollup(
+            day=row["day"],
+            paid_course_id=row["paid_course_id"],
+            paid_lesson_id=row["paid_lesson_id"],
+            payment_method=row["payment_method"],
+            count=row["payments"],
+            amount=row["total"],
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        PaymentDailyRollup.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+        PaymentDailyRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def mark_rollup_days_stale(payment_dates) -> None:
+    """
+    Отмечает дни платежей, ставших оплаченными: платёж мог быть создан
+    задолго до оплаты, и его день уже за пределами того, что досчитывает
+    refresh_payment_rollups. Отметка ставится после коммита.
+    """
+    days = {timezone.localdate(payment_date).isoformat() for payment_date in payment_dates}
+    if not days:
+        return
+
+    def mark():
+        try:
+            get_redis().sadd(STALE_DAYS_KEY, *days)
+        except redis.RedisError:
+            logger.warning("Не удалось отметить устаревшие итоги платежей за %s", sorted(days), exc_info=True)
+
+    transaction.on_commit(mark)
+
+
+def _set_high_water_mark(value: datetime) -> None:
+    PaymentRollupState.objects.update_or_create(
+        name=ROLLUP_STATE_NAME, defaults={"high_water_mark": value}
+    )
+
+
+def refresh_payment_rollups(lookback: timedelta) -> dict:
+    """
+    Досчитывает итоги от отметки high_water_mark до текущего момента.
+
+    Пересчитываются только затронутые дни — от (отметка − lookback) до
+    сегодня; запас `lookback` подбирает платежи, чья транзакция
+    закоммитилась позже, чем была проставлена payment_date. Более ранние
+    дни с платежами, оплаченными позже, — по отметкам mark_rollup_days_stale.
+    Без отметки (первый запуск) считается вся история.
+    """
+    started = timezone.now()
+    try:
+        stale = get_redis().smembers(STALE_DAYS_KEY)
+    except redis.RedisError:
+        logger.warning("Не удалось прочитать устаревшие дни итогов платежей", exc_info=True)
+        stale = set()
+    with transaction.atomic():
+        # блокировка строки состояния: параллельные запуски идут по очереди
+        state = PaymentRollupState.objects.select_for_update().filter(name=ROLLUP_STATE_NAME).first()
+        if state is not None:
+            since = state.high_water_mark - lookback
+        else:
+            since = Payment.objects.aggregate(first=Min("payment_date"))["first"] or started
+
+        first_day = timezone.localdate(since)
+        last_day = timezone.localdate(started)
+        rows = recompute_days(first_day, last_day)
+        stale_days = sorted(
+            day for day in (date.fromisoformat(value.decode()) for value in stale) if day < first_day
+        )
+        for day in stale_days:
+            rows += recompute_days(day, day)
+        _set_high_water_mark(started)
+
+    if stale:
+        # отметки, поставленные во время пересчёта, остаются до следующего запуска
+        try:
+            get_redis().srem(STALE_DAYS_KEY, *stale)
+        except redis.RedisError:
+            logger.warning("Не удалось снять отметки устаревших итогов платежей", exc_info=True)
+    logger.info(
+        "Итоги платежей пересчитаны за %s — %s и ещё %s дн.: %s строк", first_day, last_day, len(stale_days), rows
+    )
+    return {"from": first_day.isoformat(), "to": last_day.isoformat(), "stale_days": len(stale_days), "rows": rows}
+
+
+def backfill_payment_rollups(since: date | None = None, chunk_days: int = 31, progress=None) -> int:
+    """
+    Пересчитывает итоги за всю историю (или начиная с `since`) кусками
+    по `chunk_days` дней, каждый — в своей транзакции. После прогона
+    отметка ставится на момент старта: платежи, пришедшие во время
+    прогона, досчитает refresh_payment_rollups.
+    """
+    started = timezone.now()
+    if since is None:
+        first = Payment.objects.aggregate(first=Min("payment_date"))["first"]
+        since = timezone.localdate(first) if first else timezone.localdate(started)
+    last_day = timezone.localdate(started)
+
+    total = 0
+    day = since
+    while day <= last_day:
+        chunk_end = min(day + timedelta(days=chunk_days - 1), last_day)
+        total += recompute_days(day, chunk_end)
+        if progress:
+            progress(day, chunk_end, total)
+        day = chunk_end + timedelta(days=1)
+
+    _set_high_water_mark(started)
+    return total
+
+
+def _group(queryset, fields: dict, ordering=None) -> list[dict]:
+    """
+    Суммы по полям `fields` ({имя в ответе: поле модели}).
+    """
+    rows = (
+        queryset
+        .values(*fields.values())
+        .annotate(payments=Sum("count"), total=Sum("amount"))
+        .order_by(*(ordering or fields.values()))
+    )
+    return [
+        {
+            **{name: row[field] for name, field in fields.items()},
+            "count": row["payments"],
+            "amount": str(row["total"]),
+        }
+        for row in rows
+    ]
+
+
+def payment_stats(date_from: date | None = None, date_to: date | None = None) -> dict:
+    """
+    Итоги оплаченных платежей за период по таблице PaymentDailyRollup.
+    """
+    rollups = PaymentDailyRollup.objects.all()
+    if date_from:
+        rollups = rollups.filter(day__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(day__lte=date_to)
+
+    total = rollups.aggregate(payments=Sum("count"), total=Sum("amount"))
+    state = PaymentRollupState.objects.filter(name=ROLLUP_STATE_NAME).first()
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "updated_at": state.high_water_mark if state else None,
+        "count": total["payments"] or 0,
+        "amount": str(total["total"] or Decimal("0.00")),
+        "by_day": _group(rollups, {"day": "day"}),
+        "by_method": _group(rollups, {"payment_method": "payment_method"}),
+        "by_course": _group(
+            rollups.filter(paid_course__isnull=False),
+            {"course": "paid_course_id", "title": "paid_course__title"},
+            ordering=["-total", "paid_course_id"],
+        ),
+        "by_lesson": _group(
+            rollups.filter(paid_lesson__isnull=False),
+            {"lesson": "paid_lesson_id", "title": "paid_lesson__title"},
+            ordering=["-total", "paid_lesson_id"],
+        ),
+    }
@@ -1,11 +1,176 @@
+import random
+import time
+import uuid
 from decimal import Decimal
 
+import requests
 import stripe
 from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
 
+from config.metrics import Histogram
+from .circuit_breaker import Bulkhead, CircuitBreaker
 
-def _set_api_key() -> None:
-    stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe_request_duration = Histogram(
+    "stripe_request_duration_seconds",
+    "Длительность вызовов Stripe API (с учётом повторов)",
+    labelnames=("operation", "outcome"),
+)
+
+# Ошибки, после которых запрос можно повторить с тем же idempotency key
+RETRYABLE_ERRORS = (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError)
+
+
+class StripeClient:
+    """
+    Клиент Stripe на процесс.
+
+    - один пул keep-alive соединений (requests.Session) на все вызовы;
+    - свой таймаут на каждую операцию (STRIPE_TIMEOUTS);
+    - до STRIPE_MAX_RETRIES повторов временных ошибок с экспоненциальной
+      задержкой и jitter, все попытки — с одним idempotency key;
+    - длительность каждой операции пишется в гистограмму
+      stripe_request_duration_seconds.
+
+    Подменяется через STRIPE_CLIENT_CLASS или set_stripe_client()
+    (см. users/services/stripe_fake.py).
+    """
+
+    def __init__(self, api_key=None, timeouts=None, max_retries=None, backoff=None, pool_size=None):
+        self.api_key = api_key or settings.STRIPE_SECRET_KEY
+        self.timeouts = timeouts or settings.STRIPE_TIMEOUTS
+        self.max_retries = settings.STRIPE_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.STRIPE_RETRY_BACKOFF if backoff is None else backoff
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=pool_size or settings.STRIPE_POOL_SIZE)
+        self._session.mount("https://", adapter)
+        self._clients = {}
+
+    def _client(self, operation: str) -> stripe.StripeClient:
+        timeout = self.timeouts[operation]
+        if timeout not in self._clients:
+            # Клиенты с разными таймаутами делят один пул соединений
+            self._clients[timeout] = stripe.StripeClient(
+                self.api_key,
+                http_client=stripe.RequestsClient(timeout=timeout, session=self._session),
+                max_network_retries=0,
+            )
+        return self._clients[timeout]
+
+    def _retry_delay(self, attempt: int) -> float:
+        # «full jitter»: равномерно от 0 до base * 2^attempt
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    @staticmethod
+    def _is_retryable(exc: stripe.StripeError) -> bool:
+        if isinstance(exc, stripe.APIError):
+            return exc.http_status is None or exc.http_status >= 500
+        return isinstance(exc, RETRYABLE_ERRORS)
+
+    def call(self, operation: str, method, params: dict):
+        options = {"idempotency_key": f"lms-{operation}-{uuid.uuid4()}"}
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                result = method(params, options)
+            except stripe.StripeError as exc:
+                if attempt < self.max_retries and self._is_retryable(exc):
+                    time.sleep(self._retry_delay(attempt))
+                    attempt += 1
+                    continue
+                stripe_request_duration.observe(
+                    time.perf_counter() - started, operation=operation, outcome="error"
+                )
+                raise
+            stripe_request_duration.observe(
+                time.perf_counter() - started, operation=operation, outcome="ok"
+            )
+            return result
+
+    def create_product(self, name: str, description: str = "") -> stripe.Product:
+        params = {"name": name}
+        if description:
+            params["description"] = description
+        return self.call("product", self._client("product").v1.products.create, params)
+
+    def create_price(self, product_id: str, unit_amount: int, currency: str) -> stripe.Price:
+        return self.call("price", self._client("price").v1.prices.create, {
+            "product": product_id,
+            "unit_amount": unit_amount,
+            "currency": currency,
+        })
+
+    def create_checkout_session(self, price_id: str) -> stripe.checkout.Session:
+        return self.call("session", self._client("session").v1.checkout.sessions.create, {
+            "mode": "payment",
+            "success_url": settings.STRIPE_SUCCESS_URL,
+            "cancel_url": settings.STRIPE_CANCEL_URL,
+            "line_items": [{"price": price_id, "quantity": 1}],
+        })
+
+    def list_checkout_sessions(self, created_gte: int, starting_after: str | None = None, limit: int = 100):
+        params = {"limit": limit, "created": {"gte": created_gte}}
+        if starting_after:
+            params["starting_after"] = starting_after
+        return self.call("list", self._client("list").v1.checkout.sessions.list, params)
+
+
+_client = None
+
+
+def _is_stripe_outage(exc: Exception) -> bool:
+    # Ошибки запроса (4xx) — не признак недоступности Stripe
+    return isinstance(exc, stripe.StripeError) and StripeClient._is_retryable(exc)
+
+
+stripe_breaker = CircuitBreaker("stripe", config="STRIPE_CIRCUIT_BREAKER", is_failure=_is_stripe_outage)
+stripe_bulkhead = Bulkhead("stripe", config="STRIPE_BULKHEAD")
+
+
+def get_stripe_client():
+    """
+    Клиент Stripe процесса (класс — из STRIPE_CLIENT_CLASS).
+    """
+    global _client
+    if _client is None:
+        _client = import_string(settings.STRIPE_CLIENT_CLASS)()
+    return _client
+
+
+def set_stripe_client(client):
+    """
+    Подменяет клиент процесса (например, на FakeStripeClient в тестах
+    и бенчмарках). Возвращает прежний клиент.
+    """
+    global _client
+    previous, _client = _client, client
+    return previous
+
+
+def _guarded(method, **kwargs):
+    """
+    Вызов клиента Stripe через bulkhead и circuit breaker: при деградации
+    Stripe сразу бросает ServiceUnavailable (503 с Retry-After).
+    """
+    with stripe_bulkhead.guard(), stripe_breaker.guard():
+        return method(**kwargs)
+
+
+def max_call_duration(*operations: str) -> float:
+    """
+    Худшее время (сек.) последовательных вызовов Stripe `operations`:
+    каждая попытка может ждать connect- и read-таймаут, между попытками —
+    максимальная пауза повтора, перед вызовом — слот bulkhead.
+    """
+    attempts = settings.STRIPE_MAX_RETRIES + 1
+    pauses = sum(settings.STRIPE_RETRY_BACKOFF * 2 ** attempt for attempt in range(settings.STRIPE_MAX_RETRIES))
+    return sum(
+        attempts * 2 * settings.STRIPE_TIMEOUTS[operation] + pauses + settings.STRIPE_BULKHEAD["wait"]
+        for operation in operations
+    )
 
 
 def _to_unit_amount(amount: Decimal) -> int:
@@ -19,17 +184,16 @@ def create_stripe_product(name: str, description: str = "") -> stripe.Product:
     """
     Создаёт продукт (Product) в Stripe.
     """
-    _set_api_key()
-    return stripe.Product.create(name=name, description=description)
+    return _guarded(get_stripe_client().create_product, name=name, description=description)
 
 
 def create_stripe_price(product_id: str, amount: Decimal, currency: str = "rub") -> stripe.Price:
     """
     Создаёт цену (Price) в Stripe для указанного продукта.
     """
-    _set_api_key()
-    return stripe.Price.create(
-        product=product_id,
+    return _guarded(
+        get_stripe_client().create_price,
+        product_id=product_id,
         unit_amount=_to_unit_amount(amount),
         currency=currency,
     )
@@ -39,10 +203,17 @@ def create_stripe_checkout_session(price_id: str) -> stripe.checkout.Session:
     """
     Создаёт Stripe Checkout Session и возвращает сессию оплаты.
     """
-    _set_api_key()
-    return stripe.checkout.Session.create(
-        mode="payment",
-        success_url=settings.STRIPE_SUCCESS_URL,
-        cancel_url=settings.STRIPE_CANCEL_URL,
-        line_items=[{"price": price_id, "quantity": 1}],
+    return _guarded(get_stripe_client().create_checkout_session, price_id=price_id)
+
+
+def list_stripe_checkout_sessions(created_gte: int, starting_after: str | None = None, limit: int = 100):
+    """
+    Страница Checkout Session, созданных не раньше `created_gte`
+    (от новых к старым, как отдаёт Stripe).
+    """
+    return _guarded(
+        get_stripe_client().list_checkout_sessions,
+        created_gte=created_gte,
+        starting_after=starting_after,
+        limit=limit,
     )
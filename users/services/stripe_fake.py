@@ -0,0 +1,120 @@
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+
+import stripe
+
+
+class FakeStripeClient:
+    """
+    Клиент Stripe в памяти процесса: тот же интерфейс, что у
+    users.services.stripe.StripeClient, но без сети.
+
+    Нужен для тестов, локальной разработки и бенчмарков
+    (STRIPE_CLIENT_CLASS=users.services.stripe_fake.FakeStripeClient).
+    Все вызовы записываются в `calls`.
+    """
+    checkout_url = "https://checkout.stripe.test/"
+
+    def __init__(self):
+        self.calls = []
+        self.products = {}
+        self.prices = {}
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _next_id(self, prefix: str) -> str:
+        with self._lock:
+            return f"{prefix}_test_{next(self._ids)}"
+
+    def create_product(self, name: str, description: str = ""):
+        self.calls.append(("product", name))
+        product_id = self._next_id("prod")
+        self.products[product_id] = stripe.Product.construct_from(
+            {"id": product_id, "object": "product", "name": name, "description": description or None},
+            "sk_test",
+        )
+        return self.products[product_id]
+
+    def create_price(self, product_id: str, unit_amount: int, currency: str):
+        self.calls.append(("price", product_id, unit_amount, currency))
+        price_id = self._next_id("price")
+        self.prices[price_id] = stripe.Price.construct_from(
+            {
+                "id": price_id,
+                "object": "price",
+                "product": product_id,
+                "unit_amount": unit_amount,
+                "currency": currency,
+            },
+            "sk_test",
+        )
+        return self.prices[price_id]
+
+    def create_checkout_session(self, price_id: str):
+        self.calls.append(("session", price_id))
+        session_id = self._next_id("cs")
+        self.sessions[session_id] = stripe.checkout.Session.construct_from(
+            {
+                "id": session_id,
+                "object": "checkout.session",
+                "url": f"{self.checkout_url}{session_id}",
+                "created": int(time.time()),
+                "status": "open",
+                "payment_status": "unpaid",
+                "line_items": {"data": [{"price": {"id": price_id}, "quantity": 1}]},
+            },
+            "sk_test",
+        )
+        return self.sessions[session_id]
+
+    def list_checkout_sessions(self, created_gte: int, starting_after: str | None = None, limit: int = 100):
+        self.calls.append(("list", starting_after))
+        # как в Stripe: от новых к старым, курсор — id последней сессии страницы
+        sessions = [s for s in reversed(self.sessions.values()) if s["created"] >= created_gte]
+        if starting_after:
+            ids = [s.id for s in sessions]
+            sessions = sessions[ids.index(starting_after) + 1:]
+        return stripe.StripeObject.construct_from(
+            {"object": "list", "data": sessions[:limit], "has_more": len(sessions) > limit},
+            "sk_test",
+        )
+
+    def finish_session(self, session_id: str, status: str, payment_status: str = "unpaid") -> None:
+        """
+        Переводит сессию в итоговое состояние (complete / expired).
+        """
+        self.sessions[session_id]["status"] = status
+        self.sessions[session_id]["payment_status"] = payment_status
+
+
+def sign_webhook(payload: str, secret: str, timestamp: int | None = None) -> str:
+    """
+    Заголовок Stripe-Signature для тела `payload`, как его формирует Stripe.
+    """
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def webhook_event(event_id: str, event_type: str, session_id: str, payment_status: str = "paid") -> str:
+    """
+    Тело webhook-события Checkout Session (минимальный набор полей).
+    """
+    return json.dumps({
+        "id": event_id,
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "data": {
+            "object": {
+                "id": session_id,
+                "object": "checkout.session",
+                "payment_status": payment_status,
+            },
+        },
+    })
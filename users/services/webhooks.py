@@ -0,0 +1,151 @@
+import json
+import logging
+from collections import defaultdict
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users.models import Payment, StripeEvent
+from .rollups import mark_rollup_days_stale
+
+logger = logging.getLogger(__name__)
+
+S = Payment.Status
+
+# Тип события -> (новый статус, статусы, из которых переход допустим)
+PAYMENT_TRANSITIONS = {
+    "checkout.session.async_payment_succeeded": (S.PAID, {S.PENDING, S.OPEN, S.EXPIRED, S.FAILED}),
+    "checkout.session.async_payment_failed": (S.FAILED, {S.PENDING, S.OPEN}),
+    "checkout.session.expired": (S.EXPIRED, {S.PENDING, S.OPEN}),
+}
+
+CONSUMER_SCHEDULED_KEY = "users:stripe_events:scheduled"
+
+
+class InvalidWebhook(Exception):
+    pass
+
+
+def _transition(event: dict):
+    if event["type"] == "checkout.session.completed":
+        # для отложенных способов оплаты деньги придут позже (async_payment_*)
+        if event["data"]["object"].get("payment_status") != "paid":
+            return None
+        return S.PAID, {S.PENDING, S.OPEN, S.EXPIRED, S.FAILED}
+    return PAYMENT_TRANSITIONS.get(event["type"])
+
+
+def record_stripe_event(payload: bytes, signature: str) -> bool:
+    """
+    Проверяет подпись webhook и сохраняет событие.
+
+    Возвращает False, если событие с таким id уже было получено.
+    Сама обработка — в apply_stripe_events (Celery), чтобы Stripe
+    получил ответ сразу.
+
+    Без STRIPE_WEBHOOK_SECRET отклоняется любой webhook: подпись с пустым
+    ключом Stripe считает верной, и её мог бы подделать кто угодно.
+    """
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        logger.error("STRIPE_WEBHOOK_SECRET не задан: webhook Stripe отклонён")
+        raise InvalidWebhook("STRIPE_WEBHOOK_SECRET is not configured")
+    try:
+        body = payload.decode("utf-8")
+        stripe.WebhookSignature.verify_header(
+            body, signature, settings.STRIPE_WEBHOOK_SECRET, settings.STRIPE_WEBHOOK_TOLERANCE
+        )
+        event = json.loads(body)
+        event_id, event_type = event["id"], event["type"]
+    except (stripe.SignatureVerificationError, UnicodeError, ValueError, KeyError, TypeError) as exc:
+        raise InvalidWebhook(str(exc)) from exc
+
+    # Одна вставка без чтения: повтор (Stripe доставляет «at least once»)
+    # отбрасывается уникальным индексом на event_id
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {StripeEvent._meta.db_table} (event_id, type, payload, received_at)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (event_id) DO NOTHING
+            """,
+            [event_id, event_type, body, timezone.now()],
+        )
+        return cursor.rowcount == 1
+
+
+def schedule_stripe_events_consumer() -> None:
+    """
+    Ставит обработку событий в очередь не чаще раза в STRIPE_WEBHOOK_DELAY
+    секунд: пачка webhook за это время обработается одной задачей.
+    """
+    from users.tasks import process_stripe_events
+
+    delay = settings.STRIPE_WEBHOOK_DELAY
+    if cache.add(CONSUMER_SCHEDULED_KEY, 1, timeout=delay + 60):
+        transaction.on_commit(lambda: process_stripe_events.apply_async(countdown=delay))
+
+
+def apply_stripe_events(batch_size: int) -> dict:
+    """
+    Применяет необработанные события к платежам пачками по `batch_size`.
+
+    Пачка выбирается с `FOR UPDATE SKIP LOCKED`, поэтому несколько воркеров
+    разбирают очередь, не мешая друг другу. События одной сессии
+    применяются по порядку получения; недопустимые переходы (например,
+    `expired` после `paid`) пропускаются.
+    """
+    cache.delete(CONSUMER_SCHEDULED_KEY)
+    processed = updated = 0
+
+    while True:
+        with transaction.atomic():
+            events = list(
+                StripeEvent.objects
+                .filter(processed_at__isnull=True)
+                .order_by("id")
+                .select_for_update(skip_locked=True)
+                .only("id", "type", "payload")[:batch_size]
+            )
+            if not events:
+                break
+
+            by_session = defaultdict(list)
+            for event in events:
+                transition = _transition(event.payload)
+                if transition is not None:
+                    session_id = event.payload["data"]["object"]["id"]
+                    by_session[session_id].append(transition)
+
+            payments = (
+                Payment.objects
+                .filter(stripe_session_id__in=by_session)
+                .order_by()
+                .select_for_update()
+                .only("id", "status", "stripe_session_id", "payment_date")
+            )
+            changed = []
+            for payment in payments:
+                status = payment.status
+                for new_status, allowed in by_session[payment.stripe_session_id]:
+                    if status in allowed:
+                        status = new_status
+                if status != payment.status:
+                    payment.status = status
+                    changed.append(payment)
+
+            Payment.objects.bulk_update(changed, ["status"])
+            mark_rollup_days_stale(payment.payment_date for payment in changed if payment.status == S.PAID)
+            StripeEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                processed_at=timezone.now()
+            )
+
+        processed += len(events)
+        updated += len(changed)
+        logger.info("Обработано событий Stripe: %s, изменено платежей: %s", processed, updated)
+        if len(events) < batch_size:
+            break
+
+    return {"processed": processed, "updated": updated}
@@ -0,0 +1,70 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from config.thumbnails import generate_renditions_on_upload
+from .authentication import revoke_user_tokens
+from .models import User
+from .permissions import invalidate_moderator_cache
+
+generate_renditions_on_upload(User, 'avatar')
+
+# поля, которые попадают в claims токена (или запрещают его)
+TOKEN_FIELDS = ('email', 'is_staff', 'is_active')
+
+
+def _token_fields(instance) -> dict:
+    # поля могут быть отложены через only()/defer()
+    return {name: instance.__dict__[name] for name in TOKEN_FIELDS if name in instance.__dict__}
+
+
+@receiver(post_init, sender=User)
+def remember_token_fields(sender, instance, **kwargs):
+    instance._token_fields = _token_fields(instance)
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_claims_change(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Отзывает токены пользователя, если изменились поля из его claims
+    или он деактивирован: старый токен иначе действовал бы до истечения.
+    """
+    current = _token_fields(instance)
+    previous, instance._token_fields = instance._token_fields, current
+    if created or (update_fields is not None and not set(update_fields) & set(TOKEN_FIELDS)):
+        return
+    if any(previous.get(name, value) != value for name, value in current.items()):
+        revoke_user_tokens([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def reset_moderator_cache_on_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Сбрасывает кеш роли модератора при изменении групп пользователя.
+
+    reverse=False — изменяли user.groups, instance — пользователь;
+    reverse=True — изменяли group.user_set, затронутые пользователи в pk_set.
+    Роль записана и в выданных токенах — они отзываются.
+    """
+    if action in ('post_add', 'post_remove'):
+        user_ids = pk_set if reverse else [instance.pk]
+        invalidate_moderator_cache(user_ids)
+        revoke_user_tokens(user_ids)
+        if not reverse:
+            instance.__dict__.pop('_is_moderator', None)
+    elif action == 'pre_clear' and reverse:
+        # после clear() список пользователей группы уже не получить
+        user_ids = list(instance.user_set.values_list('pk', flat=True))
+        invalidate_moderator_cache(user_ids)
+        revoke_user_tokens(user_ids)
+    elif action == 'post_clear' and not reverse:
+        invalidate_moderator_cache([instance.pk])
+        revoke_user_tokens([instance.pk])
+        instance.__dict__.pop('_is_moderator', None)
+
+
+@receiver(pre_delete, sender=Group)
+def reset_moderator_cache_on_group_delete(sender, instance, **kwargs):
+    user_ids = list(instance.user_set.values_list('pk', flat=True))
+    invalidate_moderator_cache(user_ids)
+    revoke_user_tokens(user_ids)
@@ -1,25 +1,190 @@
+import logging
+import time
 from datetime import timedelta
 
+import stripe
 from celery import shared_task
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max, Min
 from django.utils import timezone
+from kombu.exceptions import OperationalError
 
+from .authentication import revoke_user_tokens
+from .models import Payment
+from .services.checkout import fail_stale_pending_payments as fail_stale_pending, start_checkout
+from .services.circuit_breaker import ServiceUnavailable
+from .services.reconciliation import reconcile_checkout_sessions as reconcile
+from .services.rollups import refresh_payment_rollups as refresh_rollups
+from .services.webhooks import apply_stripe_events
 
-@shared_task
-def deactivate_inactive_users(days: int = 30) -> int:
+logger = logging.getLogger(__name__)
+
+# Ошибки Stripe, после которых имеет смысл повторить попытку
+STRIPE_TRANSIENT_ERRORS = (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError)
+
+
+DEACTIVATE_LOCK_KEY = "users:deactivate_inactive_users:lock"
+DEACTIVATE_LOCK_TIMEOUT = 60 * 60
+
+
+@shared_task(bind=True)
+def deactivate_inactive_users(self, days: int = 30) -> int:
     """
     Деактивирует пользователей, которые не входили в систему
     более `days` дней.
     Возвращает количество деактивированных пользователей.
+
+    Пользователи обновляются диапазонами id по DEACTIVATE_USERS_BATCH_SIZE,
+    каждый диапазон — в своей короткой транзакции, с паузой
+    DEACTIVATE_USERS_BATCH_SLEEP между ними. Прогресс пишется в лог и в
+    состояние задачи (PROGRESS). Одновременно выполняется только один запуск.
+    """
+    token = self.request.id or "local"
+    if not cache.add(DEACTIVATE_LOCK_KEY, token, timeout=DEACTIVATE_LOCK_TIMEOUT):
+        logger.info("deactivate_inactive_users уже выполняется, запуск пропущен")
+        return 0
+
+    try:
+        User = get_user_model()
+        cutoff = timezone.now() - timedelta(days=days)
+
+        qs = (
+            User.objects
+            .filter(is_active=True, last_login__lt=cutoff)
+            .exclude(is_superuser=True)
+            .exclude(is_staff=True)
+        )
+        # границы берутся по частичному индексу user_active_last_login_idx
+        bounds = qs.aggregate(first=Min("id"), last=Max("id"))
+        if bounds["first"] is None:
+            return 0
+
+        batch_size = settings.DEACTIVATE_USERS_BATCH_SIZE
+        updated = 0
+        for start in range(bounds["first"], bounds["last"] + 1, batch_size):
+            end = start + batch_size
+            # RETURNING — ровно те, кого деактивировал UPDATE: пользователь,
+            # вошедший во время прогона, условию уже не отвечает
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {User._meta.db_table} SET is_active = FALSE
+                    WHERE id >= %s AND id < %s AND last_login < %s
+                      AND is_active AND NOT is_staff AND NOT is_superuser
+                    RETURNING id
+                    """,
+                    [start, end, cutoff],
+                )
+                user_ids = [row[0] for row in cursor.fetchall()]
+            updated += len(user_ids)
+            # UPDATE в обход ORM не вызывает сигналов: токены отзываются здесь
+            revoke_user_tokens(user_ids)
+
+            progress = {
+                "last_id": min(end - 1, bounds["last"]),
+                "max_id": bounds["last"],
+                "deactivated": updated,
+            }
+            logger.info("deactivate_inactive_users: %s", progress)
+            if self.request.id and not self.request.is_eager:
+                self.update_state(state="PROGRESS", meta=progress)
+            if end <= bounds["last"]:
+                time.sleep(settings.DEACTIVATE_USERS_BATCH_SLEEP)
+        return updated
+    finally:
+        if cache.get(DEACTIVATE_LOCK_KEY) == token:
+            cache.delete(DEACTIVATE_LOCK_KEY)
+
+
+@shared_task(bind=True, max_retries=5)
+def create_checkout_session(self, payment_id: int) -> dict:
     """
-    User = get_user_model()
-    cutoff = timezone.now() - timedelta(days=days)
+    Создаёт объекты Stripe для платежа в статусе pending
+    и заполняет payment_url / stripe_session_id.
 
-    qs = (
-        User.objects
-        .filter(is_active=True, last_login__lt=cutoff)
-        .exclude(is_superuser=True)
-        .exclude(is_staff=True)
+    Временные ошибки Stripe повторяются с экспоненциальной задержкой,
+    после исчерпания попыток (или при постоянной ошибке) платёж
+    переводится в failed.
+    """
+    payment = (
+        Payment.objects
+        .select_related("paid_course", "paid_lesson")
+        .filter(pk=payment_id, status=Payment.Status.PENDING)
+        .first()
     )
-    updated = qs.update(is_active=False)
-    return updated
+    if payment is None:
+        return {"id": payment_id, "status": "skipped"}
+
+    try:
+        start_checkout(payment)
+    except (*STRIPE_TRANSIENT_ERRORS, ServiceUnavailable) as exc:
+        if self.request.retries < self.max_retries:
+            # пока breaker открыт, повтор не раньше Retry-After
+            countdown = max(2 ** self.request.retries, getattr(exc, "wait", 0))
+            raise self.retry(exc=exc, countdown=countdown)
+        Payment.objects.filter(pk=payment_id).update(status=Payment.Status.FAILED)
+        raise
+    except stripe.StripeError:
+        Payment.objects.filter(pk=payment_id).update(status=Payment.Status.FAILED)
+        raise
+
+    return {"id": payment_id, "status": payment.status}
+
+
+def enqueue_checkout_session(payment_id: int) -> None:
+    """
+    Ставит create_checkout_session в очередь; если брокер недоступен,
+    платёж сразу переводится в failed, а не остаётся в pending.
+    """
+    try:
+        create_checkout_session.delay(payment_id)
+    except OperationalError:
+        logger.exception("Не удалось поставить создание сессии Stripe для платежа %s", payment_id)
+        Payment.objects.filter(pk=payment_id, status=Payment.Status.PENDING).update(status=Payment.Status.FAILED)
+
+
+@shared_task
+def fail_stale_pending_payments() -> int:
+    """
+    Периодически закрывает платежи, зависшие в pending дольше
+    PAYMENT_PENDING_TIMEOUT (потерянная задача создания сессии).
+    """
+    failed = fail_stale_pending(older_than=settings.PAYMENT_PENDING_TIMEOUT)
+    if failed:
+        logger.warning("Платежей, зависших в pending, переведено в failed: %s", failed)
+    return failed
+
+
+@shared_task
+def process_stripe_events() -> dict:
+    """
+    Применяет к платежам накопившиеся события webhook Stripe.
+
+    Ставится webhook-view (не чаще раза в STRIPE_WEBHOOK_DELAY секунд)
+    и раз в минуту Celery Beat — на случай потерянной задачи.
+    """
+    return apply_stripe_events(batch_size=settings.STRIPE_WEBHOOK_BATCH_SIZE)
+
+
+@shared_task
+def reconcile_checkout_sessions() -> dict:
+    """
+    Ночная сверка открытых платежей с Checkout Session в Stripe
+    (на случай потерянных webhook). Прерванная сверка продолжается
+    с сохранённого курсора.
+    """
+    return reconcile(
+        page_size=settings.STRIPE_RECONCILE_PAGE_SIZE,
+        chunk_size=settings.STRIPE_RECONCILE_CHUNK_SIZE,
+    )
+
+
+@shared_task
+def refresh_payment_rollups() -> dict:
+    """
+    Досчитывает дневные итоги платежей от последней отметки.
+    """
+    return refresh_rollups(lookback=settings.PAYMENT_ROLLUP_LOOKBACK)
@@ -1,3 +1,1309 @@
-from django.test import TestCase
+import csv
+import json
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import redis
+import stripe
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from kombu.exceptions import OperationalError
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.redis_client import get_redis
+from config.thumbnails import generate_image_renditions
+from materials.models import Course, Lesson
+from users.idempotency import IdempotentRequest
+from users.models import Payment, PaymentDailyRollup, PaymentRollupState, StripeEvent, StripePrice
+from users.permissions import MODERATOR_GROUP_NAME, is_moderator
+from users.serializers import PaymentSerializer
+from users.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, Bulkhead, ServiceUnavailable
+from users.services.reconciliation import RECONCILE_CHECKPOINT_KEY, reconcile_checkout_sessions
+from users.services.rollups import STALE_DAYS_KEY
+from users.services.stripe import (
+    StripeClient, create_stripe_checkout_session, max_call_duration, set_stripe_client, stripe_breaker,
+    stripe_request_duration,
+)
+from users.services.stripe_fake import FakeStripeClient, sign_webhook, webhook_event
+from users.services.webhooks import apply_stripe_events
+from users.tasks import (
+    DEACTIVATE_LOCK_KEY, create_checkout_session, deactivate_inactive_users, fail_stale_pending_payments,
+    process_stripe_events, refresh_payment_rollups,
+)
+
+User = get_user_model()
+
+
+class ModeratorRoleResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="role@test.com", password="12345")
+        self.group, _ = Group.objects.get_or_create(name=MODERATOR_GROUP_NAME)
+
+    def _fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_role_is_resolved_once_per_request_and_shared_between_requests(self):
+        user = self._fresh_user()
+        with self.assertNumQueries(1):
+            self.assertFalse(is_moderator(user))
+            self.assertFalse(is_moderator(user))
+
+        other_request_user = self._fresh_user()
+        with self.assertNumQueries(0):
+            self.assertFalse(is_moderator(other_request_user))
+
+    def test_cache_is_invalidated_when_user_groups_change(self):
+        self.assertFalse(is_moderator(self._fresh_user()))
+
+        self.user.groups.add(self.group)
+        self.assertTrue(is_moderator(self._fresh_user()))
+
+        self.user.groups.clear()
+        self.assertFalse(is_moderator(self._fresh_user()))
+
+    def test_cache_is_invalidated_when_group_members_change(self):
+        self.group.user_set.add(self.user)
+        self.assertTrue(is_moderator(self._fresh_user()))
+
+        self.group.user_set.remove(self.user)
+        self.assertFalse(is_moderator(self._fresh_user()))
+
+        self.group.user_set.add(self.user)
+        self.assertTrue(is_moderator(self._fresh_user()))
+
+        self.group.user_set.clear()
+        self.assertFalse(is_moderator(self._fresh_user()))
+
+    def test_cache_is_invalidated_when_group_is_deleted(self):
+        self.user.groups.add(self.group)
+        self.assertTrue(is_moderator(self._fresh_user()))
+
+        self.group.delete()
+        self.assertFalse(is_moderator(self._fresh_user()))
+
+
+class ClaimsJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="claims@test.com", password="12345")
+        self.group, _ = Group.objects.get_or_create(name=MODERATOR_GROUP_NAME)
+
+    def login(self, email="claims@test.com"):
+        resp = self.client.post(reverse("token_obtain_pair"), {"email": email, "password": "12345"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def get_courses(self, access):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("course-list"), HTTP_AUTHORIZATION=f"Bearer {access}")
+        return resp, " ".join(query["sql"] for query in ctx.captured_queries)
+
+    def test_request_user_is_built_from_claims(self):
+        Course.objects.create(title="Свой", owner=self.user)
+        Course.objects.create(title="Чужой")
+        tokens = self.login()
+
+        resp, sql = self.get_courses(tokens["access"])
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["title"] for item in resp.data["results"]], ["Свой"])
+        self.assertNotIn('"users_user"', sql)
+        self.assertNotIn('"auth_group"', sql)
+
+    def test_moderator_role_comes_from_token(self):
+        self.user.groups.add(self.group)
+        Course.objects.create(title="Чужой")
+        tokens = self.login()
+
+        resp, sql = self.get_courses(tokens["access"])
+
+        self.assertEqual(len(resp.data["results"]), 1)
+        self.assertNotIn('"auth_group"', sql)
+
+    def test_writes_use_user_id(self):
+        tokens = self.login()
+
+        resp = self.client.post(
+            reverse("course-list"), {"title": "Новый"}, HTTP_AUTHORIZATION=f"Bearer {tokens['access']}",
+        )
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Course.objects.get(pk=resp.data["id"]).owner, self.user)
+
+    def test_owner_can_retrieve_update_and_destroy(self):
+        course = Course.objects.create(title="Свой", owner=self.user)
+        lesson = Lesson.objects.create(
+            title="Урок", course=course, owner=self.user,
+            video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        )
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {self.login()['access']}"}
+        course_url = reverse("course-detail", args=[course.id])
+        lesson_url = reverse("lesson-detail", args=[lesson.id])
+
+        self.assertEqual(self.client.get(course_url, **auth).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(lesson_url, **auth).status_code, status.HTTP_200_OK)
+        resp = self.client.patch(course_url, {"title": "Обновлённый"}, **auth)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.patch(lesson_url, {"title": "Новый урок"}, **auth)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.delete(lesson_url, **auth).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.delete(course_url, **auth).status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertFalse(Course.objects.filter(pk=course.id).exists())
+
+    def test_non_owner_cannot_update(self):
+        course = Course.objects.create(title="Чужой")
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {self.login()['access']}"}
+
+        resp = self.client.patch(reverse("course-detail", args=[course.id]), {"title": "Мой"}, **auth)
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Course.objects.get(pk=course.id).title, "Чужой")
+
+    def test_deactivation_revokes_tokens(self):
+        tokens = self.login()
+        self.user.is_active = False
+        self.user.save()
+
+        resp, _ = self.get_courses(tokens["access"])
+        refresh = self.client.post(reverse("token_refresh"), {"refresh": tokens["refresh"]})
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(refresh.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_revokes_tokens_until_next_login(self):
+        tokens = self.login()
+        self.group.user_set.add(self.user)
+
+        resp, _ = self.get_courses(tokens["access"])
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        fresh = self.login()
+        self.assertTrue(AccessToken(fresh["access"])["is_moderator"])
+        resp, _ = self.get_courses(fresh["access"])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_unrelated_changes_keep_tokens(self):
+        tokens = self.login()
+        self.user.city = "Казань"
+        self.user.save()
+
+        resp, _ = self.get_courses(tokens["access"])
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    @mock.patch("users.tasks.time.sleep")
+    def test_deactivate_inactive_users_revokes_tokens(self, sleep):
+        tokens = self.login()
+        User.objects.filter(pk=self.user.pk).update(last_login=timezone.now() - timedelta(days=40))
+
+        deactivate_inactive_users.apply()
+
+        resp, _ = self.get_courses(tokens["access"])
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="payer@test.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+
+    def _walk(self, url):
+        ids = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", resp.data)
+            ids.extend(item["id"] for item in resp.data["results"])
+            url = resp.data["next"]
+        return ids
+
+    def test_payments_are_paginated_by_payment_date_desc(self):
+        Payment.objects.bulk_create([
+            Payment(user=self.user, amount=100 + i, payment_method=Payment.PaymentMethod.CASH)
+            for i in range(23)
+        ])
+        # часть платежей с одинаковой датой: порядок внутри задаёт id
+        same_date = Payment.objects.order_by("id").first().payment_date
+        Payment.objects.filter(id__in=Payment.objects.order_by("id").values("id")[:8]).update(
+            payment_date=same_date
+        )
+        expected = list(Payment.objects.order_by("-payment_date", "-id").values_list("id", flat=True))
+
+        ids = self._walk(reverse("payment-list") + "?page_size=5")
+
+        self.assertEqual(ids, expected)
+
+    def test_payments_ordering_choice_is_respected(self):
+        Payment.objects.bulk_create([
+            Payment(user=self.user, amount=100, payment_method=Payment.PaymentMethod.CASH)
+            for _ in range(6)
+        ])
+        expected = list(Payment.objects.order_by("payment_date", "id").values_list("id", flat=True))
+
+        ids = self._walk(reverse("payment-list") + "?ordering=payment_date&page_size=4")
+
+        self.assertEqual(ids, expected)
+
+    def test_payments_page_matches_serializer(self):
+        course = Course.objects.create(title="Курс", owner=self.user)
+        Payment.objects.create(user=self.user, paid_course=course, amount="99.90", payment_method="transfer")
+        Payment.objects.create(user=self.user, amount=5, payment_method="cash", payment_url="https://pay.test/1")
+
+        resp = self.client.get(reverse("payment-list"))
+
+        expected = PaymentSerializer(Payment.objects.order_by("-payment_date", "-id"), many=True).data
+        self.assertEqual(resp.json()["results"], expected)
+
+    def test_users_list_is_paginated(self):
+        User.objects.bulk_create([User(email=f"bulk{i}@test.com") for i in range(12)])
+
+        resp = self.client.get(reverse("user-list") + "?page_size=5")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data["results"]), 5)
+        self.assertIsNotNone(resp.data["next"])
+        self.assertEqual(
+            self._walk(reverse("user-list") + "?page_size=5"),
+            list(User.objects.order_by("id").values_list("id", flat=True)),
+        )
+
+
+def use_fake_stripe(test):
+    """Подменяет клиент Stripe на FakeStripeClient до конца теста."""
+    stripe_breaker.reset()
+    test.addCleanup(stripe_breaker.reset)
+    fake = FakeStripeClient()
+    test.addCleanup(set_stripe_client, set_stripe_client(fake))
+    return fake
+
+
+class StripeCatalogueTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="buyer@test.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(title="Платный курс", description="desc", owner=self.user)
+        self.stripe = use_fake_stripe(self)
+
+    def _buy(self, **data):
+        data.setdefault("payment_method", Payment.PaymentMethod.TRANSFER)
+        resp = self.client.post(reverse("payment-create"), data=data, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        return resp
+
+    def _kinds(self):
+        return [call[0] for call in self.stripe.calls]
+
+    def test_repeat_purchase_only_creates_session(self):
+        first = self._buy(paid_course=self.course.id, amount="1000.00")
+        self.stripe.calls.clear()
+
+        second = self._buy(paid_course=self.course.id, amount="1000.00")
+
+        self.assertEqual(self._kinds(), ["session"])
+        self.assertEqual(StripePrice.objects.count(), 1)
+        first_payment = Payment.objects.get(pk=first.data["id"])
+        second_payment = Payment.objects.get(pk=second.data["id"])
+        self.assertEqual(first_payment.stripe_price_id, second_payment.stripe_price_id)
+        self.assertNotEqual(first.data["stripe_session_id"], second.data["stripe_session_id"])
+
+    def test_catalogue_survives_cache_loss(self):
+        self._buy(paid_course=self.course.id, amount="1000.00")
+        cache.clear()
+        self.stripe.calls.clear()
+
+        self._buy(paid_course=self.course.id, amount="1000.00")
+
+        self.assertEqual(self._kinds(), ["session"])
+
+    def test_new_amount_reuses_product(self):
+        self._buy(paid_course=self.course.id, amount="1000.00")
+        self.stripe.calls.clear()
+
+        self._buy(paid_course=self.course.id, amount="500.00")
+
+        self.assertEqual(self._kinds(), ["price", "session"])
+        self.assertEqual(
+            StripePrice.objects.values("stripe_product_id").distinct().count(), 1
+        )
+
+    def test_title_change_invalidates_catalogue_entry(self):
+        self._buy(paid_course=self.course.id, amount="1000.00")
+        self.course.title = "Новое название"
+        self.course.save()
+        self.stripe.calls.clear()
+
+        self._buy(paid_course=self.course.id, amount="1000.00")
+
+        self.assertEqual(self._kinds(), ["product", "price", "session"])
+        self.assertEqual(self.stripe.calls[0], ("product", "Новое название"))
+        entry = StripePrice.objects.get(paid_course=self.course)
+        self.assertEqual(entry.product_name, "Новое название")
+
+    def test_lessons_have_separate_catalogue(self):
+        lesson = Lesson.objects.create(
+            course=self.course,
+            title="Платный урок",
+            video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+            owner=self.user,
+        )
+        self._buy(paid_course=self.course.id, amount="1000.00")
+        self.stripe.calls.clear()
+
+        self._buy(paid_lesson=lesson.id, amount="1000.00")
+
+        self.assertEqual(self._kinds(), ["product", "price", "session"])
+        self.assertEqual(StripePrice.objects.count(), 2)
+
+
+class AsyncCheckoutTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="async@test.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(title="Курс", owner=self.user)
+        self.stripe = use_fake_stripe(self)
+
+    def _create(self, delay_error=None, **headers):
+        with mock.patch("users.tasks.create_checkout_session.delay", side_effect=delay_error) as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(
+                    reverse("payment-create"),
+                    data={"paid_course": self.course.id, "amount": "990.00", "payment_method": "transfer"},
+                    format="json",
+                    **headers,
+                )
+        return resp, delay
+
+    @override_settings(PAYMENTS_ASYNC_CHECKOUT=True)
+    def test_async_mode_returns_202_without_calling_stripe(self):
+        resp, delay = self._create()
+
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(resp.data["status"], Payment.Status.PENDING)
+        self.assertEqual(resp["Location"], resp.data["status_url"])
+        self.assertIn("Retry-After", resp)
+        self.assertEqual(self.stripe.calls, [])
+        delay.assert_called_once_with(resp.data["id"])
+
+    def test_prefer_header_enables_async_mode(self):
+        resp, delay = self._create(HTTP_PREFER="respond-async")
+
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        delay.assert_called_once()
+
+    @override_settings(PAYMENT_STATUS_RETRY_AFTER=2)
+    def test_task_fills_payment_and_status_endpoint_returns_url(self):
+        resp, _ = self._create(HTTP_PREFER="respond-async")
+        status_url = reverse("payment-status", args=[resp.data["id"]])
+
+        pending = self.client.get(status_url)
+        self.assertEqual(pending.data["status"], Payment.Status.PENDING)
+        self.assertIsNone(pending.data["payment_url"])
+        self.assertEqual(pending["Retry-After"], "2")
+
+        create_checkout_session.apply(args=(resp.data["id"],))
+
+        ready = self.client.get(status_url)
+        self.assertEqual(ready.status_code, status.HTTP_200_OK)
+        self.assertEqual(ready.data["status"], Payment.Status.OPEN)
+        self.assertTrue(ready.data["payment_url"].startswith("https://checkout.stripe.test/"))
+        self.assertNotIn("Retry-After", ready)
+
+    def test_task_is_idempotent(self):
+        resp, _ = self._create(HTTP_PREFER="respond-async")
+
+        create_checkout_session.apply(args=(resp.data["id"],))
+        create_checkout_session.apply(args=(resp.data["id"],))
+
+        self.assertEqual([c[0] for c in self.stripe.calls].count("session"), 1)
+
+    def test_permanent_stripe_error_marks_payment_failed(self):
+        resp, _ = self._create(HTTP_PREFER="respond-async")
+
+        with mock.patch(
+            "users.services.checkout.create_stripe_checkout_session",
+            side_effect=stripe.InvalidRequestError("bad price", param="price"),
+        ):
+            create_checkout_session.apply(args=(resp.data["id"],))
+
+        self.assertEqual(Payment.objects.get(pk=resp.data["id"]).status, Payment.Status.FAILED)
+
+    def test_broker_failure_marks_payment_failed(self):
+        with self.assertLogs("users.tasks", "ERROR"):
+            resp, _ = self._create(delay_error=OperationalError("broker down"), HTTP_PREFER="respond-async")
+
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        payment = self.client.get(reverse("payment-status", args=[resp.data["id"]]))
+        self.assertEqual(payment.data["status"], Payment.Status.FAILED)
+        self.assertNotIn("Retry-After", payment)
+
+    @override_settings(PAYMENT_PENDING_TIMEOUT=timedelta(minutes=30))
+    def test_stale_pending_payments_are_failed(self):
+        stale, _ = self._create(HTTP_PREFER="respond-async")
+        fresh, _ = self._create(HTTP_PREFER="respond-async")
+        Payment.objects.filter(pk=stale.data["id"]).update(payment_date=timezone.now() - timedelta(hours=1))
+
+        with self.assertLogs("users.tasks", "WARNING"):
+            failed = fail_stale_pending_payments.apply().get()
+
+        self.assertEqual(failed, 1)
+        self.assertEqual(Payment.objects.get(pk=stale.data["id"]).status, Payment.Status.FAILED)
+        self.assertEqual(Payment.objects.get(pk=fresh.data["id"]).status, Payment.Status.PENDING)
+
+    def test_status_is_visible_only_to_owner(self):
+        resp, _ = self._create(HTTP_PREFER="respond-async")
+        other = User.objects.create_user(email="stranger@test.com", password="12345")
+        self.client.force_authenticate(user=other)
+
+        denied = self.client.get(reverse("payment-status", args=[resp.data["id"]]))
+
+        self.assertEqual(denied.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sync_mode_is_unchanged(self):
+        resp, delay = self._create()
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        delay.assert_not_called()
+        self.assertEqual(Payment.objects.get(pk=resp.data["id"]).status, Payment.Status.OPEN)
+
+
+@override_settings(STRIPE_SECRET_KEY="sk_test_123")
+class StripeClientTests(TestCase):
+    def setUp(self):
+        self.client = StripeClient(
+            timeouts={"product": 3, "price": 3, "session": 7}, max_retries=2, backoff=0.01
+        )
+        sleep = mock.patch("users.services.stripe.time.sleep")
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_transient_errors_are_retried_with_same_idempotency_key(self):
+        method = mock.Mock(side_effect=[
+            stripe.APIConnectionError("reset"),
+            stripe.RateLimitError("slow down"),
+            {"id": "cs_1"},
+        ])
+
+        with mock.patch.object(stripe_request_duration, "observe") as observe:
+            result = self.client.call("session", method, {"mode": "payment"})
+
+        self.assertEqual(result, {"id": "cs_1"})
+        keys = {call.args[1]["idempotency_key"] for call in method.call_args_list}
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(self.sleep.call_count, 2)
+        observe.assert_called_once_with(mock.ANY, operation="session", outcome="ok")
+
+    def test_retries_are_bounded(self):
+        method = mock.Mock(side_effect=stripe.APIConnectionError("down"))
+
+        with self.assertRaises(stripe.APIConnectionError):
+            self.client.call("price", method, {})
+
+        self.assertEqual(method.call_count, 3)
+
+    def test_permanent_errors_are_not_retried(self):
+        for error in (
+            stripe.InvalidRequestError("bad price", param="price"),
+            stripe.APIError("conflict", http_status=409),
+        ):
+            method = mock.Mock(side_effect=error)
+            with self.assertRaises(stripe.StripeError):
+                self.client.call("price", method, {})
+            method.assert_called_once()
+
+    def test_operations_share_connection_pool_and_keep_own_timeout(self):
+        with mock.patch("users.services.stripe.stripe.RequestsClient") as http_client:
+            product = self.client._client("product")
+            self.assertIs(self.client._client("price"), product)
+            self.client._client("session")
+
+        timeouts = [call.kwargs["timeout"] for call in http_client.call_args_list]
+        sessions = {id(call.kwargs["session"]) for call in http_client.call_args_list}
+        self.assertEqual(timeouts, [3, 7])
+        self.assertEqual(sessions, {id(self.client._session)})
+
+    @override_settings(STRIPE_CLIENT_CLASS="users.services.stripe_fake.FakeStripeClient")
+    def test_client_class_comes_from_settings(self):
+        from users.services.stripe import get_stripe_client
+
+        self.addCleanup(set_stripe_client, set_stripe_client(None))
+
+        session = create_stripe_checkout_session("price_1")
+
+        self.assertIsInstance(get_stripe_client(), FakeStripeClient)
+        self.assertTrue(session.url.startswith(FakeStripeClient.checkout_url))
+
+
+@override_settings(
+    STRIPE_CIRCUIT_BREAKER={
+        "failure_ratio": 0.5, "min_calls": 4, "window": 60, "slow_call": 5, "reset_timeout": 30,
+    },
+    STRIPE_BULKHEAD={"max_concurrent": 1, "wait": 0},
+)
+class StripeCircuitBreakerTests(APITestCase):
+    def setUp(self):
+        self.stripe = use_fake_stripe(self)
+        self.user = User.objects.create_user(email="cb@test.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(title="Курс", owner=self.user)
+
+    def _fail(self, times):
+        down = mock.patch.object(
+            self.stripe, "create_checkout_session", side_effect=stripe.APIConnectionError("down")
+        )
+        with down:
+            for _ in range(times):
+                with self.assertRaises(stripe.APIConnectionError):
+                    create_stripe_checkout_session("price_1")
+
+    def _buy(self):
+        return self.client.post(
+            reverse("payment-create"),
+            data={"paid_course": self.course.id, "amount": "990.00", "payment_method": "transfer"},
+            format="json",
+        )
+
+    def test_opens_after_failure_ratio_and_fails_fast(self):
+        create_stripe_checkout_session("price_1")
+        self._fail(3)
+        self.assertEqual(stripe_breaker.state(), OPEN)
+        self.stripe.calls.clear()
+
+        resp = self._buy()
+
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertTrue(0 < int(resp["Retry-After"]) <= 30)
+        self.assertNotIn("session", [call[0] for call in self.stripe.calls])
+        self.assertEqual(Payment.objects.get().status, Payment.Status.FAILED)
+
+    def test_client_errors_do_not_open_circuit(self):
+        with mock.patch.object(
+            self.stripe, "create_checkout_session",
+            side_effect=stripe.InvalidRequestError("bad price", param="price"),
+        ):
+            for _ in range(5):
+                with self.assertRaises(stripe.InvalidRequestError):
+                    create_stripe_checkout_session("price_1")
+
+        self.assertEqual(stripe_breaker.state(), CLOSED)
+
+    def test_slow_calls_count_as_failures(self):
+        with override_settings(STRIPE_CIRCUIT_BREAKER={
+            "failure_ratio": 0.5, "min_calls": 4, "window": 60, "slow_call": 0, "reset_timeout": 30,
+        }):
+            for _ in range(4):
+                create_stripe_checkout_session("price_1")
+
+        self.assertEqual(stripe_breaker.state(), OPEN)
+
+    def test_half_open_probe_closes_or_reopens(self):
+        stripe_breaker.trip()
+        get_redis().delete("circuit:stripe:open")
+        self.assertEqual(stripe_breaker.state(), HALF_OPEN)
+
+        self._fail(1)
+        self.assertEqual(stripe_breaker.state(), OPEN)
+
+        get_redis().delete("circuit:stripe:open")
+        create_stripe_checkout_session("price_1")
+        self.assertEqual(stripe_breaker.state(), CLOSED)
+
+    def test_half_open_lets_through_single_probe(self):
+        stripe_breaker.trip()
+        get_redis().delete("circuit:stripe:open")
+
+        with stripe_breaker.guard():
+            with self.assertRaises(ServiceUnavailable):
+                create_stripe_checkout_session("price_1")
+
+    def test_bulkhead_rejects_calls_over_limit(self):
+        bulkhead = Bulkhead("test", config="STRIPE_BULKHEAD")
+
+        with bulkhead.guard():
+            with self.assertRaises(ServiceUnavailable):
+                with bulkhead.guard():
+                    pass
+
+        with bulkhead.guard():
+            pass
+
+    def test_task_retries_while_circuit_is_open(self):
+        payment = Payment.objects.create(
+            user=self.user, paid_course=self.course, amount="990.00", payment_method="transfer"
+        )
+        stripe_breaker.trip()
+
+        with mock.patch.object(create_checkout_session, "retry", side_effect=RuntimeError) as retry:
+            with self.assertRaises(RuntimeError):
+                create_checkout_session.run(payment.id)
+
+        self.assertGreaterEqual(retry.call_args.kwargs["countdown"], 29)
+        self.assertEqual(Payment.objects.get().status, Payment.Status.PENDING)
+
+
+class PaymentIdempotencyTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.stripe = use_fake_stripe(self)
+        self.user = User.objects.create_user(email="idem@test.com", password="12345")
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(title="Курс", owner=self.user)
+        self.data = {"paid_course": self.course.id, "amount": "990.00", "payment_method": "transfer"}
+
+    def _create(self, key="key-1", data=None, **headers):
+        return self.client.post(
+            reverse("payment-create"), data=data or self.data, format="json",
+            HTTP_IDEMPOTENCY_KEY=key, **headers,
+        )
+
+    def test_retry_returns_first_response_without_new_payment(self):
+        first = self._create()
+        calls = len(self.stripe.calls)
+
+        with self.assertNumQueries(0):
+            retry = self._create()
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(len(self.stripe.calls), calls)
+
+    @override_settings(
+        STRIPE_TIMEOUTS={"product": 10, "price": 10, "session": 15}, STRIPE_MAX_RETRIES=2,
+        STRIPE_RETRY_BACKOFF=0.5, STRIPE_BULKHEAD={"max_concurrent": 4, "wait": 0.5},
+    )
+    def test_in_flight_marker_outlives_stripe_calls(self):
+        # 3 попытки × (connect + read) на вызов, паузы 0.5 + 1, ожидание bulkhead
+        self.assertEqual(max_call_duration("product", "price", "session"), 3 * 2 * 35 + 3 * 1.5 + 3 * 0.5)
+
+        with mock.patch("users.idempotency.cache.add", wraps=cache.add) as add:
+            self._create()
+
+        self.assertGreater(add.call_args.kwargs["timeout"], max_call_duration("product", "price", "session"))
+
+    def test_async_response_is_replayed_with_location(self):
+        with mock.patch("users.tasks.create_checkout_session.delay"):
+            first = self._create(HTTP_PREFER="respond-async")
+            retry = self._create(HTTP_PREFER="respond-async")
+
+        self.assertEqual(retry.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(retry["Location"], first["Location"])
+
+    def test_keys_are_scoped_per_user(self):
+        self._create()
+        other = User.objects.create_user(email="other@test.com", password="12345")
+        self.client.force_authenticate(user=other)
+
+        self._create()
+
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_same_key_with_other_body_is_rejected(self):
+        self._create()
+
+        resp = self._create(data={**self.data, "amount": "1.00"})
+
+        self.assertEqual(resp.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_failed_request_is_not_stored(self):
+        invalid = self._create(data={"amount": "990.00", "payment_method": "transfer"})
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self._create(data={"amount": "990.00", "payment_method": "transfer"})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn("Idempotent-Replayed", resp)
+
+    @override_settings(IDEMPOTENCY_WAIT=0)
+    def test_duplicate_of_in_flight_request_gets_conflict(self):
+        IdempotentRequest("PaymentCreateAPIView", self.user.pk, "key-1", self.data).begin(wait=0)
+
+        resp = self._create()
+
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Payment.objects.count(), 0)
+
+    def test_duplicate_waits_for_in_flight_request(self):
+        in_flight = IdempotentRequest("PaymentCreateAPIView", self.user.pk, "key-1", self.data)
+        in_flight.begin(wait=0)
+        done = Response({"id": 42, "payment_url": "https://checkout.stripe.test/cs_1"}, status=201)
+        timer = threading.Timer(0.3, in_flight.complete, args=(done,))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        resp = self._create()
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data["id"], 42)
+        self.assertEqual(Payment.objects.count(), 0)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class StripeWebhookTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="hook@test.com", password="12345")
+        self.course = Course.objects.create(title="Курс", owner=self.user)
+        self.payment = Payment.objects.create(
+            user=self.user, paid_course=self.course, amount="990.00", payment_method="transfer",
+            stripe_session_id="cs_1", status=Payment.Status.OPEN,
+        )
+        self.n = 0
+
+    def _send(self, event_type, session_id="cs_1", event_id=None, secret="whsec_test", **extra):
+        self.n += 1
+        body = webhook_event(event_id or f"evt_{self.n}", event_type, session_id, **extra)
+        with mock.patch("users.tasks.process_stripe_events.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(
+                    reverse("stripe-webhook"), data=body, content_type="application/json",
+                    HTTP_STRIPE_SIGNATURE=sign_webhook(body, secret),
+                )
+        return resp, apply_async
+
+    def _status(self):
+        self.payment.refresh_from_db()
+        return self.payment.status
+
+    def test_event_is_stored_and_acknowledged(self):
+        resp, apply_async = self._send("checkout.session.completed")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.type, "checkout.session.completed")
+        self.assertEqual(event.payload["data"]["object"]["id"], "cs_1")
+        self.assertIsNone(event.processed_at)
+        apply_async.assert_called_once()
+        self.assertEqual(self._status(), Payment.Status.OPEN)
+
+    def test_invalid_signature_is_rejected(self):
+        resp, _ = self._send("checkout.session.completed", secret="whsec_other")
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    @override_settings(STRIPE_WEBHOOK_SECRET="")
+    def test_everything_is_rejected_without_secret(self):
+        # с пустым ключом verify_header принял бы подпись, сделанную тем же пустым ключом
+        with self.assertLogs("users.services.webhooks", "ERROR"):
+            resp, apply_async = self._send("checkout.session.completed", secret="")
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+        apply_async.assert_not_called()
+
+    def test_duplicate_delivery_is_ignored(self):
+        self._send("checkout.session.completed", event_id="evt_same")
+        resp, apply_async = self._send("checkout.session.completed", event_id="evt_same")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        apply_async.assert_not_called()
+
+    def test_consumer_is_scheduled_once_per_burst(self):
+        _, first = self._send("checkout.session.completed")
+        _, second = self._send("checkout.session.expired")
+
+        first.assert_called_once()
+        second.assert_not_called()
+
+    def test_consumer_applies_transitions_in_order(self):
+        other = Payment.objects.create(
+            user=self.user, paid_course=self.course, amount="10.00", payment_method="transfer",
+            stripe_session_id="cs_2", status=Payment.Status.OPEN,
+        )
+        self._send("checkout.session.completed")
+        self._send("checkout.session.expired")
+        self._send("checkout.session.expired", session_id="cs_2")
+        self._send("checkout.session.completed", session_id="cs_unknown")
+
+        result = process_stripe_events.apply().get()
+
+        self.assertEqual(result, {"processed": 4, "updated": 2})
+        self.assertEqual(self._status(), Payment.Status.PAID)
+        other.refresh_from_db()
+        self.assertEqual(other.status, Payment.Status.EXPIRED)
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_delayed_payment_is_paid_after_async_success(self):
+        self._send("checkout.session.completed", payment_status="unpaid")
+        process_stripe_events.apply()
+        self.assertEqual(self._status(), Payment.Status.OPEN)
+
+        self._send("checkout.session.async_payment_succeeded")
+        process_stripe_events.apply()
+        self.assertEqual(self._status(), Payment.Status.PAID)
+
+    @override_settings(STRIPE_WEBHOOK_BATCH_SIZE=2)
+    def test_consumer_processes_backlog_in_batches(self):
+        for _ in range(5):
+            self._send("checkout.session.completed")
+
+        with CaptureQueriesContext(connection) as queries:
+            result = process_stripe_events.apply().get()
+
+        self.assertEqual(result, {"processed": 5, "updated": 1})
+        batches = [q for q in queries.captured_queries if "SKIP LOCKED" in q["sql"]]
+        self.assertEqual(len(batches), 3)
+
+
+class CheckoutReconciliationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stripe = use_fake_stripe(self)
+        self.user = User.objects.create_user(email="recon@test.com", password="12345")
+        self.payments = {}
+        for name in ("paid", "expired", "open", "webhook_paid", "no_session"):
+            session = self.stripe.create_checkout_session(f"price_{name}")
+            self.payments[name] = Payment.objects.create(
+                user=self.user, amount="100.00", payment_method="transfer",
+                stripe_session_id=None if name == "no_session" else session.id,
+                status=Payment.Status.PAID if name == "webhook_paid" else Payment.Status.OPEN,
+            )
+        self.stripe.finish_session(self.payments["paid"].stripe_session_id, "complete", "paid")
+        self.stripe.finish_session(self.payments["expired"].stripe_session_id, "expired")
+        self.stripe.finish_session(self.payments["webhook_paid"].stripe_session_id, "expired")
+        self.stripe.calls.clear()
+
+    def _statuses(self):
+        return {name: Payment.objects.get(pk=p.pk).status for name, p in self.payments.items()}
+
+    def test_final_session_states_are_applied(self):
+        result = reconcile_checkout_sessions(page_size=2, chunk_size=500)
+
+        self.assertEqual(self._statuses(), {
+            "paid": Payment.Status.PAID,
+            "expired": Payment.Status.EXPIRED,
+            "open": Payment.Status.OPEN,
+            "webhook_paid": Payment.Status.PAID,
+            "no_session": Payment.Status.OPEN,
+        })
+        self.assertEqual(result["sessions"], 5)
+        self.assertEqual(result["updated"], 2)
+        self.assertIn("sessions_per_second", result)
+        # 5 сессий страницами по 2 — три вызова списка, а не вызов на платёж
+        self.assertEqual([call[0] for call in self.stripe.calls], ["list"] * 3)
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        list_sessions = self.stripe.list_checkout_sessions
+        pages = []
+
+        def flaky(**kwargs):
+            if len(pages) == 2:
+                raise stripe.APIConnectionError("down")
+            pages.append(kwargs["starting_after"])
+            return list_sessions(**kwargs)
+
+        with mock.patch.object(self.stripe, "list_checkout_sessions", side_effect=flaky):
+            with self.assertRaises(stripe.APIConnectionError):
+                reconcile_checkout_sessions(page_size=2, chunk_size=1)
+
+        checkpoint = cache.get(RECONCILE_CHECKPOINT_KEY)
+        self.assertIsNotNone(checkpoint["starting_after"])
+        self.stripe.calls.clear()
+
+        result = reconcile_checkout_sessions(page_size=2, chunk_size=1)
+
+        self.assertEqual(self.stripe.calls, [("list", checkpoint["starting_after"])])
+        self.assertEqual(result["sessions"], 5)
+        self.assertEqual(result["updated"], 2)
+        self.assertEqual(self._statuses()["paid"], Payment.Status.PAID)
+        self.assertEqual(self._statuses()["expired"], Payment.Status.EXPIRED)
+        self.assertIsNone(cache.get(RECONCILE_CHECKPOINT_KEY))
+
+    def test_nothing_to_reconcile_skips_stripe(self):
+        Payment.objects.update(status=Payment.Status.PAID)
+
+        result = reconcile_checkout_sessions(page_size=100, chunk_size=500)
+
+        self.assertEqual(result["sessions"], 0)
+        self.assertEqual(self.stripe.calls, [])
+
+
+class PaymentRollupTests(APITestCase):
+    def setUp(self):
+        get_redis().delete(STALE_DAYS_KEY)
+        self.staff = User.objects.create_user(email="finance@test.com", password="12345", is_staff=True)
+        self.client.force_authenticate(user=self.staff)
+        self.course = Course.objects.create(title="Курс", owner=self.staff)
+        self.other_course = Course.objects.create(title="Другой курс", owner=self.staff)
+        self.lesson = Lesson.objects.create(
+            title="Урок", course=self.course, owner=self.staff,
+            video_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        )
+        self.today = timezone.localdate()
+        self._pay(self.course, "100.00", "cash", days_ago=3)
+        self._pay(self.course, "150.00", "transfer", days_ago=3)
+        self._pay(self.other_course, "500.00", "transfer", days_ago=1)
+        self._pay(self.lesson, "20.00", "cash", days_ago=0)
+
+    def _pay(self, target, amount, method, days_ago, status=Payment.Status.PAID, **extra):
+        field = "paid_course" if isinstance(target, Course) else "paid_lesson"
+        payment = Payment.objects.create(
+            user=self.staff, amount=amount, payment_method=method, status=status, **{field: target}, **extra
+        )
+        Payment.objects.filter(pk=payment.pk).update(
+            payment_date=timezone.now() - timedelta(days=days_ago)
+        )
+        return payment
+
+    def _stats(self, **params):
+        return self.client.get(reverse("payment-stats"), params)
+
+    def test_stats_are_served_from_rollups(self):
+        refresh_payment_rollups()
+
+        with self.assertNumQueries(6):
+            resp = self._stats()
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["count"], 4)
+        self.assertEqual(resp.data["amount"], "770.00")
+        self.assertEqual(
+            [(row["course"], row["amount"]) for row in resp.data["by_course"]],
+            [(self.other_course.id, "500.00"), (self.course.id, "250.00")],
+        )
+        self.assertEqual(resp.data["by_lesson"][0]["lesson"], self.lesson.id)
+        self.assertEqual(
+            {row["payment_method"]: row["count"] for row in resp.data["by_method"]},
+            {"cash": 2, "transfer": 2},
+        )
+        self.assertEqual(len(resp.data["by_day"]), 3)
+
+    def test_period_filter(self):
+        refresh_payment_rollups()
+
+        resp = self._stats(date_from=self.today - timedelta(days=1), date_to=self.today)
+
+        self.assertEqual(resp.data["count"], 2)
+        self.assertEqual(resp.data["amount"], "520.00")
+
+    @override_settings(PAYMENT_ROLLUP_LOOKBACK=timedelta(0))
+    def test_refresh_recomputes_only_days_after_high_water_mark(self):
+        first = refresh_payment_rollups()
+        self.assertEqual(first["from"], (self.today - timedelta(days=3)).isoformat())
+        self._pay(self.course, "1000.00", "cash", days_ago=0)
+
+        second = refresh_payment_rollups()
+
+        self.assertEqual(second["from"], self.today.isoformat())
+        self.assertEqual(self._stats().data["amount"], "1770.00")
+
+    def test_only_paid_payments_are_counted(self):
+        for payment_status in (Payment.Status.PENDING, Payment.Status.OPEN, Payment.Status.FAILED,
+                               Payment.Status.EXPIRED):
+            self._pay(self.course, "100.00", "cash", days_ago=0, status=payment_status)
+
+        refresh_payment_rollups()
+
+        resp = self._stats(date_from=self.today, date_to=self.today)
+        self.assertEqual(resp.data["count"], 1)
+        self.assertEqual(resp.data["amount"], "20.00")
+
+    def test_cash_payment_added_in_admin_is_counted(self):
+        admin = User.objects.create_superuser(email="admin@test.com", password="12345")
+        self.client.force_login(admin)
+        add_url = reverse("admin:users_payment_add")
+        form = self.client.get(add_url).context["adminform"].form
+        self.assertEqual(form.initial["status"], Payment.Status.PAID)
+
+        resp = self.client.post(add_url, {
+            "user": self.staff.id,
+            "paid_course": self.course.id,
+            "amount": "70.00",
+            "payment_method": "cash",
+            "status": form.initial["status"],
+        })
+        self.assertEqual(resp.status_code, status.HTTP_302_FOUND)
+        refresh_payment_rollups()
+
+        self.client.force_authenticate(user=self.staff)
+        resp = self._stats(date_from=self.today, date_to=self.today)
+        self.assertEqual(resp.data["count"], 2)
+        self.assertEqual(resp.data["amount"], "90.00")
+
+    @override_settings(PAYMENT_ROLLUP_LOOKBACK=timedelta(0))
+    def test_payment_paid_later_recomputes_its_day(self):
+        late = self._pay(self.course, "300.00", "transfer", days_ago=3, status=Payment.Status.OPEN,
+                         stripe_session_id="cs_late")
+        refresh_payment_rollups()
+        self.assertEqual(self._stats().data["amount"], "770.00")
+
+        StripeEvent.objects.create(
+            event_id="evt_late", type="checkout.session.completed",
+            payload=json.loads(webhook_event("evt_late", "checkout.session.completed", "cs_late")),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_stripe_events(batch_size=10)
+        result = refresh_payment_rollups()
+
+        self.assertEqual(Payment.objects.get(pk=late.pk).status, Payment.Status.PAID)
+        self.assertEqual(result["from"], self.today.isoformat())
+        self.assertEqual(result["stale_days"], 1)
+        self.assertEqual(self._stats().data["amount"], "1070.00")
+        self.assertFalse(get_redis().exists(STALE_DAYS_KEY))
+
+    def test_backfill_command_processes_history_in_chunks(self):
+        out = StringIO()
+
+        call_command("backfill_payment_rollups", "--chunk-days", "2", stdout=out)
+
+        self.assertEqual(out.getvalue().count(" — "), 2)
+        self.assertEqual(PaymentDailyRollup.objects.count(), 4)
+        self.assertTrue(PaymentRollupState.objects.exists())
+
+    def test_stats_require_staff(self):
+        user = User.objects.create_user(email="student@test.com", password="12345")
+        self.client.force_authenticate(user=user)
+
+        self.assertEqual(self._stats().status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_period_is_rejected(self):
+        resp = self._stats(date_from=self.today, date_to=self.today - timedelta(days=1))
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="export@test.com", password="12345", is_staff=True)
+        self.client.force_authenticate(user=self.user)
+        self.course = Course.objects.create(title="Курс", owner=self.user)
+        self.payments = []
+        for days_ago, method in enumerate(["cash", "transfer", "cash", "transfer", "cash"]):
+            payment = Payment.objects.create(
+                user=self.user, amount=f"{100 + days_ago}.50", payment_method=method, paid_course=self.course,
+            )
+            Payment.objects.filter(pk=payment.pk).update(payment_date=timezone.now() - timedelta(days=days_ago))
+            self.payments.append(payment)
+
+    def _export(self, **params):
+        resp = self.client.get(reverse("payment-export"), params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        return resp, b"".join(resp.streaming_content).decode()
+
+    @override_settings(PAYMENT_EXPORT_CHUNK_SIZE=2)
+    def test_csv_export_streams_all_rows_newest_first(self):
+        resp, body = self._export()
+
+        self.assertEqual(resp["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="payments.csv"', resp["Content-Disposition"])
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual([int(row["id"]) for row in rows], [p.id for p in self.payments])
+        self.assertEqual(rows[0]["amount"], "100.50")
+        self.assertEqual(rows[0]["paid_lesson"], "")
+        self.assertEqual(rows[0]["user"], str(self.user.id))
+
+    def test_jsonl_export_honours_list_filters(self):
+        resp, body = self._export(type="jsonl", payment_method="transfer", ordering="payment_date")
+
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson; charset=utf-8")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [self.payments[3].id, self.payments[1].id])
+        self.assertEqual(rows[0]["amount"], "103.50")
+        self.assertIsNone(rows[0]["paid_lesson"])
+
+    def test_empty_csv_export_has_header(self):
+        empty = Course.objects.create(title="Без оплат", owner=self.user)
+
+        _, body = self._export(paid_course=empty.id)
+
+        self.assertEqual(body.strip().split(","), [
+            "id", "user", "payment_date", "paid_course", "paid_lesson",
+            "amount", "payment_method", "status", "stripe_session_id",
+        ])
+
+    def test_unknown_type_is_rejected(self):
+        resp = self.client.get(reverse("payment-export"), {"type": "xlsx"})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_requires_staff(self):
+        student = User.objects.create_user(email="export-student@test.com", password="12345")
+        self.client.force_authenticate(user=student)
+
+        resp = self.client.get(reverse("payment-export"))
+
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AvatarRenditionTests(APITestCase):
+    @mock.patch("config.thumbnails.generate_image_renditions.delay")
+    def test_avatar_renditions_in_user_serializer(self, delay):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        user = User.objects.create_user(email="avatar@test.com", password="12345")
+        self.client.force_authenticate(user=user)
+        buffer = BytesIO()
+        Image.new("RGBA", (500, 300), (255, 0, 0, 128)).save(buffer, "PNG")
+
+        with override_settings(MEDIA_ROOT=media):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.patch(
+                    reverse("user-detail", args=[user.id]),
+                    {"avatar": SimpleUploadedFile("me.png", buffer.getvalue(), content_type="image/png")},
+                    format="multipart",
+                )
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(resp.data["avatar_renditions"], {})
+            delay.assert_called_once_with("users.User", user.id, "avatar")
+
+            generate_image_renditions("users.User", user.id, "avatar")
+            resp = self.client.get(reverse("user-detail", args=[user.id]))
+
+        self.assertEqual(set(resp.data["avatar_renditions"]), {"small", "medium"})
+        self.assertTrue(resp.data["avatar_renditions"]["medium"]["jpeg"].endswith(".medium.jpg"))
+
+
+@override_settings(DEACTIVATE_USERS_BATCH_SIZE=2, DEACTIVATE_USERS_BATCH_SLEEP=0.01)
+class DeactivateInactiveUsersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        old = timezone.now() - timedelta(days=40)
+        recent = timezone.now() - timedelta(days=1)
+        self.inactive = [
+            User.objects.create_user(email=f"old{i}@test.com", password="12345", last_login=old)
+            for i in range(5)
+        ]
+        self.kept = [
+            User.objects.create_user(email="recent@test.com", password="12345", last_login=recent),
+            User.objects.create_user(email="staff@test.com", password="12345", last_login=old, is_staff=True),
+            User.objects.create_superuser(email="admin@test.com", password="12345", last_login=old),
+        ]
+        sleep = mock.patch("users.tasks.time.sleep")
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_deactivates_in_id_range_batches(self):
+        with self.assertLogs("users.tasks", "INFO") as logs:
+            result = deactivate_inactive_users.apply().get()
+
+        self.assertEqual(result, 5)
+        self.assertFalse(User.objects.filter(pk__in=[u.pk for u in self.inactive], is_active=True).exists())
+        self.assertEqual(User.objects.filter(pk__in=[u.pk for u in self.kept], is_active=True).count(), 3)
+        batches = [line for line in logs.output if "deactivated" in line]
+        self.assertEqual(len(batches), 3)
+        self.assertIn("'deactivated': 5", batches[-1])
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertIsNone(cache.get(DEACTIVATE_LOCK_KEY))
+
+    def test_revokes_tokens_of_deactivated_users_only(self):
+        with mock.patch("users.tasks.revoke_user_tokens") as revoke:
+            deactivate_inactive_users.apply()
+
+        revoked = [user_id for call in revoke.call_args_list for user_id in call.args[0]]
+        self.assertEqual(sorted(revoked), sorted(u.pk for u in self.inactive))
+
+    def test_concurrent_run_is_skipped(self):
+        cache.add(DEACTIVATE_LOCK_KEY, "other-run", timeout=60)
+
+        result = deactivate_inactive_users.apply().get()
+
+        self.assertEqual(result, 0)
+        self.assertEqual(User.objects.filter(is_active=True).count(), 8)
+        self.assertEqual(cache.get(DEACTIVATE_LOCK_KEY), "other-run")
+
+
+@override_settings(RATE_LIMITS={
+    "register": {"ip": "2/min"},
+    "token": {"ip": "3/min"},
+    "payment_create": {"user": "1/min", "ip": "3/min"},
+})
+class RateLimitTests(APITestCase):
+    def setUp(self):
+        redis_client = get_redis()
+        for key in redis_client.scan_iter("throttle:*"):
+            redis_client.delete(key)
+
+    def register(self, i, **extra):
+        return self.client.post(reverse("user-register"), {"email": f"limit{i}@test.com", "password": "12345"}, **extra)
+
+    def test_limit_headers_and_429(self):
+        first, second, third = (self.register(i) for i in range(3))
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first["RateLimit-Limit"], "2")
+        self.assertEqual(first["RateLimit-Remaining"], "1")
+        self.assertEqual(second["RateLimit-Remaining"], "0")
+        self.assertEqual(third.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(third["RateLimit-Remaining"], "0")
+        self.assertTrue(0 < int(third["Retry-After"]) <= 60)
+        self.assertEqual(User.objects.filter(email__startswith="limit").count(), 2)
+
+    def test_spoofed_forwarded_for_does_not_bypass_ip_limit(self):
+        responses = [self.register(i, HTTP_X_FORWARDED_FOR=f"198.51.100.{i}") for i in range(4)]
+
+        self.assertEqual(
+            [resp.status_code for resp in responses],
+            [status.HTTP_201_CREATED] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS] * 2,
+        )
+
+    def test_client_address_behind_trusted_proxy(self):
+        # прокси дописывает адрес клиента в конец X-Forwarded-For
+        def register(i, client):
+            return self.register(i, HTTP_X_FORWARDED_FOR=f"198.51.100.{i}, {client}").status_code
+
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}):
+            first = [register(i, "203.0.113.1") for i in range(3)]
+            second = register(3, "203.0.113.2")
+
+        self.assertEqual(first, [status.HTTP_201_CREATED] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(second, status.HTTP_201_CREATED)
+
+    def test_one_redis_round_trip_per_request(self):
+        self.register(0)
+
+        with mock.patch.object(redis.Redis, "execute_command", autospec=True,
+                               side_effect=redis.Redis.execute_command) as execute:
+            self.register(1)
+
+        self.assertEqual([call.args[1] for call in execute.call_args_list], ["EVALSHA"])
+
+    def test_user_and_ip_scopes(self):
+        first = User.objects.create_user(email="payer1@test.com", password="12345")
+        second = User.objects.create_user(email="payer2@test.com", password="12345")
+        course = Course.objects.create(title="Курс", owner=first)
+
+        def pay(user):
+            self.client.force_authenticate(user=user)
+            with mock.patch("users.tasks.create_checkout_session.delay"):
+                return self.client.post(
+                    reverse("payment-create"),
+                    {"paid_course": course.id, "amount": "990.00", "payment_method": "transfer"},
+                    format="json", HTTP_PREFER="respond-async",
+                ).status_code
+
+        self.assertEqual([pay(first), pay(first)], [status.HTTP_202_ACCEPTED, status.HTTP_429_TOO_MANY_REQUESTS])
+        # у второго пользователя свой лимит, но адрес общий (3/min)
+        self.assertEqual([pay(second), pay(second)], [status.HTTP_202_ACCEPTED, status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_redis_failure_does_not_block_requests(self):
+        with mock.patch("config.throttling._script", side_effect=redis.ConnectionError), \
+                self.assertLogs("config.throttling", "WARNING"):
+            responses = [self.register(i) for i in range(3)]
+
+        self.assertEqual({resp.status_code for resp in responses}, {status.HTTP_201_CREATED})
+        self.assertNotIn("RateLimit-Limit", responses[0])
@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 
 from .views import UserViewSet, UserRegisterAPIView, PaymentListAPIView, PaymentCreateAPIView, PaymentSuccessAPIView, \
-    PaymentCancelAPIView
+    TokenObtainPairAPIView, PaymentCancelAPIView, PaymentStatusAPIView, StripeWebhookAPIView, PaymentStatsAPIView, \
+    PaymentExportAPIView
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
@@ -12,11 +13,15 @@ urlpatterns = [
     path('users/register/', UserRegisterAPIView.as_view(), name='user-register'),
     path('', include(router.urls)),
 
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('token/', TokenObtainPairAPIView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
     path('payments/', PaymentListAPIView.as_view(), name='payment-list'),
     path("payments/create/", PaymentCreateAPIView.as_view(), name="payment-create"),
+    path("payments/export/", PaymentExportAPIView.as_view(), name="payment-export"),
+    path("payments/stats/", PaymentStatsAPIView.as_view(), name="payment-stats"),
+    path("payments/<int:pk>/status/", PaymentStatusAPIView.as_view(), name="payment-status"),
     path("payments/success/", PaymentSuccessAPIView.as_view()),
     path("payments/cancel/", PaymentCancelAPIView.as_view()),
+    path("payments/webhook/", StripeWebhookAPIView.as_view(), name="stripe-webhook"),
 ]
@@ -1,18 +1,36 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
 from rest_framework import viewsets, generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.views import TokenObtainPairView
 
+from config.representations import ValuesSerializer
+from config.throttling import RateLimitMixin
+from materials.paginators import KeysetCursorPagination
+from .idempotency import IN_FLIGHT_TIMEOUT, IdempotentPostMixin
 from .models import Payment
 from .serializers import (
     PaymentSerializer,
     UserSerializer,
-    UserCreateSerializer, PaymentCreateSerializer
+    UserCreateSerializer, PaymentCreateSerializer, PaymentStatsQuerySerializer
 )
-from .services.stripe import create_stripe_product, create_stripe_price, create_stripe_checkout_session
+from .services.checkout import start_checkout
+from .services.circuit_breaker import ServiceUnavailable
+from .services.stripe import max_call_duration
+from .services.export import CONTENT_TYPES, CSV, export_payments
+from .services.rollups import payment_stats
+from .services.webhooks import InvalidWebhook, record_stripe_event, schedule_stripe_events_consumer
+from .tasks import enqueue_checkout_session
 
 User = get_user_model()
 
@@ -24,62 +42,149 @@ class UserViewSet(viewsets.ModelViewSet):
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = KeysetCursorPagination
+    ordering_fields = ['id', 'email']
+    ordering = ['id']
 
 
-class UserRegisterAPIView(generics.CreateAPIView):
+class UserRegisterAPIView(RateLimitMixin, generics.CreateAPIView):
     """
     Регистрация нового пользователя.
-    Доступ открытый (AllowAny).
+    Доступ открытый (AllowAny), число регистраций с адреса ограничено.
     """
     queryset = User.objects.all()
     serializer_class = UserCreateSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = "register"
 
 
-class PaymentListAPIView(generics.ListAPIView):
+class TokenObtainPairAPIView(RateLimitMixin, TokenObtainPairView):
     """
-    Список платежей с фильтрацией и сортировкой по дате.
+    Вход по email и паролю (пара JWT). Проверка пароля дорогая (PBKDF2),
+    поэтому число попыток с адреса ограничено.
     """
-    queryset = Payment.objects.all()
-    serializer_class = PaymentSerializer
+    throttle_scope = "token"
+
 
+class PaymentFilterMixin:
+    """
+    Общие фильтры и сортировка списка и выгрузки платежей.
+    """
+    queryset = Payment.objects.all()
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['paid_course', 'paid_lesson', 'payment_method']
     ordering_fields = ['payment_date']
     ordering = ['-payment_date']
 
 
-class PaymentCreateAPIView(generics.CreateAPIView):
+class PaymentListAPIView(PaymentFilterMixin, generics.ListAPIView):
+    """
+    Список платежей с фильтрацией и сортировкой по дате.
+
+    Страница читается через values() и собирается ValuesSerializer —
+    в том же формате, что у PaymentSerializer, без объектов модели.
+    """
+    serializer_class = PaymentSerializer
+    pagination_class = KeysetCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        values_serializer = ValuesSerializer.build(self.get_serializer())
+        if values_serializer is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = queryset.values(*values_serializer.columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.represent(page))
+        return Response(values_serializer.represent(rows))
+
+
+class PaymentExportAPIView(PaymentFilterMixin, generics.GenericAPIView):
+    """
+    Выгрузка платежей целиком в CSV или JSONL (`?type=csv|jsonl`).
+
+    Фильтры и `ordering` — те же, что у списка. Ответ отдаётся потоком:
+    строки читаются серверным курсором пачками по PAYMENT_EXPORT_CHUNK_SIZE,
+    и память не растёт с числом платежей. Выгрузка — платежи всех
+    пользователей, поэтому доступна только staff.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = None
+    serializer_class = PaymentSerializer
+
+    @extend_schema(
+        summary="Выгрузка платежей (CSV/JSONL)",
+        parameters=[OpenApiParameter("type", str, enum=list(CONTENT_TYPES), description="Формат файла")],
+        responses={200: OpenApiResponse(description="Файл с платежами, отдаётся потоком")},
+    )
+    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get("type", CSV)
+        if fmt not in CONTENT_TYPES:
+            raise ValidationError({"type": [f"Ожидается одно из: {', '.join(CONTENT_TYPES)}."]})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            export_payments(queryset, fmt, chunk_size=settings.PAYMENT_EXPORT_CHUNK_SIZE),
+            content_type=CONTENT_TYPES[fmt],
+        )
+        response["Content-Disposition"] = f'attachment; filename="payments.{fmt}"'
+        return response
+
+
+class PaymentCreateAPIView(RateLimitMixin, IdempotentPostMixin, generics.CreateAPIView):
     """
     Создаёт платёж и Stripe Checkout Session, возвращая ссылку на оплату.
+
+    С заголовком `Idempotency-Key` повтор запроса (например, после таймаута
+    у клиента) получает первый ответ, не создавая новый платёж.
+
+    В асинхронном режиме (PAYMENTS_ASYNC_CHECKOUT или заголовок
+    `Prefer: respond-async`) платёж сохраняется в статусе pending, сессия
+    создаётся Celery-задачей, а клиент сразу получает 202 и адрес статуса.
+
+    Каждый запрос обращается к Stripe, поэтому их число на пользователя
+    и на адрес ограничено (RATE_LIMITS["payment_create"]).
     """
     serializer_class = PaymentCreateSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = "payment_create"
+
+    def get_in_flight_timeout(self):
+        # синхронный путь: продукт, цена и сессия Stripe со всеми повторами
+        return max_call_duration("product", "price", "session") + IN_FLIGHT_TIMEOUT
+
+    def is_async(self, request):
+        prefer = request.headers.get("Prefer", "")
+        return settings.PAYMENTS_ASYNC_CHECKOUT or "respond-async" in prefer
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        payment: Payment = serializer.save(user=request.user)
-
-        target = payment.paid_course or payment.paid_lesson
-        product_name = getattr(target, "title", "Оплата")
-        product_description = getattr(target, "description", "")
+        payment: Payment = serializer.save(user_id=request.user.id)
 
-        product = create_stripe_product(name=product_name, description=product_description)
-        price = create_stripe_price(product_id=product.id, amount=payment.amount)
-        session = create_stripe_checkout_session(price_id=price.id)
+        if self.is_async(request):
+            transaction.on_commit(lambda: enqueue_checkout_session(payment.id))
+            status_url = request.build_absolute_uri(
+                reverse("payment-status", args=[payment.id])
+            )
+            return Response(
+                {
+                    "id": payment.id,
+                    "status": payment.status,
+                    "status_url": status_url,
+                },
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": status_url, "Retry-After": settings.PAYMENT_STATUS_RETRY_AFTER},
+            )
 
-        payment.stripe_product_id = product.id
-        payment.stripe_price_id = price.id
-        payment.stripe_session_id = session.id
-        payment.payment_url = session.url
-        payment.save(update_fields=[
-            "stripe_product_id",
-            "stripe_price_id",
-            "stripe_session_id",
-            "payment_url",
-        ])
+        try:
+            start_checkout(payment)
+        except ServiceUnavailable:
+            # Stripe деградировал: клиент получит 503 с Retry-After
+            Payment.objects.filter(pk=payment.pk).update(status=Payment.Status.FAILED)
+            raise
 
         return Response(
             {
@@ -91,6 +196,43 @@ class PaymentCreateAPIView(generics.CreateAPIView):
         )
 
 
+class PaymentStatusAPIView(APIView):
+    """
+    Статус платежа пользователя и ссылка на оплату, когда она готова.
+
+    Ответ — сразу, без ожидания на сервере (оно заняло бы синхронный
+    worker): пока платёж в статусе pending, заголовок Retry-After
+    подсказывает, через сколько секунд спросить снова.
+    """
+    permission_classes = [IsAuthenticated]
+    fields = ("id", "status", "payment_url", "stripe_session_id")
+
+    def get(self, request, pk, *args, **kwargs):
+        payments = Payment.objects.filter(pk=pk, user_id=request.user.id).values(*self.fields)
+        payment = get_object_or_404(payments)
+
+        headers = {}
+        if payment["status"] == Payment.Status.PENDING:
+            headers["Retry-After"] = settings.PAYMENT_STATUS_RETRY_AFTER
+        return Response(payment, headers=headers)
+
+
+class PaymentStatsAPIView(APIView):
+    """
+    Итоги платежей за период (`?date_from=&date_to=`): общая сумма и
+    количество, разбивка по дням, способам оплаты, курсам и урокам.
+
+    Считается по предрасчитанной таблице PaymentDailyRollup, а не по
+    платежам; `updated_at` — до какого момента итоги актуальны.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        query = PaymentStatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(payment_stats(**query.validated_data))
+
+
 class PaymentSuccessAPIView(APIView):
     """
     Success URL для Stripe: возвращает 200 OK и сообщение об успешной оплате.
@@ -109,3 +251,24 @@ class PaymentCancelAPIView(APIView):
 
     def get(self, request, *args, **kwargs):
         return Response({"detail": "Payment canceled"}, status=status.HTTP_200_OK)
+
+
+class StripeWebhookAPIView(APIView):
+    """
+    Webhook Stripe: проверяет подпись, сохраняет событие и сразу отвечает 200.
+
+    Статусы платежей меняет Celery-задача process_stripe_events пачками.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        signature = request.headers.get("Stripe-Signature", "")
+        try:
+            created = record_stripe_event(request.body, signature)
+        except InvalidWebhook:
+            return Response({"detail": "Invalid signature"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if created:
+            schedule_stripe_events_consumer()
+        return Response({"received": True}, status=status.HTTP_200_OK)